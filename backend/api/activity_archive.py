@@ -0,0 +1,203 @@
+"""
+Activity log retention
+
+archive_activity_logs() moves rows older than ACTIVITY_LOG_RETENTION_DAYS
+out of activity_logs, ACTIVITY_LOG_ARCHIVE_CHUNK_SIZE rows at a time: each
+chunk is appended to one gzip-compressed JSONL file per month under
+ACTIVITY_LOG_ARCHIVE_DIR, its per-day/per-action counts are added to
+ActivityLogSummary, and then the chunk is deleted. The hot table therefore
+holds only the retention window.
+
+Archived rows keep the ActivityLogSerializer shape. stream_activity_logs()
+yields archived rows followed by live ones for a date range, so callers
+don't need to know where a row is stored. If a run dies between writing a
+chunk and deleting it, the next run writes that chunk again; readers skip
+ids already seen in the file (ids are not in order within a file: later
+runs and buffered writes can archive lower ids after higher ones).
+Overlapping runs may both write a chunk, but only the run that deletes a
+row adds it to the catalog and summaries, so nothing is counted twice.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog, ActivityLogArchive, ActivityLogSummary
+from .serializers import ActivityLogSerializer
+
+
+def get_retention_days():
+    return getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90)
+
+
+def get_chunk_size():
+    return getattr(settings, 'ACTIVITY_LOG_ARCHIVE_CHUNK_SIZE', 5000)
+
+
+def get_archive_dir():
+    return str(getattr(settings, 'ACTIVITY_LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'activity_logs')))
+
+
+def archive_file_name(month):
+    return f'activity_logs-{month:%Y-%m}.jsonl.gz'
+
+
+def retention_cutoff(retention_days=None):
+    """Start of the oldest day kept in the hot table"""
+    days = get_retention_days() if retention_days is None else retention_days
+    return day_start(timezone.localdate() - timedelta(days=days))
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _append(month, lines):
+    """Append lines to the month's file as one gzip member, on disk before returning"""
+    directory = get_archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, archive_file_name(month)), 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as compressed:
+            compressed.write(''.join(lines).encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def _record(months, counts):
+    """Add a chunk's rows to the archive catalog and the daily summaries"""
+    archives = {archive.month: archive for archive in ActivityLogArchive.objects.filter(month__in=months)}
+    for month, rows in months.items():
+        archive = archives.get(month) or ActivityLogArchive(month=month, file_name=archive_file_name(month))
+        archive.row_count += rows
+        archive.save()
+
+    summaries = {
+        (summary.date, summary.action): summary
+        for summary in ActivityLogSummary.objects.filter(date__in={day for day, _ in counts})
+    }
+    new = []
+    for (day, action), count in counts.items():
+        if (day, action) in summaries:
+            summaries[(day, action)].count += count
+        else:
+            new.append(ActivityLogSummary(date=day, action=action, count=count))
+    ActivityLogSummary.objects.bulk_update(summaries.values(), ['count'], batch_size=500)
+    ActivityLogSummary.objects.bulk_create(new, batch_size=500)
+
+
+def archive_activity_logs(retention_days=None, chunk_size=None):
+    """
+    Archive and delete activity logs older than the retention window
+    Returns: number of rows archived
+    """
+    cutoff = retention_cutoff(retention_days)
+    chunk_size = chunk_size or get_chunk_size()
+    archived = 0
+
+    while True:
+        ids = list(
+            ActivityLog.objects.filter(created_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return archived
+
+        lines, keys = {}, {}
+        for entry in ActivityLog.objects.filter(id__in=ids).select_related('user', 'target_user').order_by('id'):
+            day = timezone.localdate(entry.created_at)
+            month = day.replace(day=1)
+            lines.setdefault(month, []).append(json.dumps(ActivityLogSerializer(entry).data) + '\n')
+            keys[entry.id] = (month, day, entry.action)
+
+        for month, month_lines in lines.items():
+            _append(month, month_lines)
+        with transaction.atomic():
+            # An overlapping run may have archived some of the chunk already:
+            # only rows this run deletes go into the catalog and summaries
+            present = list(ActivityLog.objects.select_for_update().filter(id__in=keys).values_list('id', flat=True))
+            ActivityLog.objects.filter(id__in=present).delete()
+            months, counts = {}, {}
+            for log_id in present:
+                month, day, action = keys[log_id]
+                months[month] = months.get(month, 0) + 1
+                counts[(day, action)] = counts.get((day, action), 0) + 1
+            _record(months, counts)
+        archived += len(present)
+
+
+def _matcher(action, user_id):
+    def matches(row):
+        return (action is None or row['action'] == action) and (user_id is None or row['user'] == user_id)
+    return matches
+
+
+def iter_archived(start, end, action=None, user_id=None):
+    """Archived rows with start <= created_at < end, oldest month first"""
+    matches = _matcher(action, user_id)
+    months = ActivityLogArchive.objects.filter(
+        month__gte=timezone.localdate(start).replace(day=1), month__lt=timezone.localdate(end)
+    ).order_by('month')
+    for archive in months:
+        path = os.path.join(get_archive_dir(), archive.file_name)
+        if not os.path.exists(path):
+            continue
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                row = json.loads(line)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if start <= parse_datetime(row['created_at']) < end and matches(row):
+                    yield row
+
+
+def iter_live(start, end, action=None, user_id=None):
+    """Rows still in activity_logs with start <= created_at < end, oldest first"""
+    rows = ActivityLog.objects.filter(created_at__gte=start, created_at__lt=end)
+    if action is not None:
+        rows = rows.filter(action=action)
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    for entry in rows.select_related('user', 'target_user').order_by('created_at', 'id').iterator(chunk_size=500):
+        yield ActivityLogSerializer(entry).data
+
+
+def stream_activity_logs(start_date, end_date, action=None, user_id=None):
+    """
+    Every activity log from start_date to end_date (inclusive), archived or
+    not, in ActivityLogSerializer form
+    """
+    start, end = day_start(start_date), day_start(end_date + timedelta(days=1))
+    yield from iter_archived(start, end, action, user_id)
+    yield from iter_live(start, end, action, user_id)
+
+
+def summarize_activity_logs(start_date, end_date):
+    """
+    Daily count per action from start_date to end_date (inclusive):
+    summaries for archived days plus one grouped query over the hot table
+    Returns: list of {'date', 'action', 'count'} ordered by date and action
+    """
+    counts = {
+        (row['date'], row['action']): row['count']
+        for row in ActivityLogSummary.objects.filter(date__gte=start_date, date__lte=end_date).values(
+            'date', 'action', 'count'
+        )
+    }
+    live = ActivityLog.objects.filter(
+        created_at__gte=day_start(start_date), created_at__lt=day_start(end_date + timedelta(days=1))
+    ).annotate(date=TruncDate('created_at')).values('date', 'action').annotate(n=Count('id')).order_by()
+    for row in live:
+        key = (row['date'], row['action'])
+        counts[key] = counts.get(key, 0) + row['n']
+    return [
+        {'date': day, 'action': action, 'count': count}
+        for (day, action), count in sorted(counts.items())
+    ]
@@ -1,8 +1,9 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Course, CourseCategory, Batch, Schedule,
-    Enrollment, Payment, Attendance, Notification, ActivityLog, Waitlist
+    Enrollment, Payment, Attendance, Notification, ActivityLog, Waitlist, SeatHold
 )
 
 
@@ -39,9 +40,28 @@ class CourseCategoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+class CourseAdminForm(forms.ModelForm):
+    class Meta:
+        model = Course
+        fields = '__all__'
+    
+    def clean_prerequisites(self):
+        """Reject prerequisite lists that would create a circular chain"""
+        from .prerequisites import check_prerequisite_cycle
+        
+        prerequisites = self.cleaned_data['prerequisites']
+        if self.instance.pk:
+            check_prerequisite_cycle(
+                [(self.instance.pk, prereq.pk) for prereq in prerequisites],
+                replacing=self.instance.pk
+            )
+        return prerequisites
+
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     """Admin interface for Course model"""
+    form = CourseAdminForm
     list_display = ['code', 'name', 'instructor', 'duration_weeks', 'fee', 'enrolled_count', 'max_capacity', 'is_active', 'created_at']
     list_filter = ['instructor', 'category', 'is_active', 'created_at']
     search_fields = ['name', 'code', 'description']
@@ -76,17 +96,17 @@ class CourseAdmin(admin.ModelAdmin):
 @admin.register(Batch)
 class BatchAdmin(admin.ModelAdmin):
     """Admin interface for Batch"""
-    list_display = ['batch_number', 'course', 'instructor', 'enrolled_count', 'capacity', 'is_active']
+    list_display = ['batch_number', 'course', 'instructor', 'enrolled_count', 'held_count', 'capacity', 'is_active']
     list_filter = ['course', 'is_active', 'created_at']
     search_fields = ['batch_number', 'course__name']
-    readonly_fields = ['created_at', 'enrolled_count']
+    readonly_fields = ['created_at', 'enrolled_count', 'held_count']
     
     fieldsets = (
         ('Batch Info', {
             'fields': ('course', 'batch_number', 'is_active')
         }),
         ('Capacity', {
-            'fields': ('capacity', 'enrolled_count')
+            'fields': ('capacity', 'enrolled_count', 'held_count')
         }),
         ('Instructor & Dates', {
             'fields': ('instructor', 'start_date', 'end_date')
@@ -169,7 +189,13 @@ class WaitlistAdmin(admin.ModelAdmin):
     list_filter = ['status', 'batch__course', 'notified', 'joined_date']
     search_fields = ['student__username', 'batch__course__name', 'batch__batch_number']
     readonly_fields = ['joined_date', 'position']
-    ordering = ['batch', 'position', 'joined_date']
+    ordering = ['batch', 'sequence']
+    
+    def get_queryset(self, request):
+        # Positions ranked in the list query, not with a COUNT per row
+        return Waitlist.with_positions(
+            super().get_queryset(request).select_related('student', 'batch__course')
+        )
     
     fieldsets = (
         ('Student & Batch', {
@@ -188,6 +214,15 @@ class WaitlistAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    """Admin interface for SeatHold"""
+    list_display = ['batch', 'student', 'seats', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'batch__course']
+    search_fields = ['student__username', 'batch__batch_number']
+    readonly_fields = ['batch', 'student', 'seats', 'status', 'expires_at', 'created_at']
+
+
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     """Admin interface for Attendance"""
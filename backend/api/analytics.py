@@ -0,0 +1,302 @@
+"""
+Analytics engine
+
+Batch analytics: any number of batches come from one conditional-aggregation
+query over student_progress (totals, averages, risk counts and the grade
+histogram, grouped by batch), one narrow ordered scan for percentiles and
+the top/struggling lists, and one fetch of the listed rows. Results are
+cached per batch for a short time; recompute_progress() and progress
+saves drop the cached entry of the batches they touch.
+
+Institute rollups: build_rollups() fills AnalyticsRollup (batch x week or
+month) from one grouped query per source table, and query_rollups()
+answers any course/batch/instructor/category/period slice by summing those
+cells, so dashboards never touch the transactional tables.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, DateField, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+
+from .counters import ATTENDED_STATUSES
+from .grading import grade_letters
+from .models import AnalyticsRollup, Attendance, Batch, Enrollment, Installment, Payment, StudentProgress
+from .serializers import StudentProgressSerializer
+
+BATCH_ANALYTICS_CACHE_KEY = 'api:batch_analytics:{}'
+
+PERCENTILES = (25, 50, 75, 90)
+TOP_PERFORMERS = 5
+STRUGGLING_STUDENTS = 10
+STRUGGLING_BELOW = 60
+
+
+def get_cache_timeout():
+    return getattr(settings, 'BATCH_ANALYTICS_CACHE_TIMEOUT', 60)
+
+
+def invalidate_batch_analytics(batch_ids):
+    cache.delete_many([BATCH_ANALYTICS_CACHE_KEY.format(batch_id) for batch_id in set(batch_ids) if batch_id])
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def compute_batch_analytics(batches):
+    """
+    Analytics for the given batches (course must be loaded), four queries
+    in total whatever the number of batches
+    Returns: dict of batch id -> analytics
+    """
+    batch_ids = [batch.id for batch in batches]
+    grades = grade_letters()
+    progress = StudentProgress.objects.filter(enrollment__batch_id__in=batch_ids)
+
+    aggregates = {
+        row['enrollment__batch_id']: row
+        for row in progress.values('enrollment__batch_id').annotate(
+            total=Count('id'),
+            at_risk=Count('id', filter=Q(is_at_risk=True)),
+            average=Avg('overall_percentage'),
+            lowest=Min('overall_percentage'),
+            highest=Max('overall_percentage'),
+            **{f'grade_{index}': Count('id', filter=Q(current_grade=grade)) for index, grade in enumerate(grades)}
+        ).order_by()
+    }
+
+    # One narrow ordered scan serves the percentiles and picks the listed rows
+    scores = {}
+    for batch_id, pk, overall in progress.order_by(
+        'enrollment__batch_id', 'overall_percentage', 'id'
+    ).values_list('enrollment__batch_id', 'id', 'overall_percentage'):
+        scores.setdefault(batch_id, []).append((pk, overall))
+
+    listed = {}
+    for batch_id, rows in scores.items():
+        top = [pk for pk, _ in reversed(rows[-TOP_PERFORMERS:])]
+        struggling = [pk for pk, overall in rows[:STRUGGLING_STUDENTS] if overall < STRUGGLING_BELOW]
+        listed[batch_id] = (top, struggling)
+
+    wanted = {pk for top, struggling in listed.values() for pk in top + struggling}
+    rendered = {
+        row['id']: dict(row)
+        for row in StudentProgressSerializer(
+            StudentProgress.objects.filter(id__in=wanted).select_related(
+                'enrollment__student', 'enrollment__batch__course'
+            ),
+            many=True
+        ).data
+    } if wanted else {}
+
+    results = {}
+    for batch in batches:
+        row = aggregates.get(batch.id, {})
+        ordered = [overall for _, overall in scores.get(batch.id, [])]
+        top, struggling = listed.get(batch.id, ([], []))
+        results[batch.id] = {
+            'batch': {
+                'id': batch.id,
+                'course': batch.course.name,
+                'batch_number': batch.batch_number
+            },
+            'total_students': row.get('total', 0),
+            'at_risk_count': row.get('at_risk', 0),
+            'average_grade': row.get('average') or 0,
+            'lowest_grade': row.get('lowest'),
+            'highest_grade': row.get('highest'),
+            'percentiles': {f'p{pct}': percentile(ordered, pct) for pct in PERCENTILES},
+            'grade_distribution': {grade: row.get(f'grade_{index}', 0) for index, grade in enumerate(grades)},
+            'top_performers': [rendered[pk] for pk in top],
+            'struggling_students': [rendered[pk] for pk in struggling],
+        }
+    return results
+
+
+def get_batch_analytics(batch_ids):
+    """
+    Cached analytics for batch_ids, computing only the batches not cached
+    Returns: list of analytics in batch_ids order (unknown batches skipped)
+    """
+    keys = {batch_id: BATCH_ANALYTICS_CACHE_KEY.format(batch_id) for batch_id in batch_ids}
+    cached = cache.get_many(list(keys.values()))
+    results = {batch_id: cached[key] for batch_id, key in keys.items() if key in cached}
+
+    missing = [batch_id for batch_id in batch_ids if batch_id not in results]
+    if missing:
+        computed = compute_batch_analytics(list(Batch.objects.filter(id__in=missing).select_related('course')))
+        cache.set_many(
+            {keys[batch_id]: analytics for batch_id, analytics in computed.items()},
+            get_cache_timeout()
+        )
+        results.update(computed)
+
+    return [results[batch_id] for batch_id in batch_ids if batch_id in results]
+
+
+# ------------------------------------------------------------- rollups --
+
+ROLLUP_MEASURES = (
+    'enrollments', 'completions', 'drops', 'revenue', 'outstanding_installments',
+    'graded_students', 'grade_total', 'attendance_marked', 'attendance_attended',
+)
+ROLLUP_DIMENSIONS = {
+    # query parameter -> AnalyticsRollup field
+    'course': 'course_id',
+    'batch': 'batch_id',
+    'instructor': 'instructor_id',
+    'category': 'category_id',
+    'period': 'period_start',
+}
+REVENUE_STATUSES = ('completed', 'verified')
+OUTSTANDING_INSTALLMENT_STATUSES = ('pending', 'overdue')
+TRUNCATE = {'week': TruncWeek, 'month': TruncMonth}
+
+
+def period_start(day, period):
+    """First day of the week (Monday) or month containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _grouped(queryset, date_field, period, batch_field, since, **measures):
+    """Rows of (period_start, batch_id, measures) from one grouped query"""
+    queryset = queryset.filter(**{f'{batch_field}__isnull': False}).annotate(
+        rollup_period=TRUNCATE[period](date_field, output_field=DateField()),
+        rollup_batch=F(batch_field)
+    )
+    if since is not None:
+        queryset = queryset.filter(rollup_period__gte=since)
+    return (
+        queryset
+        .values('rollup_period', 'rollup_batch')
+        .annotate(**measures)
+        .order_by()
+    )
+
+
+def build_rollups(period='month', since=None):
+    """
+    Rebuild the AnalyticsRollup cells of one period type
+
+    since: rebuild only periods starting on/after the period containing
+    this date (default: everything)
+    Returns: number of cells written
+    """
+    if period not in TRUNCATE:
+        raise ValueError(f'period must be one of: {", ".join(TRUNCATE)}')
+    since = period_start(since, period) if since else None
+
+    sources = [
+        _grouped(
+            Enrollment.objects.all(), 'enrollment_date', period, 'batch_id', since,
+            enrollments=Count('id'),
+            completions=Count('id', filter=Q(status='completed')),
+            drops=Count('id', filter=Q(status='dropped')),
+        ),
+        _grouped(
+            StudentProgress.objects.all(), 'enrollment__enrollment_date', period, 'enrollment__batch_id', since,
+            graded_students=Count('id'),
+            grade_total=Sum('overall_percentage'),
+        ),
+        _grouped(
+            Payment.objects.filter(status__in=REVENUE_STATUSES), 'payment_date', period, 'enrollment__batch_id', since,
+            revenue=Sum('amount'),
+        ),
+        _grouped(
+            Installment.objects.filter(status__in=OUTSTANDING_INSTALLMENT_STATUSES), 'due_date', period,
+            'payment_plan__enrollment__batch_id', since,
+            outstanding_installments=Sum(F('amount') - F('paid_amount')),
+        ),
+        _grouped(
+            Attendance.objects.all(), 'marked_date', period, 'enrollment__batch_id', since,
+            attendance_marked=Count('id'),
+            attendance_attended=Count('id', filter=Q(status__in=ATTENDED_STATUSES)),
+        ),
+    ]
+
+    cells = {}
+    for source in sources:
+        for row in source:
+            key = (row.pop('rollup_period'), row.pop('rollup_batch'))
+            cell = cells.setdefault(key, {})
+            for measure, value in row.items():
+                cell[measure] = value or 0
+
+    batches = {
+        row['id']: row for row in Batch.objects.values(
+            'id', 'course_id', 'course__category_id',
+            rollup_instructor=Coalesce('instructor_id', 'course__instructor_id')
+        )
+    }
+    rollups = [
+        AnalyticsRollup(
+            period=period,
+            period_start=start,
+            batch_id=batch_id,
+            course_id=batches[batch_id]['course_id'],
+            instructor_id=batches[batch_id]['rollup_instructor'],
+            category_id=batches[batch_id]['course__category_id'],
+            **measures
+        )
+        for (start, batch_id), measures in cells.items()
+        if batch_id in batches
+    ]
+
+    with transaction.atomic():
+        stale = AnalyticsRollup.objects.filter(period=period)
+        if since is not None:
+            stale = stale.filter(period_start__gte=since)
+        stale.delete()
+        AnalyticsRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def _ratio(numerator, denominator, scale=100):
+    if not denominator:
+        return None
+    return round(Decimal(numerator) * scale / Decimal(denominator), 2)
+
+
+def query_rollups(period='month', group_by=(), filters=None, start=None, end=None):
+    """
+    Sum AnalyticsRollup cells for one slice, one query
+
+    group_by: dimensions from ROLLUP_DIMENSIONS to break the totals down by
+    filters: {dimension: id or list of ids}
+    start/end: inclusive period_start range
+    Returns: list of dicts with the dimensions, summed measures and ratios
+    """
+    rows = AnalyticsRollup.objects.filter(period=period)
+    for dimension, value in (filters or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        rows = rows.filter(**{f'{ROLLUP_DIMENSIONS[dimension]}__in': values})
+    if start:
+        rows = rows.filter(period_start__gte=period_start(start, period))
+    if end:
+        rows = rows.filter(period_start__lte=end)
+
+    fields = [ROLLUP_DIMENSIONS[dimension] for dimension in group_by]
+    rows = rows.values(*fields).annotate(**{
+        measure: Sum(measure) for measure in ROLLUP_MEASURES
+    }).order_by(*fields)
+
+    results = []
+    for row in rows:
+        result = {dimension: row[ROLLUP_DIMENSIONS[dimension]] for dimension in group_by}
+        result.update({measure: row[measure] or 0 for measure in ROLLUP_MEASURES})
+        result['drop_rate'] = _ratio(result['drops'], result['enrollments'])
+        result['completion_rate'] = _ratio(result['completions'], result['enrollments'])
+        result['average_grade'] = _ratio(result['grade_total'], result['graded_students'], scale=1)
+        result['attendance_rate'] = _ratio(result['attendance_attended'], result['attendance_marked'])
+        results.append(result)
+    return results
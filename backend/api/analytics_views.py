@@ -0,0 +1,70 @@
+"""
+Analytics ViewSets - read-only slices of the precomputed AnalyticsRollup cube
+"""
+from datetime import date
+
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from django.db.models import Max
+
+from .analytics import ROLLUP_DIMENSIONS, TRUNCATE, query_rollups
+from .models import AnalyticsRollup
+from .permissions import IsAdminOrStaff
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """
+    Institute-wide analytics
+    
+    GET /api/analytics/?period=month&group_by=course,period
+        &course=1,2&instructor=5&category=3&batch=7&start=2026-01-01&end=2026-06-30
+    
+    Totals (enrollments, completions, drops, revenue, outstanding
+    installments, grades, attendance) and derived rates for the slice,
+    broken down by the group_by dimensions. Served from the rollup table;
+    build it with `python manage.py build_analytics_rollups`.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+    
+    def list(self, request):
+        params = request.query_params
+        
+        period = params.get('period', 'month')
+        if period not in TRUNCATE:
+            return Response(
+                {'error': f'period must be one of: {", ".join(TRUNCATE)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        group_by = [value.strip() for value in params.get('group_by', '').split(',') if value.strip()]
+        unknown = [value for value in group_by if value not in ROLLUP_DIMENSIONS]
+        if unknown:
+            return Response(
+                {'error': f'group_by must be made of: {", ".join(ROLLUP_DIMENSIONS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            filters = {
+                dimension: [int(value) for value in params[dimension].split(',') if value.strip()]
+                for dimension in ROLLUP_DIMENSIONS
+                if dimension != 'period' and params.get(dimension)
+            }
+            start = date.fromisoformat(params['start']) if params.get('start') else None
+            end = date.fromisoformat(params['end']) if params.get('end') else None
+        except ValueError:
+            return Response(
+                {'error': 'Filters take comma separated ids, start/end take YYYY-MM-DD dates'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = query_rollups(period, group_by, filters, start, end)
+        built_at = AnalyticsRollup.objects.filter(period=period).aggregate(Max('built_at'))['built_at__max']
+        
+        return Response({
+            'period': period,
+            'group_by': group_by,
+            'built_at': built_at,
+            'results': results
+        })
@@ -0,0 +1,157 @@
+"""
+Buffered ActivityLog writes
+
+record_activity() queues an ActivityLog row and returns at once, so
+requests don't pay for a database write, or wait for the SQLite write
+lock, to leave an audit trail. A background thread writes the queue with
+one bulk_create when ACTIVITY_LOG_FLUSH_SIZE rows are waiting or every
+ACTIVITY_LOG_FLUSH_INTERVAL seconds, and whatever is still queued is
+written when the process exits. Rows keep the time they were recorded,
+not the time they were flushed.
+
+Rows recorded inside a transaction are queued when it commits, so a
+rolled-back operation leaves no log. The queue holds at most
+ACTIVITY_LOG_QUEUE_SIZE rows: when the writer falls that far behind, the
+caller flushes the queue itself and writes its row inline rather than
+growing memory without bound.
+
+With ACTIVITY_LOG_BUFFERED off, each row is written inline as before
+(tests, management commands that read their own logs back).
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+def get_flush_size():
+    return getattr(settings, 'ACTIVITY_LOG_FLUSH_SIZE', 200)
+
+
+def get_flush_interval():
+    return getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 1.0)
+
+
+def get_queue_size():
+    return getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', 10000)
+
+
+class ActivityLogWriter:
+    """Queue of unsaved ActivityLog rows and the thread that writes them"""
+
+    def __init__(self):
+        self._queue = queue.Queue(get_queue_size())
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, entry):
+        if self._stopped.is_set():
+            entry.save()
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # The writer can't keep up (e.g. the database is locked): push back
+            # on the caller instead of queueing without bound
+            self.flush()
+            entry.save()
+            return
+        if self._queue.qsize() >= get_flush_size():
+            self._wake.set()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """
+        Write every queued row now
+        Returns: number of rows written
+        """
+        with self._flush_lock:
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not entries:
+                return 0
+            try:
+                ActivityLog.objects.bulk_create(entries, batch_size=500)
+                return len(entries)
+            except Exception:
+                # One bad row (e.g. a user deleted meanwhile) must not lose the rest
+                logger.exception('Bulk write of %s activity log rows failed; writing one by one', len(entries))
+                return self._write_each(entries)
+
+    def _write_each(self, entries):
+        written = 0
+        for entry in entries:
+            try:
+                entry.save(force_insert=True)
+                written += 1
+            except Exception:
+                logger.exception('Dropped activity log row: %s', entry.description)
+        return written
+
+    def _ensure_thread(self):
+        # A forked worker inherits the object but not the thread
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(get_queue_size())
+                self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(get_flush_interval())
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Activity log flush failed')
+
+    def shutdown(self):
+        """Stop the writer thread and write what is left; later rows are written inline"""
+        self._stopped.set()
+        self._wake.set()
+        return self.flush()
+
+
+writer = ActivityLogWriter()
+atexit.register(writer.shutdown)
+
+
+def record_activity(**fields):
+    """Log an ActivityLog row (same fields as ActivityLog.objects.create)"""
+    entry = ActivityLog(**fields)
+    if not getattr(settings, 'ACTIVITY_LOG_BUFFERED', True):
+        entry.save()
+        return entry
+    # Outside a transaction this queues right away
+    transaction.on_commit(lambda: writer.record(entry))
+    return entry
+
+
+def flush_activity_log():
+    """Write queued rows now (e.g. before reading the log back)"""
+    return writer.flush()
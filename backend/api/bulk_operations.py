@@ -3,14 +3,51 @@ Bulk operations utilities for CSV import/export and batch processing
 """
 import csv
 import io
-from django.db import transaction
+from decimal import Decimal, InvalidOperation
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.contrib.auth import get_user_model
-from .models import Course, Batch, Enrollment, Notification, ActivityLog
+from .models import (
+    Course, Batch, Enrollment, Attendance, AssignmentSubmission, ExamResult, Notification
+)
+from .audit import record_activity
+from .counters import reconcile_attendance_counts
+from .grading import get_scale
+from .prerequisites import completed_course_ids, direct_prerequisite_ids
+from .progress import recompute_for_students, to_percentage
+from .seat_reservation import bulk_confirm_hold, enroll_with_seat, hold_seats, SeatUnavailable
 from django.utils import timezone
 
 User = get_user_model()
 
 
+def read_csv_rows(csv_file):
+    """
+    Rows of an uploaded CSV as dicts keyed by the header line
+    Raises: ValueError if the file cannot be decoded
+    """
+    try:
+        csv_data = csv_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValueError('CSV file must be UTF-8 encoded')
+    return list(csv.DictReader(io.StringIO(csv_data)))
+
+
+def parse_marks(value, max_marks):
+    """
+    Returns: (Decimal or None, list of errors)
+    """
+    try:
+        marks = Decimal(str(value).strip())
+        if not marks.is_finite():
+            raise InvalidOperation
+    except (InvalidOperation, ValueError):
+        return None, ['marks must be a number']
+    if not (0 <= marks <= max_marks):
+        return None, [f'marks must be between 0 and {max_marks}']
+    return marks, []
+
+
 class BulkStudentImporter:
     """Handle bulk student import from CSV"""
     
@@ -109,7 +146,7 @@ class BulkStudentImporter:
                     self.success_count += 1
                 
                 # Log activity
-                ActivityLog.objects.create(
+                record_activity(
                     user=self.created_by,
                     action='bulk_import',
                     description=f'Bulk imported {self.success_count} students via CSV',
@@ -203,19 +240,85 @@ class BulkStudentImporter:
 class BulkEnrollmentProcessor:
     """Handle bulk enrollment operations"""
     
-    def __init__(self, batch, student_ids, created_by):
+    COMMIT_MODES = ('bulk', 'row')
+    
+    def __init__(self, batch, student_ids, created_by, commit_mode='bulk'):
+        if commit_mode not in self.COMMIT_MODES:
+            raise ValueError(f'commit_mode must be one of {", ".join(self.COMMIT_MODES)}')
         self.batch = batch
         self.student_ids = student_ids
         self.created_by = created_by
+        self.commit_mode = commit_mode
         self.results = {
             'success': [],
             'errors': [],
             'warnings': []
         }
+        self.cohort = None
+    
+    def prefetch_cohort(self):
+        """
+        Load everything validation needs for all candidate students in a fixed
+        number of queries, independent of the number of students
+        """
+        from .schedule_conflicts import load_slots_by_student
+        
+        course = self.batch.course
+        student_ids = set()
+        for student_id in self.student_ids:
+            try:
+                student_ids.add(int(student_id))
+            except (TypeError, ValueError):
+                continue
+        
+        students = User.objects.filter(id__in=student_ids, role='student').in_bulk()
+        
+        # Existing enrollments in this batch (any status) or another active one in this course
+        in_batch = set()
+        in_course = {}
+        for enrollment in Enrollment.objects.filter(student_id__in=students).filter(
+            Q(batch=self.batch) | Q(batch__course=course, status__in=['active', 'pending'])
+        ).select_related('batch'):
+            if enrollment.batch_id == self.batch.id:
+                in_batch.add(enrollment.student_id)
+            elif enrollment.student_id not in in_course:
+                in_course[enrollment.student_id] = enrollment.batch.batch_number
+        
+        # Prerequisites: ids come from the cached map, one query for everything completed
+        prerequisites = []
+        completed = {}
+        if course.prerequisite_enforcement in ['strict', 'soft']:
+            prereq_ids = direct_prerequisite_ids(course.id)
+            if prereq_ids:
+                prerequisites = list(Course.objects.filter(id__in=prereq_ids))
+                completed = completed_course_ids(students, prereq_ids)
+        
+        # Schedule slots of the target batch and of every student
+        target_slots = []
+        slots_by_student = {}
+        if course.schedule_conflict_checking in ['strict', 'warning']:
+            target_slots = list(self.batch.schedules.all())
+            if target_slots:
+                slots_by_student = load_slots_by_student(students)
+        
+        self.cohort = {
+            'students': students,
+            'in_batch': in_batch,
+            'in_course': in_course,
+            'prerequisites': prerequisites,
+            'completed': completed,
+            'target_slots': target_slots,
+            'slots_by_student': slots_by_student,
+        }
+        return self.cohort
     
     def validate_student_enrollment(self, student):
-        """Validate if student can be enrolled in batch"""
-        from .models import Schedule
+        """Validate if student can be enrolled in batch (uses the prefetched cohort, no queries)"""
+        from .schedule_conflicts import conflicts_for_slots
+        
+        if self.cohort is None:
+            self.prefetch_cohort()
+        cohort = self.cohort
         
         errors = []
         warnings = []
@@ -225,114 +328,66 @@ class BulkEnrollmentProcessor:
             errors.append('Batch is not active')
             return errors, warnings
         
-        # Check capacity
-        if self.batch.enrolled_count >= self.batch.capacity:
+        # Check capacity (the seat itself is taken atomically at enrollment time)
+        if self.batch.available_seats <= 0:
             errors.append('Batch is full')
             return errors, warnings
         
         # Check if already enrolled
-        if Enrollment.objects.filter(student=student, batch=self.batch).exists():
+        if student.id in cohort['in_batch']:
             errors.append('Already enrolled in this batch')
             return errors, warnings
         
         # Check if enrolled in another batch of same course
-        existing = Enrollment.objects.filter(
-            student=student,
-            batch__course=self.batch.course,
-            status__in=['active', 'pending']
-        ).first()
-        if existing:
-            errors.append(f'Already enrolled in {self.batch.course.name} (Batch {existing.batch.batch_number})')
+        if student.id in cohort['in_course']:
+            errors.append(f'Already enrolled in {self.batch.course.name} (Batch {cohort["in_course"][student.id]})')
             return errors, warnings
         
         # Check prerequisites
         course = self.batch.course
-        if course.prerequisite_enforcement == 'strict':
-            met, missing = course.check_prerequisites_met(student)
-            if not met:
-                missing_names = [f"{p.code}" for p in missing]
-                errors.append(f'Prerequisites not met: {", ".join(missing_names)}')
-        elif course.prerequisite_enforcement == 'soft':
-            met, missing = course.check_prerequisites_met(student)
-            if not met:
-                missing_names = [f"{p.code}" for p in missing]
-                warnings.append(f'Prerequisites not met: {", ".join(missing_names)}')
+        if cohort['prerequisites']:
+            done = cohort['completed'].get(student.id, set())
+            missing_names = [p.code for p in cohort['prerequisites'] if p.id not in done]
+            if missing_names:
+                message = f'Prerequisites not met: {", ".join(missing_names)}'
+                if course.prerequisite_enforcement == 'strict':
+                    errors.append(message)
+                else:
+                    warnings.append(message)
         
         # Check schedule conflicts
-        if course.schedule_conflict_checking == 'strict':
-            has_conflicts, conflicts = Schedule.check_schedule_conflicts(student, self.batch)
-            if has_conflicts:
-                conflict_desc = conflicts[0]['conflict_description'] if conflicts else 'Schedule conflict'
-                errors.append(f'Schedule conflict: {conflict_desc}')
-        elif course.schedule_conflict_checking == 'warning':
-            has_conflicts, conflicts = Schedule.check_schedule_conflicts(student, self.batch)
-            if has_conflicts:
-                warnings.append(f'Schedule conflicts detected ({len(conflicts)} conflict(s))')
+        if cohort['target_slots']:
+            conflicts = conflicts_for_slots(
+                self.batch, cohort['target_slots'], cohort['slots_by_student'].get(student.id, [])
+            )
+            if conflicts:
+                if course.schedule_conflict_checking == 'strict':
+                    errors.append(f'Schedule conflict: {conflicts[0]["conflict_description"]}')
+                else:
+                    warnings.append(f'Schedule conflicts detected ({len(conflicts)} conflict(s))')
         
         return errors, warnings
     
     def process(self):
-        """Process bulk enrollment"""
-        for student_id in self.student_ids:
-            try:
-                student = User.objects.get(id=student_id, role='student')
-                
-                # Validate
-                errors, warnings = self.validate_student_enrollment(student)
-                
-                if errors:
-                    self.results['errors'].append({
-                        'student_id': student_id,
-                        'student_name': student.get_full_name(),
-                        'username': student.username,
-                        'errors': errors
-                    })
-                    continue
-                
-                # Create enrollment
-                enrollment = Enrollment.objects.create(
-                    student=student,
-                    batch=self.batch,
-                    course=self.batch.course,
-                    status='active'
-                )
-                
-                # Send notification
-                Notification.objects.create(
-                    user=student,
-                    notification_type='enrollment',
-                    channel='in_app',
-                    title='Enrollment Confirmation',
-                    message=f'You have been enrolled in {self.batch.course.name} - Batch {self.batch.batch_number}',
-                    related_enrollment=enrollment
-                )
-                
-                self.results['success'].append({
-                    'student_id': student_id,
-                    'student_name': student.get_full_name(),
-                    'username': student.username,
-                    'enrollment_id': enrollment.id,
-                    'warnings': warnings
-                })
-                
-                if warnings:
-                    self.results['warnings'].extend([
-                        f"{student.username}: {w}" for w in warnings
-                    ])
-                
-            except User.DoesNotExist:
-                self.results['errors'].append({
-                    'student_id': student_id,
-                    'errors': ['Student not found']
-                })
-            except Exception as e:
-                self.results['errors'].append({
-                    'student_id': student_id,
-                    'errors': [str(e)]
-                })
+        """
+        Process bulk enrollment
+        
+        commit_mode='bulk' validates everyone first and then inserts the
+        enrollments and notifications in one transaction; 'row' enrolls and
+        notifies students one at a time.
+        """
+        self.prefetch_cohort()
+        
+        if self.commit_mode == 'bulk':
+            self._process_bulk()
+        else:
+            for student_id in self.student_ids:
+                student, warnings = self._validate_row(student_id)
+                if student is not None:
+                    self._commit_row(student_id, student, warnings)
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=self.created_by,
             action='bulk_enrollment',
             description=f'Bulk enrolled {len(self.results["success"])} students in {self.batch}',
@@ -340,3 +395,450 @@ class BulkEnrollmentProcessor:
         )
         
         return self.results
+    
+    def _validate_row(self, student_id):
+        """
+        Validate one requested id, recording failures in results
+        Returns: (student, warnings), student is None when the row failed
+        """
+        try:
+            student = self.cohort['students'].get(int(student_id))
+        except (TypeError, ValueError):
+            student = None
+        if student is None:
+            self._add_error(student_id, None, ['Student not found'])
+            return None, []
+        
+        try:
+            errors, warnings = self.validate_student_enrollment(student)
+        except Exception as e:
+            errors, warnings = [str(e)], []
+        
+        if errors:
+            self._add_error(student_id, student, errors)
+            return None, []
+        return student, warnings
+    
+    def _commit_row(self, student_id, student, warnings):
+        """Reserve a seat, enroll and notify a single student"""
+        try:
+            enrollment = enroll_with_seat(self.batch, student)
+        except SeatUnavailable:
+            self.batch.refresh_from_db(fields=['enrolled_count', 'held_count'])
+            self._add_error(student_id, student, ['Batch is full'])
+            return
+        except IntegrityError:
+            self._add_error(student_id, student, ['Already enrolled in this batch'])
+            return
+        except Exception as e:
+            self._add_error(student_id, student, [str(e)])
+            return
+        
+        # Later duplicates of this student in the list are already enrolled
+        self.cohort['in_batch'].add(student.id)
+        
+        Notification.objects.create(**self._notification_fields(enrollment))
+        self._add_success(student_id, student, enrollment, warnings)
+    
+    def _process_bulk(self):
+        """Validate every row, then commit all accepted students at once"""
+        accepted = []
+        for student_id in self.student_ids:
+            student, warnings = self._validate_row(student_id)
+            if student is not None:
+                accepted.append((student_id, student, warnings))
+                # Duplicates later in the list are rejected like in row mode
+                self.cohort['in_batch'].add(student.id)
+        
+        if not accepted:
+            return
+        
+        try:
+            with transaction.atomic():
+                try:
+                    hold = hold_seats(self.batch, seats=len(accepted), partial=True)
+                except SeatUnavailable:
+                    hold = None
+                
+                # First come, first served: rows beyond the free seats are rejected
+                seated = accepted[:hold.seats] if hold else []
+                enrollments = bulk_confirm_hold(hold, [student for _, student, _ in seated]) if seated else []
+                
+                Notification.objects.bulk_create([
+                    Notification(**self._notification_fields(enrollment))
+                    for enrollment in enrollments
+                ], batch_size=500)
+        except IntegrityError:
+            # Someone enrolled one of these students concurrently - the whole
+            # insert rolled back, so fall back to per-row commits for precise errors
+            self.batch.refresh_from_db(fields=['enrolled_count', 'held_count'])
+            for student_id, student, warnings in accepted:
+                self._commit_row(student_id, student, warnings)
+            return
+        
+        for (student_id, student, warnings), enrollment in zip(seated, enrollments):
+            self._add_success(student_id, student, enrollment, warnings)
+        for student_id, student, _ in accepted[len(seated):]:
+            self._add_error(student_id, student, ['Batch is full'])
+        
+        self.batch.refresh_from_db(fields=['enrolled_count', 'held_count'])
+    
+    def _notification_fields(self, enrollment):
+        return {
+            'user': enrollment.student,
+            'notification_type': 'enrollment',
+            'channel': 'in_app',
+            'title': 'Enrollment Confirmation',
+            'message': f'You have been enrolled in {self.batch.course.name} - Batch {self.batch.batch_number}',
+            'related_enrollment': enrollment,
+        }
+    
+    def _add_success(self, student_id, student, enrollment, warnings):
+        self.results['success'].append({
+            'student_id': student_id,
+            'student_name': student.get_full_name(),
+            'username': student.username,
+            'enrollment_id': enrollment.id,
+            'warnings': warnings
+        })
+        if warnings:
+            self.results['warnings'].extend([
+                f"{student.username}: {w}" for w in warnings
+            ])
+    
+    def _add_error(self, student_id, student, errors):
+        if student is None:
+            self.results['errors'].append({
+                'student_id': student_id,
+                'errors': errors
+            })
+            return
+        self.results['errors'].append({
+            'student_id': student_id,
+            'student_name': student.get_full_name(),
+            'username': student.username,
+            'errors': errors
+        })
+
+
+class ExamResultImporter:
+    """
+    Enter results for a whole class at once
+    
+    Rows identify the student by student_id or username and carry marks and
+    optional remarks. Students are resolved in one query, results are upserted
+    with a single bulk insert on (exam, student) and progress is recomputed
+    once. Nothing is saved unless every row is valid.
+    """
+    
+    UPDATE_FIELDS = ['marks_obtained', 'percentage', 'grade', 'status', 'remarks', 'entered_by']
+    
+    def __init__(self, exam, rows, entered_by, first_row=1):
+        self.exam = exam
+        self.rows = rows
+        self.entered_by = entered_by
+        # Row number reported for rows[0] (2 for a CSV with a header line)
+        self.first_row = first_row
+        self.errors = []
+        self.results = []
+    
+    def resolve_students(self):
+        """
+        Students of the exam's batch named by the rows (one query)
+        Returns: (by id, by username)
+        """
+        ids = set()
+        usernames = set()
+        for row in self.rows:
+            if not isinstance(row, dict):
+                continue
+            student_id = str(row.get('student_id') or '').strip()
+            if student_id.isdigit():
+                ids.add(int(student_id))
+            elif row.get('username'):
+                usernames.add(str(row['username']).strip())
+        
+        students = [
+            enrollment.student for enrollment in Enrollment.objects.filter(
+                Q(student_id__in=ids) | Q(student__username__in=usernames),
+                batch_id=self.exam.batch_id
+            ).select_related('student')
+        ]
+        return {s.id: s for s in students}, {s.username: s for s in students}
+    
+    def validate_row(self, row, by_id, by_username):
+        """
+        Returns: (ExamResult or None, list of errors)
+        """
+        if not isinstance(row, dict):
+            return None, ['Row must be an object']
+        
+        errors = []
+        student_id = str(row.get('student_id') or '').strip()
+        username = str(row.get('username') or '').strip()
+        if student_id:
+            student = by_id.get(int(student_id)) if student_id.isdigit() else None
+        elif username:
+            student = by_username.get(username)
+        else:
+            student = None
+            errors.append('student_id or username is required')
+        if student is None and not errors:
+            errors.append('Student not enrolled in this batch')
+        
+        marks, marks_errors = parse_marks(row.get('marks'), self.exam.max_marks)
+        errors.extend(marks_errors)
+        
+        if errors:
+            return None, errors
+        
+        percentage = to_percentage(marks / self.exam.max_marks * 100)
+        return ExamResult(
+            exam=self.exam,
+            student=student,
+            marks_obtained=marks,
+            percentage=percentage,
+            status='pass' if marks >= self.exam.passing_marks else 'fail',
+            remarks=str(row.get('remarks') or ''),
+            entered_by=self.entered_by
+        ), []
+    
+    def process(self):
+        """
+        Validate every row, then upsert all results and recompute progress
+        Returns: list of saved ExamResult (empty when any row failed)
+        """
+        by_id, by_username = self.resolve_students()
+        
+        results = []
+        seen = set()
+        for line_number, row in enumerate(self.rows, start=self.first_row):
+            result, errors = self.validate_row(row, by_id, by_username)
+            if result is not None and result.student_id in seen:
+                result, errors = None, ['Duplicate row for this student']
+            if errors:
+                self.errors.append({
+                    'row': line_number,
+                    'student_id': row.get('student_id') if isinstance(row, dict) else None,
+                    'username': row.get('username') if isinstance(row, dict) else None,
+                    'errors': errors
+                })
+                continue
+            seen.add(result.student_id)
+            results.append(result)
+        
+        if self.errors or not results:
+            return []
+        
+        # Grade the whole class against the course's scale in one call
+        letters = get_scale(self.exam.batch.course_id).grade_many([result.percentage for result in results])
+        for result, (letter, _) in zip(results, letters):
+            result.grade = letter
+        
+        with transaction.atomic():
+            ExamResult.objects.bulk_create(
+                results,
+                update_conflicts=True,
+                unique_fields=['exam', 'student'],
+                update_fields=self.UPDATE_FIELDS,
+                batch_size=500
+            )
+            recompute_for_students(self.exam.batch, seen)
+        
+        self.results = list(
+            ExamResult.objects.filter(exam=self.exam, student_id__in=seen)
+            .select_related('exam', 'student', 'entered_by')
+        )
+        return self.results
+
+
+class BulkGradingProcessor:
+    """
+    Grade many submissions of one assignment at once
+    
+    Rows identify the submission by submission_id or the student's username
+    and carry marks and optional feedback. Submissions are loaded in one
+    query, late penalties applied in memory, everything written with one
+    bulk_update and progress recomputed once for the affected students.
+    Nothing is saved unless every row is valid.
+    """
+    
+    UPDATE_FIELDS = ['marks_obtained', 'feedback', 'status', 'graded_by', 'graded_at', 'late_penalty_applied']
+    
+    def __init__(self, assignment, rows, graded_by, first_row=1):
+        self.assignment = assignment
+        self.rows = rows
+        self.graded_by = graded_by
+        # Row number reported for rows[0] (2 for a CSV with a header line)
+        self.first_row = first_row
+        self.errors = []
+    
+    def load_submissions(self):
+        """
+        Submissions of the assignment named by the rows (one query)
+        Returns: (by id, by username)
+        """
+        ids = set()
+        usernames = set()
+        for row in self.rows:
+            if not isinstance(row, dict):
+                continue
+            submission_id = str(row.get('submission_id') or '').strip()
+            if submission_id.isdigit():
+                ids.add(int(submission_id))
+            elif row.get('username'):
+                usernames.add(str(row['username']).strip())
+        
+        submissions = list(
+            AssignmentSubmission.objects.filter(
+                Q(id__in=ids) | Q(student__username__in=usernames),
+                assignment=self.assignment
+            ).select_related('student')
+        )
+        return {s.id: s for s in submissions}, {s.student.username: s for s in submissions}
+    
+    def validate_row(self, row, by_id, by_username):
+        """
+        Returns: (submission or None, marks, list of errors)
+        """
+        if not isinstance(row, dict):
+            return None, None, ['Row must be an object']
+        
+        errors = []
+        submission_id = str(row.get('submission_id') or '').strip()
+        username = str(row.get('username') or '').strip()
+        if submission_id:
+            submission = by_id.get(int(submission_id)) if submission_id.isdigit() else None
+        elif username:
+            submission = by_username.get(username)
+        else:
+            submission = None
+            errors.append('submission_id or username is required')
+        if submission is None and not errors:
+            errors.append('Submission not found for this assignment')
+        
+        marks, marks_errors = parse_marks(row.get('marks'), self.assignment.max_marks)
+        errors.extend(marks_errors)
+        return (None if errors else submission), marks, errors
+    
+    def process(self):
+        """
+        Validate every row, then write all grades and recompute progress
+        Returns: list of graded submissions (empty when any row failed)
+        """
+        by_id, by_username = self.load_submissions()
+        graded_at = timezone.now()
+        
+        graded = []
+        seen = set()
+        for line_number, row in enumerate(self.rows, start=self.first_row):
+            submission, marks, errors = self.validate_row(row, by_id, by_username)
+            if submission is not None and submission.id in seen:
+                submission, errors = None, ['Duplicate row for this submission']
+            if errors:
+                self.errors.append({
+                    'row': line_number,
+                    'submission_id': row.get('submission_id') if isinstance(row, dict) else None,
+                    'username': row.get('username') if isinstance(row, dict) else None,
+                    'errors': errors
+                })
+                continue
+            
+            feedback = str(row.get('feedback') or '')
+            submission.set_grade(marks, feedback, self.graded_by, graded_at, assignment=self.assignment)
+            seen.add(submission.id)
+            graded.append(submission)
+        
+        if self.errors or not graded:
+            return []
+        
+        with transaction.atomic():
+            AssignmentSubmission.objects.bulk_update(graded, self.UPDATE_FIELDS, batch_size=500)
+            recompute_for_students(self.assignment.batch, {s.student_id for s in graded})
+        
+        return graded
+
+
+class AttendanceRollCall:
+    """
+    Mark a whole class session at once
+    
+    marks maps enrollment id -> attendance status. Enrollments are checked
+    against the schedule's batch in one query, every mark is upserted on
+    (enrollment, schedule) in one bulk insert and the enrollment attendance
+    counters are rolled up for the marked enrollments. Nothing is saved
+    unless every mark is valid.
+    """
+    
+    STATUSES = {choice for choice, _ in Attendance.ATTENDANCE_CHOICES}
+    
+    def __init__(self, schedule, marks, marked_by, ip_address=None):
+        self.schedule = schedule
+        self.marks = marks
+        self.marked_by = marked_by
+        self.ip_address = ip_address
+        self.errors = []
+        self.summary = {}
+    
+    def process(self):
+        """
+        Returns: number of marks saved (0 when any mark failed)
+        """
+        requested = {}
+        for enrollment_id, mark_status in self.marks.items():
+            errors = []
+            try:
+                enrollment_id = int(enrollment_id)
+            except (TypeError, ValueError):
+                errors.append('Invalid enrollment id')
+            if not isinstance(mark_status, str) or mark_status not in self.STATUSES:
+                errors.append(f'status must be one of: {", ".join(sorted(self.STATUSES))}')
+            if errors:
+                self.errors.append({'enrollment_id': enrollment_id, 'errors': errors})
+            else:
+                requested[enrollment_id] = mark_status
+        
+        in_batch = set(
+            Enrollment.objects.filter(pk__in=requested, batch_id=self.schedule.batch_id)
+            .exclude(status='dropped').values_list('id', flat=True)
+        ) if requested else set()
+        for enrollment_id in requested.keys() - in_batch:
+            self.errors.append({'enrollment_id': enrollment_id, 'errors': ['Enrollment not in this batch']})
+        
+        if self.errors or not requested:
+            return 0
+        
+        with transaction.atomic():
+            Attendance.objects.bulk_create(
+                [
+                    Attendance(
+                        enrollment_id=enrollment_id,
+                        schedule=self.schedule,
+                        status=mark_status,
+                        marked_by=self.marked_by
+                    )
+                    for enrollment_id, mark_status in requested.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['enrollment', 'schedule'],
+                # A corrected mark records who changed it and when
+                update_fields=['status', 'marked_by', 'marked_date'],
+                batch_size=500
+            )
+            # bulk_create skips the counter signals
+            reconcile_attendance_counts(list(requested))
+            
+            for mark_status in requested.values():
+                self.summary[mark_status] = self.summary.get(mark_status, 0) + 1
+            record_activity(
+                user=self.marked_by,
+                action='attendance_mark',
+                description=(
+                    f'{self.marked_by.username} took roll call for {self.schedule.batch} '
+                    f'({self.schedule.get_day_of_week_display()}): '
+                    + ', '.join(f'{n} {mark_status}' for mark_status, n in sorted(self.summary.items()))
+                ),
+                ip_address=self.ip_address
+            )
+        
+        return len(requested)
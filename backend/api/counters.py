@@ -0,0 +1,157 @@
+"""
+Counter maintenance for Batch.enrolled_count, Course.enrolled_count and the
+per-enrollment attendance counters (Enrollment.present_count etc.)
+
+Writes adjust the counters with F() deltas instead of recounting the
+enrollment or attendance table. reconcile_enrollment_counts() and
+reconcile_attendance_counts() repair any drift (e.g. from bulk_create or
+queryset.update() calls that bypass signals) with one grouped query per table.
+
+Attendance counter changes also flag the enrollment's StudentProgress as
+risk_stale, so refresh_risk_scores recomputes only the students whose
+attendance moved.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Attendance, Batch, Course, Enrollment, SeatHold, StudentProgress
+
+# Enrollment statuses that occupy a seat
+COUNTED_STATUSES = ('active', 'pending')
+
+# Attendance status -> Enrollment counter field
+ATTENDANCE_COUNTERS = {
+    'present': 'present_count',
+    'late': 'late_count',
+    'absent': 'absent_count',
+    'excused': 'excused_count',
+}
+
+# Attendance statuses that count as attended
+ATTENDED_STATUSES = ('present', 'late')
+
+
+def shift_enrollment_counts(batch_id, delta):
+    """Add `delta` to the enrolled_count of a batch and of its course"""
+    if not batch_id or not delta:
+        return
+    Batch.objects.filter(pk=batch_id).update(enrolled_count=F('enrolled_count') + delta)
+    Course.objects.filter(batches=batch_id).update(enrolled_count=F('enrolled_count') + delta)
+
+
+def reconcile_enrollment_counts(batch_ids=None, dry_run=False):
+    """
+    Recompute enrolled_count (batches and courses) and held_count (batches)
+    of batch_ids and their courses (default: all)
+    Returns: dict with the rows that had drifted, as {id: (stored, actual)}
+    """
+    enrollments = Enrollment.objects.filter(status__in=COUNTED_STATUSES, batch__isnull=False)
+    holds = SeatHold.objects.filter(status='held')
+    batches = Batch.objects.only('id', 'enrolled_count', 'held_count')
+    courses = Course.objects.only('id', 'enrolled_count')
+    if batch_ids is not None:
+        course_ids = list(Batch.objects.filter(pk__in=batch_ids).values_list('course_id', flat=True).distinct())
+        holds = holds.filter(batch_id__in=batch_ids)
+        batches = batches.filter(pk__in=batch_ids)
+        courses = courses.filter(pk__in=course_ids)
+        course_enrollments = enrollments.filter(batch__course_id__in=course_ids)
+        enrollments = enrollments.filter(batch_id__in=batch_ids)
+    else:
+        course_enrollments = enrollments
+
+    with transaction.atomic():
+        batch_actual = dict(
+            enrollments.values('batch_id').annotate(n=Count('id')).values_list('batch_id', 'n')
+        )
+        held_actual = dict(
+            holds.values('batch_id').annotate(n=Sum('seats')).values_list('batch_id', 'n')
+        )
+        course_actual = dict(
+            course_enrollments.values('batch__course_id').annotate(n=Count('id'))
+            .values_list('batch__course_id', 'n')
+        )
+
+        drift = {'batches': {}, 'held': {}, 'courses': {}}
+        changed_batches = []
+        for batch in batches:
+            enrolled = batch_actual.get(batch.id, 0)
+            held = held_actual.get(batch.id, 0)
+            if batch.enrolled_count != enrolled:
+                drift['batches'][batch.id] = (batch.enrolled_count, enrolled)
+            if batch.held_count != held:
+                drift['held'][batch.id] = (batch.held_count, held)
+            if batch.enrolled_count != enrolled or batch.held_count != held:
+                batch.enrolled_count = enrolled
+                batch.held_count = held
+                changed_batches.append(batch)
+
+        changed_courses = []
+        for course in courses:
+            enrolled = course_actual.get(course.id, 0)
+            if course.enrolled_count != enrolled:
+                drift['courses'][course.id] = (course.enrolled_count, enrolled)
+                course.enrolled_count = enrolled
+                changed_courses.append(course)
+
+        if not dry_run:
+            Batch.objects.bulk_update(changed_batches, ['enrolled_count', 'held_count'], batch_size=500)
+            Course.objects.bulk_update(changed_courses, ['enrolled_count'], batch_size=500)
+
+    return drift
+
+
+def shift_attendance_counts(enrollment_id, status, delta):
+    """Add `delta` to the counter of one attendance status on an enrollment"""
+    field = ATTENDANCE_COUNTERS.get(status)
+    if not enrollment_id or not field or not delta:
+        return
+    Enrollment.objects.filter(pk=enrollment_id).update(**{field: F(field) + delta})
+    mark_progress_stale([enrollment_id])
+
+
+def mark_progress_stale(enrollment_ids):
+    """Flag progress rows whose inputs changed for the next risk refresh"""
+    if enrollment_ids:
+        StudentProgress.objects.filter(enrollment_id__in=enrollment_ids, risk_stale=False).update(risk_stale=True)
+
+
+def reconcile_attendance_counts(enrollment_ids=None, dry_run=False):
+    """
+    Recompute the attendance counters of enrollment_ids (default: all)
+    from one grouped query over the attendance table
+    Returns: {enrollment_id: (stored, actual)} for the rows that had drifted,
+    counts given as tuples in ATTENDANCE_COUNTERS order
+    """
+    fields = list(ATTENDANCE_COUNTERS.values())
+    marks = Attendance.objects.all()
+    enrollments = Enrollment.objects.only('id', *fields)
+    if enrollment_ids is not None:
+        marks = marks.filter(enrollment_id__in=enrollment_ids)
+        enrollments = enrollments.filter(pk__in=enrollment_ids)
+
+    with transaction.atomic():
+        actual = {}
+        for enrollment_id, status, n in (
+            marks.values('enrollment_id', 'status').annotate(n=Count('id'))
+            .values_list('enrollment_id', 'status', 'n')
+        ):
+            if status in ATTENDANCE_COUNTERS:
+                actual.setdefault(enrollment_id, {})[ATTENDANCE_COUNTERS[status]] = n
+
+        drift = {}
+        changed = []
+        for enrollment in enrollments:
+            counts = actual.get(enrollment.id, {})
+            stored_row = tuple(getattr(enrollment, field) for field in fields)
+            actual_row = tuple(counts.get(field, 0) for field in fields)
+            if stored_row != actual_row:
+                drift[enrollment.id] = (stored_row, actual_row)
+                for field, value in zip(fields, actual_row):
+                    setattr(enrollment, field, value)
+                changed.append(enrollment)
+
+        if not dry_run:
+            Enrollment.objects.bulk_update(changed, fields, batch_size=500)
+            mark_progress_stale(list(drift))
+
+    return drift
@@ -0,0 +1,128 @@
+"""
+Grading scales
+
+Letter grades and GPAs come from GradingScale/GradeBand: the course's own
+scale if it has one, otherwise the institute default, otherwise
+DEFAULT_BANDS. All scales load with one query into sorted threshold
+lists, which are kept in this process. A lookup is a bisect over those
+lists, and grade_many() grades a whole list of percentages against one
+scale. Signals (see signals.py) drop the loaded scales whenever a scale
+or band changes. GRADING_SCALE_CACHE_TIMEOUT limits how long other
+processes can keep serving an old scale.
+"""
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import GradeBand
+
+# (letter, min_percentage, gpa): used when no institute scale is configured
+DEFAULT_BANDS = (
+    ('A+', Decimal('90'), Decimal('4.00')),
+    ('A', Decimal('85'), Decimal('3.70')),
+    ('B+', Decimal('80'), Decimal('3.30')),
+    ('B', Decimal('75'), Decimal('3.00')),
+    ('C+', Decimal('70'), Decimal('2.70')),
+    ('C', Decimal('65'), Decimal('2.30')),
+    ('D', Decimal('60'), Decimal('2.00')),
+    ('F', Decimal('0'), Decimal('0.00')),
+)
+
+
+class Scale:
+    """
+    Sorted, read-only form of a grading scale
+
+    A percentage gets the band with the highest min_percentage not above
+    it; anything below every band gets the lowest band.
+    """
+
+    def __init__(self, bands):
+        ordered = sorted(bands, key=lambda band: band[1])
+        self.thresholds = [minimum for _, minimum, _ in ordered]
+        self.letters = [letter for letter, _, _ in ordered]
+        self.gpas = [gpa for _, _, gpa in ordered]
+
+    def _index(self, percentage):
+        return max(bisect_right(self.thresholds, percentage) - 1, 0)
+
+    def grade(self, percentage):
+        """Returns: (letter, gpa)"""
+        index = self._index(percentage)
+        return self.letters[index], self.gpas[index]
+
+    def letter(self, percentage):
+        return self.letters[self._index(percentage)]
+
+    def gpa(self, percentage):
+        return self.gpas[self._index(percentage)]
+
+    def grade_many(self, percentages):
+        """Returns: list of (letter, gpa), one per percentage"""
+        thresholds, letters, gpas = self.thresholds, self.letters, self.gpas
+        grades = []
+        for percentage in percentages:
+            index = max(bisect_right(thresholds, percentage) - 1, 0)
+            grades.append((letters[index], gpas[index]))
+        return grades
+
+    def bands(self):
+        """(letter, min_percentage, gpa), best grade first"""
+        return list(zip(reversed(self.letters), reversed(self.thresholds), reversed(self.gpas)))
+
+
+# course_id (None: institute default) -> Scale, and when it was loaded
+_scales = None
+_loaded_at = 0.0
+
+
+def get_cache_timeout():
+    """Safety net for processes that miss another process's invalidation"""
+    return getattr(settings, 'GRADING_SCALE_CACHE_TIMEOUT', 300)
+
+
+def load_scales():
+    """Every configured scale from one query"""
+    bands = {}
+    for course_id, letter, minimum, gpa in GradeBand.objects.values_list(
+        'scale__course_id', 'letter', 'min_percentage', 'gpa'
+    ):
+        bands.setdefault(course_id, []).append((letter, minimum, gpa))
+    scales = {course_id: Scale(course_bands) for course_id, course_bands in bands.items()}
+    scales.setdefault(None, Scale(DEFAULT_BANDS))
+    return scales
+
+
+def get_scales():
+    global _scales, _loaded_at
+    if _scales is None or time.monotonic() - _loaded_at > get_cache_timeout():
+        _scales = load_scales()
+        _loaded_at = time.monotonic()
+    return _scales
+
+
+def invalidate_grading_scales():
+    global _scales
+    _scales = None
+
+
+def get_scale(course_id=None):
+    """The course's scale, or the institute default"""
+    scales = get_scales()
+    return scales.get(course_id) or scales[None]
+
+
+def grade_percentages(percentages, course_id=None):
+    """Grade a list of percentages in one call; returns [(letter, gpa), ...]"""
+    return get_scale(course_id).grade_many(percentages)
+
+
+def grade_letters():
+    """Every letter in use, default scale order first (for grade histograms)"""
+    scales = get_scales()
+    letters = [letter for letter, _, _ in scales[None].bands()]
+    for scale in scales.values():
+        letters.extend(letter for letter, _, _ in scale.bands() if letter not in letters)
+    return letters
@@ -0,0 +1,144 @@
+"""
+Shared helpers for the bench_* management commands
+
+Benchmarks run against a throwaway database created from the current
+migrations, so they never touch the development data in db.sqlite3.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import time as dt_time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def scratch_database():
+    """Create a fresh test database for the duration of the block"""
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    scratch_file = None
+
+    if connection.vendor == 'sqlite':
+        # Use a file instead of the in-memory default so worker threads share it
+        fd, scratch_file = tempfile.mkstemp(suffix='.sqlite3', prefix='bench_')
+        os.close(fd)
+        test_settings['NAME'] = scratch_file
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        # Buffered audit rows belong to the scratch database: write them
+        # before it goes away, not at exit against db.sqlite3
+        from api.audit import flush_activity_log
+        flush_activity_log()
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        if scratch_file and os.path.exists(scratch_file):
+            os.remove(scratch_file)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+@contextmanager
+def timer(samples):
+    """Append the elapsed wall time of the block (in ms) to samples"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append((time.perf_counter() - start) * 1000)
+
+
+@contextmanager
+def count_queries():
+    """Count the queries issued on the default connection inside the block"""
+    # The query log is a bounded deque: start empty so long runs still count
+    reset_queries()
+    with CaptureQueriesContext(connection) as ctx:
+        yield ctx
+
+
+# ---------------------------------------------------------------- fixtures --
+
+def make_students(count, prefix='bench_student'):
+    """Bulk-create student users (without password hashing)"""
+    from api.models import User
+
+    existing = User.objects.filter(username__startswith=prefix).count()
+    User.objects.bulk_create([
+        User(
+            username=f'{prefix}_{existing + i}',
+            email=f'{prefix}_{existing + i}@bench.local',
+            role='student',
+            password='!'
+        )
+        for i in range(count)
+    ])
+    return list(User.objects.filter(username__startswith=prefix).order_by('id')[existing:])
+
+
+def make_batch(code, capacity=30, instructor=None, **course_fields):
+    """Create a course with a single batch"""
+    from api.models import Course, Batch
+
+    course = Course.objects.create(
+        name=course_fields.pop('name', f'Benchmark {code}'),
+        code=code,
+        description='Benchmark course',
+        max_capacity=max(capacity, 1),
+        instructor=instructor,
+        **course_fields
+    )
+    return Batch.objects.create(course=course, batch_number='A', capacity=capacity, instructor=instructor)
+
+
+def add_schedule(batch, day, start_hour, length_hours=1):
+    """Attach a weekly slot to a batch"""
+    from api.models import Schedule
+
+    return Schedule.objects.create(
+        batch=batch,
+        day_of_week=day,
+        start_time=dt_time(start_hour, 0),
+        end_time=dt_time(min(start_hour + length_hours, 23), 0),
+        room_number='B-1'
+    )
+
+
+class BenchmarkCommand(BaseCommand):
+    """Base class: runs `run_benchmark` inside a scratch database"""
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run_benchmark(**options)
+
+    def run_benchmark(self, **options):
+        raise NotImplementedError
+
+    def report(self, label, samples, extra=''):
+        """Print p50/p99/mean latency for a list of millisecond samples"""
+        if not samples:
+            self.stdout.write(f'{label:<40} no samples')
+            return
+        self.stdout.write(
+            f'{label:<40} n={len(samples):<6} '
+            f'p50={percentile(samples, 50):8.2f}ms  '
+            f'p99={percentile(samples, 99):8.2f}ms  '
+            f'mean={statistics.fmean(samples):8.2f}ms'
+            + (f'  {extra}' if extra else '')
+        )
@@ -0,0 +1,23 @@
+"""
+Move activity logs older than the retention window into monthly compressed
+JSONL archives and the daily summary table, deleting them in chunks.
+Run daily, e.g. from cron: python manage.py archive_activity_logs
+"""
+from django.core.management.base import BaseCommand
+
+from api.activity_archive import archive_activity_logs, get_archive_dir, get_retention_days
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete activity logs past ACTIVITY_LOG_RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep this many days instead of ACTIVITY_LOG_RETENTION_DAYS')
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, days, chunk_size, **options):
+        archived = archive_activity_logs(retention_days=days, chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} activity log(s) older than {days if days is not None else get_retention_days()} '
+            f'day(s) to {get_archive_dir()}'
+        ))
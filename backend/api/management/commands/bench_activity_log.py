@@ -0,0 +1,68 @@
+"""
+Audit log write cost: inline ActivityLog writes vs the buffered writer
+
+Concurrent threads each record a stream of audit rows, the way views do
+after their own work, first with ACTIVITY_LOG_BUFFERED off (one INSERT per
+row on the caller's thread, as every view used to) and then through the
+buffered writer. Reports caller-side latency and rows/s, and checks that
+every row reached the table.
+
+    python manage.py bench_activity_log --threads 8 --rows 500
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+
+from api.audit import flush_activity_log, record_activity
+from api.management.benchmark import BenchmarkCommand, make_students, timer
+from api.models import ActivityLog
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare inline and buffered ActivityLog writes under concurrent callers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rows', type=int, default=500, help='Rows recorded per thread')
+
+    def run_benchmark(self, threads, rows, **options):
+        users = make_students(threads, prefix='audit')
+        self.stdout.write(f'--- {threads} threads x {rows} rows')
+        for label, buffered in (('inline writes', False), ('buffered writer', True)):
+            with override_settings(ACTIVITY_LOG_BUFFERED=buffered):
+                self.run_writers(label, users, rows)
+
+    def run_writers(self, label, users, rows):
+        ActivityLog.objects.all().delete()
+
+        def write(user):
+            samples = []
+            try:
+                for index in range(rows):
+                    with timer(samples):
+                        record_activity(
+                            user=user, action='attendance_mark', description=f'bench row {index}',
+                            ip_address='127.0.0.1'
+                        )
+            finally:
+                connection.close()
+            return samples
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            latencies = [sample for samples in pool.map(write, users) for sample in samples]
+        recorded = time.perf_counter() - start
+        flush_activity_log()
+        written = time.perf_counter() - start
+
+        total = len(users) * rows
+        self.report(
+            label, latencies,
+            f'{total / recorded:9.0f} rows/s recorded, {total / written:9.0f} rows/s written'
+        )
+        stored = ActivityLog.objects.count()
+        if stored != total:
+            raise CommandError(f'{label}: {stored} rows stored for {total} recorded')
@@ -0,0 +1,101 @@
+"""
+Benchmark per-request grading against bulk_grade
+
+Grades every submission of a fresh assignment once through the single
+AssignmentViewSet.grade action (one request per submission, as the
+frontend does today) and once through one bulk_grade request, then checks
+that both paths stored the same marks and late penalties.
+
+    python manage.py bench_grading --sizes 50 150 500
+"""
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.benchmark import BenchmarkCommand, count_queries, make_batch, make_students, timer
+from api.models import Assignment, AssignmentSubmission, Enrollment, StudentProgress, User
+from api.progress_views import AssignmentViewSet
+
+# Every third submission is late, so the penalty path is exercised
+LATE_EVERY = 3
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare one grade request per submission with a single bulk_grade request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 150, 500])
+
+    def run_benchmark(self, sizes, **options):
+        self.factory = APIRequestFactory()
+        self.instructor = User.objects.create(username='bench_instructor', role='instructor', password='!')
+        grade_view = AssignmentViewSet.as_view({'post': 'grade'})
+        bulk_view = AssignmentViewSet.as_view({'post': 'bulk_grade'})
+
+        for size in sizes:
+            self.stdout.write(f'--- {size} submissions')
+            outcomes = {}
+            for mode in ('per-request', 'bulk'):
+                assignment, submissions = self.seed(size, f'{mode}{size}')
+                marks = {s.id: 40 + index % 60 for index, s in enumerate(submissions)}
+
+                samples = []
+                with count_queries() as ctx, timer(samples):
+                    if mode == 'bulk':
+                        response = self.post(bulk_view, assignment, {
+                            'grades': [
+                                {'submission_id': s.id, 'marks': marks[s.id], 'feedback': 'ok'} for s in submissions
+                            ]
+                        })
+                        self.check_response(response)
+                    else:
+                        for s in submissions:
+                            response = self.post(grade_view, assignment, {
+                                'submission_id': s.id, 'marks': marks[s.id], 'feedback': 'ok'
+                            })
+                            self.check_response(response)
+                self.report(f'{mode} grading', samples, f'queries={len(ctx.captured_queries)}')
+
+                outcomes[mode] = sorted(
+                    AssignmentSubmission.objects.filter(assignment=assignment, status='graded')
+                    .values_list('student__username', 'marks_obtained', 'late_penalty_applied')
+                )
+                outcomes[mode] = [(name.split('_')[-1], m, p) for name, m, p in outcomes[mode]]
+                progress_rows = StudentProgress.objects.filter(enrollment__batch=assignment.batch).count()
+                if len(outcomes[mode]) != size or progress_rows != size:
+                    raise CommandError(f'{mode}: {len(outcomes[mode])} graded, {progress_rows} progress rows')
+
+            if outcomes['per-request'] != outcomes['bulk']:
+                raise CommandError('bulk_grade stored different marks or penalties than grade')
+        self.stdout.write(self.style.SUCCESS('Both paths stored identical grades'))
+
+    def seed(self, size, code):
+        batch = make_batch(code, capacity=size)
+        students = make_students(size, prefix=code)
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=batch, course=batch.course, status='active')
+            for student in students
+        ])
+        assignment = Assignment.objects.create(
+            batch=batch, title='Bench', description='-', assignment_type='homework', max_marks=100,
+            weightage=10, due_date=timezone.now() + timedelta(days=1), late_penalty_percent=15
+        )
+        AssignmentSubmission.objects.bulk_create([
+            AssignmentSubmission(
+                assignment=assignment, student=student, submission_text='-',
+                is_late=index % LATE_EVERY == 0, status='late' if index % LATE_EVERY == 0 else 'submitted'
+            )
+            for index, student in enumerate(students)
+        ])
+        return assignment, list(AssignmentSubmission.objects.filter(assignment=assignment).order_by('id'))
+
+    def post(self, view, assignment, data):
+        request = self.factory.post('/', data, format='json')
+        force_authenticate(request, user=self.instructor)
+        return view(request, pk=assignment.pk)
+
+    def check_response(self, response):
+        if response.status_code != 200:
+            raise CommandError(f'Grading failed: {response.status_code} {response.data}')
@@ -0,0 +1,102 @@
+"""
+Login throughput for each configured password hasher
+
+Each hasher in PASSWORD_HASHERS (skipping those whose library is not
+installed) is made the preferred one, users get passwords hashed with it,
+and the login endpoint is driven by 1..N concurrent threads. Password
+checking dominates a login, so logins/s per thread is what one worker
+process can serve; use it to size workers for exam-result days.
+
+    python manage.py bench_login --users 50 --logins 200 --threads 1 4
+    python manage.py bench_login --inline-audit   # write ActivityLog rows inside the request
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+
+from api.audit import flush_activity_log
+from api.management.benchmark import BenchmarkCommand, make_students, timer
+from api.models import ActivityLog, User
+
+PASSWORD = 'bench-login-password'
+
+
+def available_hashers():
+    """(dotted path, hasher) for every configured hasher that can run here"""
+    hashers = []
+    for path in settings.PASSWORD_HASHERS:
+        hasher = import_string(path)()
+        try:
+            if hasher.library:
+                hasher._load_library()
+        except ValueError:
+            continue
+        hashers.append((path, hasher))
+    return hashers
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure logins/s through the login endpoint for each configured password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--logins', type=int, default=200, help='Logins per run')
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--inline-audit', action='store_true', help='Write audit rows inside the request')
+
+    def run_benchmark(self, users, logins, threads, inline_audit, **options):
+        students = make_students(users, prefix='login')
+        hashers = available_hashers()
+        skipped = len(settings.PASSWORD_HASHERS) - len(hashers)
+        self.stdout.write(
+            f'--- {logins} logins per run over {users} users, audit '
+            f'{"inline" if inline_audit else "buffered"}'
+            + (f' ({skipped} hasher(s) skipped: library not installed)' if skipped else '')
+        )
+
+        for path, hasher in hashers:
+            # Preferred hasher, so successful logins don't re-hash the password
+            with override_settings(PASSWORD_HASHERS=[path], ACTIVITY_LOG_BUFFERED=not inline_audit):
+                User.objects.filter(pk__in=[s.pk for s in students]).update(
+                    password=make_password(PASSWORD, hasher=hasher.algorithm)
+                )
+                for count in threads:
+                    self.run_logins(hasher.algorithm, students, logins, count)
+                flush_activity_log()
+
+        expected = len(hashers) * len(threads) * logins
+        written = ActivityLog.objects.filter(action='login').count()
+        if written != expected:
+            raise CommandError(f'{written} login audit rows written for {expected} logins')
+        self.stdout.write(self.style.SUCCESS(f'All {expected} logins succeeded and were audited'))
+
+    def run_logins(self, algorithm, students, logins, threads):
+        def login(index):
+            client = APIClient()
+            samples = []
+            try:
+                with timer(samples):
+                    response = client.post('/api/auth/login/', {
+                        'email': students[index % len(students)].email, 'password': PASSWORD
+                    })
+            finally:
+                connection.close()
+            if response.status_code != 200:
+                raise CommandError(f'Login failed with {response.status_code}: {response.content[:200]}')
+            return samples[0]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - start
+        self.report(
+            f'{algorithm}, {threads} thread(s)', latencies,
+            f'{logins / elapsed:7.1f} logins/s'
+        )
@@ -0,0 +1,138 @@
+"""
+Benchmark keyset pagination on the large list endpoints
+
+Fills each table with --rows rows, then times page 1 and page --page through
+the real viewsets (cursor pagination, with and without ?fields=) and the same
+depth with LIMIT/OFFSET for comparison. Keyset latency should stay flat.
+
+    python manage.py bench_pagination --rows 100000 --page 1000
+"""
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.benchmark import BenchmarkCommand, make_batch, make_students, timer
+from api.models import ActivityLog, Attendance, Enrollment, Notification, Payment, Schedule, User
+from api.pagination import KeysetPagination
+from api import views
+
+REPEAT = 5
+
+TABLES = {
+    # name: (url, viewset or view, ordering, sparse fields)
+    'enrollments': ('/api/enrollments/', views.EnrollmentViewSet, '-enrollment_date', 'id,status,enrollment_date'),
+    'attendance': ('/api/attendance/', views.AttendanceViewSet, '-marked_date', 'id,status,marked_date'),
+    'payments': ('/api/payments/', views.PaymentViewSet, '-payment_date', 'id,amount,status'),
+    'notifications': ('/api/notifications/', views.NotificationViewSet, '-created_at', 'id,title,is_read'),
+    'activity_logs': ('/api/activity-logs/', views.ActivityLogViewSet, '-created_at', 'id,action,created_at'),
+    'users': ('/api/admin/users/', views.get_all_users, '-date_joined', 'id,username,role'),
+}
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare keyset pagination with OFFSET at page 1 and a deep page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--tables', nargs='+', choices=sorted(TABLES), default=sorted(TABLES))
+
+    def run_benchmark(self, rows, page, page_size, tables, **options):
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create(username='bench_admin', role='admin', password='!')
+        self.seed(rows, tables)
+
+        depth = (page - 1) * page_size
+        for name in tables:
+            url, view, ordering, fields = TABLES[name]
+            handler = view if not hasattr(view, 'as_view') else view.as_view({'get': 'list'})
+            user = self.owner if name == 'notifications' else self.admin
+            queryset = self.base_queryset(name, user)
+
+            self.stdout.write(f'--- {name}: {queryset.count()} rows, page {page} x {page_size}')
+            deep_cursor = self.cursor_at(queryset, ordering, depth - 1) if depth else None
+
+            for label, params in [
+                ('keyset page 1', {'page_size': page_size}),
+                (f'keyset page {page}', {'page_size': page_size, 'cursor': deep_cursor}),
+                (f'keyset page {page} ?fields=', {'page_size': page_size, 'cursor': deep_cursor, 'fields': fields}),
+            ]:
+                params = {k: v for k, v in params.items() if v is not None}
+                samples = []
+                for _ in range(REPEAT):
+                    request = self.factory.get(url, params)
+                    force_authenticate(request, user=user)
+                    with timer(samples):
+                        response = handler(request)
+                        response.render()
+                self.report(label, samples, f'status={response.status_code}')
+
+            offset_ordering = [ordering, '-pk']
+            for label, offset in [('OFFSET page 1', 0), (f'OFFSET page {page}', depth)]:
+                samples = []
+                for _ in range(REPEAT):
+                    with timer(samples):
+                        list(queryset.order_by(*offset_ordering)[offset:offset + page_size])
+                self.report(label + ' (query only)', samples)
+
+    def base_queryset(self, name, user):
+        return {
+            'enrollments': Enrollment.objects.all(),
+            'attendance': Attendance.objects.all(),
+            'payments': Payment.objects.all(),
+            'notifications': Notification.objects.filter(user=user),
+            'activity_logs': ActivityLog.objects.all(),
+            'users': User.objects.all(),
+        }[name]
+
+    def cursor_at(self, queryset, ordering, position):
+        """Cursor pointing just past the row at `position` (what page N's link would carry)"""
+        field = ordering.lstrip('-')
+        prefix = '-' if ordering.startswith('-') else ''
+        row = queryset.order_by(f'{prefix}{field}', f'{prefix}pk').values_list(field, 'pk')[position]
+        return KeysetPagination().encode_cursor(*row)
+
+    def seed(self, rows, tables):
+        self.stdout.write(f'Seeding {rows} rows per table...')
+        batch_count = 100
+        students = make_students(max(rows // batch_count, 1), prefix='page')
+        self.owner = students[0]
+
+        batches = [make_batch(f'PG{i}', capacity=len(students)) for i in range(batch_count)]
+        schedule = Schedule.objects.create(
+            batch=batches[0], day_of_week='MON', room_number='B-1',
+            start_time=timezone.now().time().replace(hour=9, minute=0),
+            end_time=timezone.now().time().replace(hour=10, minute=0)
+        )
+
+        needs_enrollments = {'enrollments', 'attendance', 'payments'} & set(tables)
+        enrollments = []
+        if needs_enrollments:
+            Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status='active')
+                for batch in batches for student in students
+            ][:rows], batch_size=2000)
+            enrollments = list(Enrollment.objects.only('id'))
+
+        if 'attendance' in tables:
+            Attendance.objects.bulk_create([
+                Attendance(enrollment=enrollment, schedule=schedule, status='present', marked_by=self.admin)
+                for enrollment in enrollments
+            ], batch_size=2000)
+        if 'payments' in tables:
+            Payment.objects.bulk_create([
+                Payment(enrollment=enrollment, amount=1000, status='completed', payment_method='cash')
+                for enrollment in enrollments
+            ], batch_size=2000)
+        if 'notifications' in tables:
+            Notification.objects.bulk_create([
+                Notification(user=self.owner, notification_type='announcement', title=f'Notice {i}', message='-')
+                for i in range(rows)
+            ], batch_size=2000)
+        if 'activity_logs' in tables:
+            ActivityLog.objects.bulk_create([
+                ActivityLog(user=self.admin, action='login', description=f'Login {i}', ip_address='127.0.0.1')
+                for i in range(rows)
+            ], batch_size=2000)
+        if 'users' in tables:
+            make_students(max(rows - User.objects.count(), 0), prefix='page_user')
@@ -0,0 +1,83 @@
+"""
+Benchmark institute-wide progress recalculation
+
+Recalculates every enrollment once synchronously (one recompute_all()
+call, as the recalculate endpoint used to do inside the request) and then
+as a RecalculationJob with each requested number of worker processes,
+checking that all runs store the same grades.
+
+    python manage.py bench_recalculation --batches 20 --students 100 --workers 1 4
+"""
+from datetime import timedelta
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from api.counters import reconcile_attendance_counts
+from api.management.benchmark import BenchmarkCommand, add_schedule, make_batch, make_students, timer
+from api.models import Assignment, AssignmentSubmission, Attendance, Enrollment, StudentProgress
+from api.progress import recompute_all
+from api.recalculation import claim_job, create_job, run_job
+
+PROGRESS_SNAPSHOT = ('enrollment_id', 'overall_percentage', 'current_grade', 'is_at_risk')
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare one synchronous recalculation with chunked recalculation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batches', type=int, default=20)
+        parser.add_argument('--students', type=int, default=100, help='Students per batch')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+        parser.add_argument('--chunk-size', type=int, default=250)
+
+    def run_benchmark(self, batches, students, workers, chunk_size, **options):
+        self.seed(batches, students)
+        total = batches * students
+        self.stdout.write(f'--- {total} enrollments in {batches} batches')
+
+        samples = []
+        with timer(samples):
+            recompute_all()
+        self.report('synchronous recompute_all', samples)
+        expected = self.snapshot()
+
+        for count in workers:
+            StudentProgress.objects.update(overall_percentage=0, current_grade='F', is_at_risk=False)
+            samples = []
+            with timer(samples):
+                job = run_job(claim_job(create_job(chunk_size=chunk_size).pk), workers=count)
+            self.report(f'job, {count} worker(s)', samples, f'chunks={len(job.chunks)}')
+            if job.status != 'completed' or job.processed_enrollments != total:
+                raise CommandError(f'Job ended {job.status} after {job.processed_enrollments} rows: {job.error}')
+            if self.snapshot() != expected:
+                raise CommandError(f'Job with {count} worker(s) stored different grades than recompute_all')
+        self.stdout.write(self.style.SUCCESS('All runs stored identical progress'))
+
+    def seed(self, batches, students):
+        for b in range(batches):
+            batch = make_batch(f'RC{b}', capacity=students)
+            schedule = add_schedule(batch, 'MON', 9)
+            enrollments = Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status='active')
+                for student in make_students(students, prefix=f'recalc{b}')
+            ])
+            assignment = Assignment.objects.create(
+                batch=batch, title='Bench', description='-', assignment_type='homework', max_marks=100,
+                weightage=10, due_date=timezone.now() + timedelta(days=1)
+            )
+            AssignmentSubmission.objects.bulk_create([
+                AssignmentSubmission(
+                    assignment=assignment, student_id=enrollment.student_id, submission_text='-',
+                    status='graded', marks_obtained=30 + index % 70
+                )
+                for index, enrollment in enumerate(enrollments)
+            ])
+            Attendance.objects.bulk_create([
+                Attendance(enrollment=enrollment, schedule=schedule, status='present' if index % 4 else 'absent')
+                for index, enrollment in enumerate(enrollments)
+            ])
+        reconcile_attendance_counts()
+
+    def snapshot(self):
+        return list(StudentProgress.objects.order_by('enrollment_id').values_list(*PROGRESS_SNAPSHOT))
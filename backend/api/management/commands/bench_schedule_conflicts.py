@@ -0,0 +1,90 @@
+"""
+Benchmark the schedule conflict engine against the old triple loop
+
+Each student carries N active enrollments (10-50 by default), every batch
+meets 2-3 times a week, and we check enrollment into one more batch.
+
+    python manage.py bench_schedule_conflicts --enrollments 10 25 50 --students 20
+"""
+import random
+
+from django.core.management.base import CommandError
+
+from api.management.benchmark import (
+    BenchmarkCommand, add_schedule, count_queries, make_batch, make_students, timer
+)
+from api.models import Enrollment
+from api.schedule_conflicts import check_schedule_conflicts
+
+DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+
+
+def legacy_check_schedule_conflicts(student, new_batch):
+    """The pre-engine implementation, kept as a reference for timings and results"""
+    active_enrollments = Enrollment.objects.filter(
+        student=student,
+        status__in=['active', 'pending']
+    ).select_related('batch', 'batch__course')
+
+    new_schedules = new_batch.schedules.all()
+
+    conflicts = []
+    for enrollment in active_enrollments:
+        existing_schedules = enrollment.batch.schedules.all()
+        for new_sched in new_schedules:
+            for existing_sched in existing_schedules:
+                has_conflict, conflict_msg = new_sched.conflicts_with(existing_sched)
+                if has_conflict:
+                    conflicts.append((new_sched.pk, existing_sched.pk, conflict_msg))
+    return len(conflicts) > 0, conflicts
+
+
+class Command(BenchmarkCommand):
+    help = 'Compare the sweep-line conflict engine with the legacy triple loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enrollments', type=int, nargs='+', default=[10, 25, 50])
+        parser.add_argument('--students', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def run_benchmark(self, enrollments, students, seed, **options):
+        rng = random.Random(seed)
+
+        for per_student in enrollments:
+            batches = []
+            for i in range(per_student):
+                batch = make_batch(f'C{per_student}-{i}', capacity=students + 1)
+                for _ in range(rng.randint(2, 3)):
+                    add_schedule(batch, rng.choice(DAYS), rng.randint(7, 19), rng.randint(1, 2))
+                batches.append(batch)
+
+            target = make_batch(f'T{per_student}', capacity=students + 1)
+            for day in rng.sample(DAYS, 3):
+                add_schedule(target, day, rng.randint(7, 19), 2)
+
+            cohort = make_students(students, prefix=f's{per_student}')
+            Enrollment.objects.bulk_create([
+                Enrollment(student=s, batch=b, course=b.course, status='active')
+                for s in cohort for b in batches
+            ])
+
+            legacy_ms, engine_ms = [], []
+            legacy_queries = engine_queries = 0
+            for student in cohort:
+                with count_queries() as ctx, timer(legacy_ms):
+                    _, legacy = legacy_check_schedule_conflicts(student, target)
+                legacy_queries += len(ctx.captured_queries)
+
+                with count_queries() as ctx, timer(engine_ms):
+                    _, conflicts = check_schedule_conflicts(student, target)
+                engine_queries += len(ctx.captured_queries)
+
+                expected = sorted(message for _, _, message in legacy)
+                got = sorted(c['conflict_description'] for c in conflicts)
+                if expected != got:
+                    raise CommandError(f'Result mismatch for {student.username}: {expected} != {got}')
+
+            self.stdout.write(f'--- {per_student} enrollments per student, {students} students')
+            self.report('legacy triple loop', legacy_ms, f'queries/check={legacy_queries / students:.1f}')
+            self.report('sweep-line engine', engine_ms, f'queries/check={engine_queries / students:.1f}')
+        self.stdout.write(self.style.SUCCESS('Engine results match the legacy implementation'))
@@ -0,0 +1,90 @@
+"""
+Registration-day load test for the seat reservation engine
+
+Many workers try to enroll distinct students into one batch at the same time.
+The command fails if the batch ends up with more enrollments than seats.
+
+    python manage.py bench_seat_reservation --capacity 50 --students 400 --workers 16
+    python manage.py bench_seat_reservation --naive   # old read-then-insert flow
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import CommandError
+from django.db import connection, OperationalError
+
+from api.management.benchmark import BenchmarkCommand, make_batch, make_students, timer
+from api.models import Batch, Enrollment
+from api.seat_reservation import enroll_with_seat, SeatUnavailable
+
+
+class Command(BenchmarkCommand):
+    help = 'Concurrent enrollment benchmark: proves zero overbooking and reports p50/p99 latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, default=50)
+        parser.add_argument('--students', type=int, default=400)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--naive', action='store_true',
+            help='Use the old check-then-insert flow instead of the seat engine'
+        )
+
+    def run_benchmark(self, capacity, students, workers, naive, **options):
+        batch = make_batch('BENCH-SEAT', capacity=capacity)
+        candidates = make_students(students)
+        enroll = self._naive_enroll if naive else self._engine_enroll
+
+        latencies = []
+        outcomes = {'enrolled': 0, 'full': 0, 'error': 0}
+
+        def attempt(student):
+            try:
+                own_batch = Batch.objects.select_related('course').get(pk=batch.pk)
+                samples = []
+                try:
+                    with timer(samples):
+                        outcome = enroll(own_batch, student)
+                except OperationalError:
+                    outcome = 'error'
+                return outcome, samples[0]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for outcome, elapsed in pool.map(attempt, candidates):
+                outcomes[outcome] += 1
+                latencies.append(elapsed)
+
+        batch.refresh_from_db()
+        active = Enrollment.objects.filter(batch=batch, status__in=['active', 'pending']).count()
+
+        mode = 'naive check-then-insert' if naive else 'seat engine'
+        self.stdout.write(
+            f'{mode}: capacity={capacity} attempts={students} workers={workers} '
+            f'enrolled={outcomes["enrolled"]} rejected_full={outcomes["full"]} errors={outcomes["error"]}'
+        )
+        self.report('enroll latency', latencies)
+        self.stdout.write(
+            f'enrollment rows={active} batch.enrolled_count={batch.enrolled_count} '
+            f'batch.held_count={batch.held_count}'
+        )
+
+        if active > capacity:
+            raise CommandError(f'Overbooked: {active} enrollments for {capacity} seats')
+        if not naive and (batch.enrolled_count != active or batch.held_count != 0):
+            raise CommandError('Seat counters drifted from the enrollment table')
+        self.stdout.write(self.style.SUCCESS('No overbooking'))
+
+    def _engine_enroll(self, batch, student):
+        try:
+            enroll_with_seat(batch, student)
+        except SeatUnavailable:
+            return 'full'
+        return 'enrolled'
+
+    def _naive_enroll(self, batch, student):
+        batch.refresh_from_db(fields=['enrolled_count'])
+        if batch.enrolled_count >= batch.capacity:
+            return 'full'
+        Enrollment.objects.create(student=student, batch=batch, course=batch.course, status='active')
+        return 'enrolled'
@@ -0,0 +1,26 @@
+"""
+Rebuild the AnalyticsRollup cube behind /api/analytics/
+Usage: python manage.py build_analytics_rollups [--period week|month] [--since YYYY-MM-DD]
+
+Run nightly for a full rebuild. --since only rebuilds periods from that date
+on (e.g. hourly for the current month); cohort measures of older periods
+(completions, drops, grades) then wait for the next full rebuild.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api.analytics import TRUNCATE, build_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the weekly and monthly analytics rollups from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', choices=sorted(TRUNCATE), action='append')
+        parser.add_argument('--since', type=date.fromisoformat, help='Only rebuild periods from this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        for period in options['period'] or sorted(TRUNCATE):
+            cells = build_rollups(period, since=options['since'])
+            self.stdout.write(self.style.SUCCESS(f'{period}: {cells} rollup cell(s) written'))
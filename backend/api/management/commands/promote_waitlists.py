@@ -0,0 +1,20 @@
+"""
+Fill free seats from batch waitlists, first come first served
+Signals promote as seats free up; this sweep catches anything they missed
+(expired holds, counters repaired by reconcile_counts, failed promotions).
+Run periodically, e.g. every 5 minutes from cron: python manage.py promote_waitlists
+"""
+from django.core.management.base import BaseCommand
+
+from api.waitlist import promote_all, promote_waitlist
+
+
+class Command(BaseCommand):
+    help = 'Enroll waitlisted students into batches with free seats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, help='Only promote this batch')
+
+    def handle(self, *args, batch, **options):
+        promoted = len(promote_waitlist(batch)) if batch else promote_all()
+        self.stdout.write(self.style.SUCCESS(f'Promoted {promoted} waitlisted student(s)'))
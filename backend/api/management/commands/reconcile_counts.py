@@ -0,0 +1,41 @@
+"""
+Repair drift in Batch/Course enrollment counters and Enrollment attendance counters
+Usage: python manage.py reconcile_counts [--dry-run]
+
+Run it periodically (e.g. nightly cron) as the batch rollup for attendance
+marks written through bulk paths that bypass signals.
+"""
+from django.core.management.base import BaseCommand
+
+from api.counters import reconcile_attendance_counts, reconcile_enrollment_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Batch.enrolled_count, Batch.held_count, Course.enrolled_count and the '
+        'Enrollment attendance counters from the source tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted rows without writing the fixes'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_enrollment_counts(dry_run=options['dry_run'])
+        drift['attendance'] = reconcile_attendance_counts(dry_run=options['dry_run'])
+
+        labels = {
+            'batches': 'Batch enrolled_count',
+            'held': 'Batch held_count',
+            'courses': 'Course enrolled_count',
+            'attendance': 'Enrollment attendance (present, late, absent, excused)',
+        }
+        for key, label in labels.items():
+            for pk, (stored, actual) in sorted(drift[key].items()):
+                self.stdout.write(f'{label} #{pk}: {stored} -> {actual}')
+
+        total = sum(len(rows) for rows in drift.values())
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} drifted counter(s)'))
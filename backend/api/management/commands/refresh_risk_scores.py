@@ -0,0 +1,19 @@
+"""
+Recompute progress and risk scores for students whose inputs changed
+(new attendance marks, assignment due dates passed) since their last recompute.
+Run periodically, e.g. every 10 minutes from cron: python manage.py refresh_risk_scores
+"""
+from django.core.management.base import BaseCommand
+
+from api.progress import refresh_stale_progress
+
+
+class Command(BaseCommand):
+    help = 'Rescore at-risk status for progress rows with changed inputs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, chunk_size, **options):
+        refreshed = refresh_stale_progress(chunk_size=chunk_size)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} progress record(s)'))
@@ -0,0 +1,15 @@
+"""
+Return seats held by expired SeatHold rows to their batches
+Run periodically, e.g. every minute from cron: python manage.py release_expired_holds
+"""
+from django.core.management.base import BaseCommand
+
+from api.seat_reservation import expire_stale_holds
+
+
+class Command(BaseCommand):
+    help = 'Expire seat holds past their deadline and give their seats back'
+
+    def handle(self, *args, **options):
+        expired = expire_stale_holds()
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} seat hold(s)'))
@@ -0,0 +1,46 @@
+"""
+Run queued progress recalculation jobs and resume interrupted ones
+
+    python manage.py run_recalculation_jobs                 # queued + abandoned jobs
+    python manage.py run_recalculation_jobs --job 12        # one job (also retries a failed one)
+    python manage.py run_recalculation_jobs --all-batches   # start a new institute-wide job
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import RecalculationJob
+from api.recalculation import create_job, resumable_jobs, run_job_by_id
+
+
+class Command(BaseCommand):
+    help = 'Run queued or interrupted progress recalculation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, help='Run (or resume) only this job')
+        parser.add_argument('--all-batches', action='store_true', help='Create and run a job over every batch')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: PROGRESS_RECALC_WORKERS)')
+        parser.add_argument('--chunk-size', type=int, help='Enrollments per chunk for a new job')
+
+    def handle(self, *args, **options):
+        if options['job']:
+            if not RecalculationJob.objects.filter(pk=options['job']).exists():
+                raise CommandError(f'No recalculation job {options["job"]}')
+            job_ids = [options['job']]
+        elif options['all_batches']:
+            job_ids = [create_job(chunk_size=options['chunk_size']).pk]
+        else:
+            job_ids = list(resumable_jobs().values_list('pk', flat=True))
+
+        for job_id in job_ids:
+            job = run_job_by_id(job_id, workers=options['workers'])
+            if job is None:
+                self.stdout.write(f'Job {job_id} is finished or being run elsewhere, skipped')
+            elif job.status == 'failed':
+                self.stdout.write(self.style.ERROR(
+                    f'Job {job.pk} failed after {len(job.completed_chunks)}/{len(job.chunks)} chunks: {job.error}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.pk}: recalculated {job.processed_enrollments} enrollments in {len(job.chunks)} chunks'
+                ))
+        if not job_ids:
+            self.stdout.write('No recalculation jobs to run')
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:25
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_assignment_assignmentsubmission_exam_examresult_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='held_count',
+            field=models.IntegerField(default=0, help_text='Seats temporarily held by in-flight enrollments (see SeatHold)', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('held', 'Held'), ('confirmed', 'Confirmed'), ('released', 'Released'), ('expired', 'Expired')], default='held', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='api.batch')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'seat_holds',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['batch', 'status', 'expires_at'], name='seat_holds_batch_i_ff8904_idx'), models.Index(fields=['status', 'expires_at'], name='seat_holds_status_713635_idx')],
+            },
+        ),
+    ]
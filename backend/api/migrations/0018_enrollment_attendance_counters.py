@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:50
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_attendance_counters(apps, schema_editor):
+    """Count the existing attendance marks into the new counters"""
+    Attendance = apps.get_model('api', 'Attendance')
+    Enrollment = apps.get_model('api', 'Enrollment')
+    fields = {'present': 'present_count', 'late': 'late_count', 'absent': 'absent_count', 'excused': 'excused_count'}
+
+    counts = {}
+    for enrollment_id, status, n in (
+        Attendance.objects.values('enrollment_id', 'status').annotate(n=Count('id'))
+        .values_list('enrollment_id', 'status', 'n')
+    ):
+        if status in fields:
+            counts.setdefault(enrollment_id, {})[fields[status]] = n
+
+    enrollments = list(Enrollment.objects.filter(pk__in=counts).only('id'))
+    for enrollment in enrollments:
+        for field in fields.values():
+            setattr(enrollment, field, counts[enrollment.id].get(field, 0))
+    Enrollment.objects.bulk_update(enrollments, list(fields.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='absent_count',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='excused_count',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='late_count',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='present_count',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunPython(fill_attendance_counters, migrations.RunPython.noop),
+    ]
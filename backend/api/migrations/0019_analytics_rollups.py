@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_enrollment_attendance_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('enrollments', models.IntegerField(default=0)),
+                ('completions', models.IntegerField(default=0)),
+                ('drops', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_installments', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('graded_students', models.IntegerField(default=0)),
+                ('grade_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('attendance_marked', models.IntegerField(default=0)),
+                ('attendance_attended', models.IntegerField(default=0)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_rollups', to='api.batch')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analytics_rollups', to='api.coursecategory')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_rollups', to='api.course')),
+                ('instructor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='analytics_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'analytics_rollups',
+                'indexes': [models.Index(fields=['period', 'period_start'], name='analytics_r_period_1fb010_idx'), models.Index(fields=['period', 'course', 'period_start'], name='analytics_r_period_74a906_idx'), models.Index(fields=['period', 'instructor', 'period_start'], name='analytics_r_period_4263d2_idx'), models.Index(fields=['period', 'category', 'period_start'], name='analytics_r_period_dd616b_idx')],
+                'unique_together': {('period', 'period_start', 'batch')},
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+# The grade ladder previously hard-coded in StudentProgress.get_letter_grade/get_gpa
+DEFAULT_BANDS = [
+    ('A+', '90', '4.00'),
+    ('A', '85', '3.70'),
+    ('B+', '80', '3.30'),
+    ('B', '75', '3.00'),
+    ('C+', '70', '2.70'),
+    ('C', '65', '2.30'),
+    ('D', '60', '2.00'),
+    ('F', '0', '0.00'),
+]
+
+
+def create_default_scale(apps, schema_editor):
+    GradingScale = apps.get_model('api', 'GradingScale')
+    GradeBand = apps.get_model('api', 'GradeBand')
+    scale = GradingScale.objects.create(name='Institute default')
+    GradeBand.objects.bulk_create([
+        GradeBand(scale=scale, letter=letter, min_percentage=Decimal(minimum), gpa=Decimal(gpa))
+        for letter, minimum, gpa in DEFAULT_BANDS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_recalculation_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(blank=True, help_text='Leave empty for the institute-wide default scale', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grading_scale', to='api.course')),
+            ],
+            options={
+                'db_table': 'grading_scales',
+            },
+        ),
+        migrations.CreateModel(
+            name='GradeBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('letter', models.CharField(max_length=5)),
+                ('min_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('gpa', models.DecimalField(decimal_places=2, max_digits=3)),
+                ('scale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='api.gradingscale')),
+            ],
+            options={
+                'db_table': 'grade_bands',
+                'ordering': ['scale', '-min_percentage'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='gradingscale',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('course', models.Value(0)), name='unique_default_grading_scale'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gradeband',
+            unique_together={('scale', 'letter'), ('scale', 'min_percentage')},
+        ),
+        migrations.RunPython(create_default_scale, migrations.RunPython.noop),
+    ]
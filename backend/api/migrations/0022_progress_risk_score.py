@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+def mark_all_stale(apps, schema_editor):
+    """Existing rows have no score yet: let the next refresh_risk_scores run score them"""
+    StudentProgress = apps.get_model('api', 'StudentProgress')
+    StudentProgress.objects.update(risk_stale=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_grading_scales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprogress',
+            name='risk_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='studentprogress',
+            name='risk_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(fields=['is_at_risk', 'risk_score'], name='progress_risk_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentprogress',
+            index=models.Index(condition=models.Q(('risk_stale', True)), fields=['risk_stale'], name='progress_risk_stale_idx'),
+        ),
+        migrations.RunPython(mark_all_stale, migrations.RunPython.noop),
+    ]
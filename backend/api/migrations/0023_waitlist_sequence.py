@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:11
+
+from django.db import migrations, models
+
+
+def number_existing_entries(apps, schema_editor):
+    """
+    Give existing entries sequences in their current queue order; values
+    stay at or below the row count, so they sort before any later entry
+    (new entries take their primary key)
+    """
+    Waitlist = apps.get_model('api', 'Waitlist')
+    entries = list(Waitlist.objects.order_by('batch_id', 'position', 'joined_date', 'id').only('id'))
+    for sequence, entry in enumerate(entries, start=1):
+        entry.sequence = sequence
+    Waitlist.objects.bulk_update(entries, ['sequence'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_progress_risk_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitlist',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Queue order, fixed when the entry is created', null=True, unique=True),
+        ),
+        migrations.RunPython(number_existing_entries, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name='waitlist',
+            options={'ordering': ['sequence']},
+        ),
+        migrations.RemoveIndex(
+            model_name='waitlist',
+            name='waitlists_batch_i_95ee00_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='waitlist',
+            name='waitlists_positio_3466e0_idx',
+        ),
+        migrations.RemoveField(
+            model_name='waitlist',
+            name='position',
+        ),
+        migrations.AddIndex(
+            model_name='waitlist',
+            index=models.Index(fields=['batch', 'status', 'sequence'], name='waitlists_batch_i_5bed8e_idx'),
+        ),
+    ]
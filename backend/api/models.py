@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -32,6 +33,7 @@ class User(AbstractUser):
             models.Index(fields=['role', 'is_active']),
             models.Index(fields=['username']),
             models.Index(fields=['email']),
+            models.Index(fields=['date_joined', 'id']),
         ]
     
     def __str__(self):
@@ -157,32 +159,19 @@ class Course(models.Model):
         return self.prerequisites.all()
     
     def has_prerequisites(self):
-        """Check if course has prerequisites"""
-        return self.prerequisites.exists()
+        """Check if course has prerequisites (from the cached prerequisite map)"""
+        from .prerequisites import direct_prerequisite_ids  # Avoid circular import
+        return bool(direct_prerequisite_ids(self.pk))
     
     def check_prerequisites_met(self, student):
         """
         Check if student has met all prerequisites
         Returns: (bool: all_met, list: missing_prerequisites)
         """
-        from .models import Enrollment  # Avoid circular import
+        from .prerequisites import missing_prerequisites  # Avoid circular import
         
-        if not self.has_prerequisites():
-            return True, []
-        
-        missing_prerequisites = []
-        for prereq in self.prerequisites.all():
-            # Check if student has completed prerequisite
-            enrollment = Enrollment.objects.filter(
-                student=student,
-                course=prereq,
-                status='completed'
-            ).first()
-            
-            if not enrollment:
-                missing_prerequisites.append(prereq)
-        
-        return len(missing_prerequisites) == 0, missing_prerequisites
+        missing = missing_prerequisites(student, self)
+        return len(missing) == 0, missing
 
 
 class Batch(models.Model):
@@ -191,6 +180,11 @@ class Batch(models.Model):
     batch_number = models.CharField(max_length=50)  # e.g., "A", "B", "Batch-1"
     capacity = models.IntegerField(validators=[MinValueValidator(1)])
     enrolled_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    held_count = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Seats temporarily held by in-flight enrollments (see SeatHold)"
+    )
     
     instructor = models.ForeignKey(
         User,
@@ -215,7 +209,7 @@ class Batch(models.Model):
     
     @property
     def available_seats(self):
-        return self.capacity - self.enrolled_count
+        return self.capacity - self.enrolled_count - self.held_count
 
 
 class Schedule(models.Model):
@@ -278,48 +272,9 @@ class Schedule(models.Model):
         Check if enrolling in new_batch would create schedule conflicts for student
         Returns: (bool: has_conflicts, list: conflict_details)
         """
-        # Get student's current active enrollments
-        active_enrollments = Enrollment.objects.filter(
-            student=student,
-            status__in=['active', 'pending']
-        ).select_related('batch', 'batch__course')
-        
-        # Get schedules for new batch
-        new_schedules = new_batch.schedules.all()
+        from .schedule_conflicts import check_schedule_conflicts  # Avoid circular import
         
-        conflicts = []
-        for enrollment in active_enrollments:
-            existing_schedules = enrollment.batch.schedules.all()
-            
-            for new_sched in new_schedules:
-                for existing_sched in existing_schedules:
-                    has_conflict, conflict_msg = new_sched.conflicts_with(existing_sched)
-                    if has_conflict:
-                        conflicts.append({
-                            'existing_course': enrollment.batch.course.name,
-                            'existing_course_code': enrollment.batch.course.code,
-                            'existing_batch': enrollment.batch.batch_number,
-                            'new_course': new_batch.course.name,
-                            'new_course_code': new_batch.course.code,
-                            'new_batch': new_batch.batch_number,
-                            'conflict_description': conflict_msg,
-                            'existing_schedule': {
-                                'day': existing_sched.get_day_of_week_display(),
-                                'start_time': existing_sched.start_time.strftime('%H:%M'),
-                                'end_time': existing_sched.end_time.strftime('%H:%M'),
-                                'room': existing_sched.room_number,
-                                'building': existing_sched.building
-                            },
-                            'new_schedule': {
-                                'day': new_sched.get_day_of_week_display(),
-                                'start_time': new_sched.start_time.strftime('%H:%M'),
-                                'end_time': new_sched.end_time.strftime('%H:%M'),
-                                'room': new_sched.room_number,
-                                'building': new_sched.building
-                            }
-                        })
-        
-        return len(conflicts) > 0, conflicts
+        return check_schedule_conflicts(student, new_batch)
 
 
 class Enrollment(models.Model):
@@ -352,12 +307,19 @@ class Enrollment(models.Model):
         blank=True
     )
     
+    # Attendance marks per status, kept in step by signals (see counters.py)
+    present_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    late_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    absent_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    excused_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    
     class Meta:
         db_table = 'enrollments'
         unique_together = ['student', 'batch']
         indexes = [
             models.Index(fields=['student', 'status']),
             models.Index(fields=['batch']),
+            models.Index(fields=['enrollment_date', 'id']),
         ]
         ordering = ['-enrollment_date']
     
@@ -365,8 +327,66 @@ class Enrollment(models.Model):
         return f"{self.student.username} - {self.batch}"
 
 
+class SeatHold(models.Model):
+    """Short-lived seat reservation taken before an enrollment is confirmed"""
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('confirmed', 'Confirmed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+    
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='seat_holds')
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='seat_holds',
+        null=True,
+        blank=True
+    )
+    seats = models.IntegerField(default=1, validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'seat_holds'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['batch', 'status', 'expires_at']),
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.batch} - {self.seats} seat(s) ({self.get_status_display()})"
+    
+    @property
+    def is_expired(self):
+        return timezone.now() >= self.expires_at
+
+
+class WaitlistQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Give entries created without a sequence their pk, as save() does"""
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            unsequenced = [entry for entry in objs if entry.sequence is None]
+            for entry in unsequenced:
+                if entry.pk is None:
+                    raise ValueError('Waitlist.bulk_create needs the database to return primary keys')
+                entry.sequence = entry.pk
+            self.bulk_update(unsequenced, ['sequence'], batch_size=500)
+        return objs
+
+
 class Waitlist(models.Model):
-    """Waitlist for full batches - First Come First Served"""
+    """
+    Waitlist for full batches - First Come First Served
+    
+    Entries are queued by an immutable sequence key; the position shown to
+    students is the entry's rank among the batch's waiting entries,
+    computed when read, so leaving the queue never rewrites other rows.
+    """
     STATUS_CHOICES = [
         ('waiting', 'Waiting'),
         ('enrolled', 'Enrolled'),
@@ -386,36 +406,71 @@ class Waitlist(models.Model):
         related_name='waitlist_entries'
     )
     
-    position = models.IntegerField(default=0)
+    sequence = models.BigIntegerField(
+        null=True, blank=True, unique=True, editable=False,
+        help_text="Queue order, fixed when the entry is created"
+    )
     priority = models.IntegerField(default=0, help_text="For future priority-based systems")
     joined_date = models.DateTimeField(auto_now_add=True)
     notified = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
     notes = models.TextField(blank=True)
     
+    objects = WaitlistQuerySet.as_manager()
+    
     class Meta:
         db_table = 'waitlists'
         unique_together = ['student', 'batch']
-        ordering = ['position', 'joined_date']
+        ordering = ['sequence']
         indexes = [
-            models.Index(fields=['batch', 'status']),
+            models.Index(fields=['batch', 'status', 'sequence']),
             models.Index(fields=['student', 'status']),
-            models.Index(fields=['position']),
         ]
     
     def __str__(self):
-        return f"{self.student.username} - {self.batch} (Position: {self.position})"
+        # The sequence, not the position: that would cost a COUNT per row
+        return f"{self.student.username} - {self.batch} (#{self.sequence}, {self.status})"
     
     def save(self, *args, **kwargs):
-        """Auto-assign position if not set"""
-        if not self.position:
-            # Get the highest position for this batch
-            max_position = Waitlist.objects.filter(
-                batch=self.batch,
-                status='waiting'
-            ).aggregate(models.Max('position'))['position__max']
-            self.position = (max_position or 0) + 1
-        super().save(*args, **kwargs)
+        """Assign the sequence key on first save"""
+        if self.sequence is not None:
+            super().save(*args, **kwargs)
+            return
+        # One transaction, so nobody sees (or is left with) an unsequenced row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            # Primary keys only grow, so the pk doubles as the queue key
+            self.sequence = self.pk
+            Waitlist.objects.filter(pk=self.pk).update(sequence=self.pk)
+    
+    @classmethod
+    def position_subquery(cls):
+        """Rank of OuterRef entry among its batch's waiting entries (one indexed COUNT)"""
+        return models.Subquery(
+            cls.objects.filter(
+                batch_id=models.OuterRef('batch_id'), status='waiting', sequence__lte=models.OuterRef('sequence')
+            ).order_by().values('batch_id').annotate(n=models.Count('id')).values('n')
+        )
+    
+    @classmethod
+    def with_positions(cls, queryset):
+        """Annotate queue_position (None for entries no longer waiting)"""
+        return queryset.annotate(queue_position=models.Case(
+            models.When(status='waiting', then=cls.position_subquery()),
+            default=None,
+            output_field=models.IntegerField()
+        ))
+    
+    @property
+    def position(self):
+        """1-based place in the queue while waiting, else None"""
+        if hasattr(self, 'queue_position'):
+            return self.queue_position
+        if self.status != 'waiting':
+            return None
+        return Waitlist.objects.filter(
+            batch_id=self.batch_id, status='waiting', sequence__lte=self.sequence
+        ).count()
 
 
 class ImportHistory(models.Model):
@@ -497,6 +552,7 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['enrollment', 'status']),
             models.Index(fields=['transaction_id']),
+            models.Index(fields=['payment_date', 'id']),
         ]
     
     def __str__(self):
@@ -685,7 +741,7 @@ class Attendance(models.Model):
         unique_together = ['enrollment', 'schedule']
         indexes = [
             models.Index(fields=['enrollment', 'status']),
-            models.Index(fields=['marked_date']),
+            models.Index(fields=['marked_date', 'id']),
         ]
     
     def __str__(self):
@@ -727,6 +783,7 @@ class Notification(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'is_read']),
+            models.Index(fields=['user', 'created_at', 'id']),
         ]
     
     def __str__(self):
@@ -759,19 +816,54 @@ class ActivityLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     device_info = models.TextField(blank=True)
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the row is recorded, not written (see audit.py)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'activity_logs'
         indexes = [
             models.Index(fields=['user', 'created_at']),
             models.Index(fields=['action', 'created_at']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.user} - {self.get_action_display()}"
 
 
+class ActivityLogArchive(models.Model):
+    """
+    One month of activity logs moved out of activity_logs into a
+    compressed JSONL file under ACTIVITY_LOG_ARCHIVE_DIR (see activity_archive.py)
+    """
+    month = models.DateField(unique=True, help_text="First day of the archived month")
+    file_name = models.CharField(max_length=255)
+    row_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'activity_log_archives'
+        ordering = ['month']
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.row_count} rows)"
+
+
+class ActivityLogSummary(models.Model):
+    """Daily count per action of archived activity logs"""
+    date = models.DateField()
+    action = models.CharField(max_length=30)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'activity_log_summaries'
+        ordering = ['date', 'action']
+        unique_together = ['date', 'action']
+    
+    def __str__(self):
+        return f"{self.date} {self.action}: {self.count}"
+
+
 class Announcement(models.Model):
     """Admin announcements for all users"""
     PRIORITY_CHOICES = [
@@ -941,6 +1033,23 @@ class AssignmentSubmission(models.Model):
     
     def __str__(self):
         return f"{self.student.username} - {self.assignment.title}"
+    
+    def set_grade(self, marks, feedback, graded_by, graded_at, assignment=None):
+        """Record marks (after any late penalty) without saving"""
+        from decimal import Decimal
+        assignment = assignment or self.assignment
+        
+        # Apply late penalty if applicable
+        if self.is_late and assignment.late_penalty_percent > 0:
+            penalty = (marks * (assignment.late_penalty_percent / 100)).quantize(Decimal('0.01'))
+            self.late_penalty_applied = penalty
+            marks = marks - penalty
+        
+        self.marks_obtained = marks
+        self.feedback = feedback
+        self.status = 'graded'
+        self.graded_by = graded_by
+        self.graded_at = graded_at
 
 
 class Exam(models.Model):
@@ -1033,104 +1142,198 @@ class StudentProgress(models.Model):
     # Status
     is_at_risk = models.BooleanField(default=False)
     risk_factors = models.JSONField(default=list, blank=True)
+    # 0 (no concern) .. 100, see progress.evaluate_risk
+    risk_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # An input changed (e.g. an attendance mark) since the last recompute
+    risk_stale = models.BooleanField(default=False)
     
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'student_progress'
         ordering = ['-last_updated']
+        indexes = [
+            # at-risk lists sorted by score, keyset-paginated
+            models.Index(fields=['is_at_risk', 'risk_score'], name='progress_risk_score_idx'),
+            # Only the few stale rows are indexed
+            models.Index(fields=['risk_stale'], condition=models.Q(risk_stale=True), name='progress_risk_stale_idx'),
+        ]
     
     def __str__(self):
         return f"{self.enrollment.student.username} - {self.enrollment.batch.course.name}: {self.current_grade}"
     
     @staticmethod
-    def get_letter_grade(percentage):
-        """Convert percentage to letter grade"""
-        from decimal import Decimal
-        percentage = Decimal(str(percentage))
-        
-        if percentage >= 90:
-            return 'A+'
-        elif percentage >= 85:
-            return 'A'
-        elif percentage >= 80:
-            return 'B+'
-        elif percentage >= 75:
-            return 'B'
-        elif percentage >= 70:
-            return 'C+'
-        elif percentage >= 65:
-            return 'C'
-        elif percentage >= 60:
-            return 'D'
-        else:
-            return 'F'
+    def get_letter_grade(percentage, course_id=None):
+        """Convert percentage to letter grade (course's scale, else institute default)"""
+        from .grading import get_scale
+        return get_scale(course_id).letter(percentage)
     
     @staticmethod
-    def get_gpa(percentage):
+    def get_gpa(percentage, course_id=None):
         """Convert percentage to GPA (4.0 scale)"""
-        from decimal import Decimal
-        percentage = Decimal(str(percentage))
-        
-        if percentage >= 90:
-            return Decimal('4.00')
-        elif percentage >= 85:
-            return Decimal('3.70')
-        elif percentage >= 80:
-            return Decimal('3.30')
-        elif percentage >= 75:
-            return Decimal('3.00')
-        elif percentage >= 70:
-            return Decimal('2.70')
-        elif percentage >= 65:
-            return Decimal('2.30')
-        elif percentage >= 60:
-            return Decimal('2.00')
-        else:
-            return Decimal('0.00')
+        from .grading import get_scale
+        return get_scale(course_id).gpa(percentage)
     
     def calculate_overall_grade(self):
         """Calculate overall grade based on weightage"""
-        from decimal import Decimal
+        from .progress import apply_grade
         
         # Assignment: 30%, Exam: 50%, Attendance: 20%
-        overall = (
-            (self.assignment_average * Decimal('0.30')) +
-            (self.exam_average * Decimal('0.50')) +
-            (self.attendance_percentage * Decimal('0.20'))
-        )
-        self.overall_percentage = overall
-        self.current_grade = self.get_letter_grade(overall)
-        self.gpa = self.get_gpa(overall)
+        apply_grade(self, course_id=self.enrollment.batch.course_id)
         self.save()
     
     def check_at_risk(self):
-        """Check if student is at risk"""
-        risk_factors = []
-        
-        if self.attendance_percentage < 75:
-            risk_factors.append('Low attendance (<75%)')
-        
-        if self.overall_percentage < 50:
-            risk_factors.append('Overall progress below 50%')
-        
-        if self.assignment_average < 60:
-            risk_factors.append('Assignment average below 60%')
-        
-        if self.exam_average < 60:
-            risk_factors.append('Exam average below 60%')
+        """Rescore this student's risk from current data"""
+        from .progress import recompute_progress
         
-        # Check consecutive missed assignments
-        recent_submissions = AssignmentSubmission.objects.filter(
-            student=self.enrollment.student,
-            assignment__batch=self.enrollment.batch
-        ).order_by('-assignment__due_date')[:3]
-        
-        if recent_submissions.count() < 2 and self.assignments_total >= 2:
-            risk_factors.append('Missing recent assignments')
-        
-        self.is_at_risk = len(risk_factors) > 0
-        self.risk_factors = risk_factors
-        self.save()
+        recompute_progress(Enrollment.objects.filter(pk=self.enrollment_id))
+        self.refresh_from_db()
         
         return self.is_at_risk
+
+
+class AnalyticsRollup(models.Model):
+    """
+    Precomputed analytics cell: one batch in one week or month
+    
+    Only additive measures are stored so any slice can be summed; ratios
+    (drop rate, average grade, attendance rate) are derived when read.
+    Enrollment outcomes and grades are counted in the period the student
+    enrolled (cohort view), payments by payment date, installments by due
+    date and attendance by marking date. Rebuilt by build_analytics_rollups.
+    """
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='analytics_rollups')
+    # Denormalized from the batch so slices never join
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='analytics_rollups')
+    instructor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='analytics_rollups')
+    category = models.ForeignKey(CourseCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='analytics_rollups')
+    
+    enrollments = models.IntegerField(default=0)
+    completions = models.IntegerField(default=0)
+    drops = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding_installments = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    graded_students = models.IntegerField(default=0)
+    grade_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    attendance_marked = models.IntegerField(default=0)
+    attendance_attended = models.IntegerField(default=0)
+    
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'analytics_rollups'
+        unique_together = ['period', 'period_start', 'batch']
+        indexes = [
+            models.Index(fields=['period', 'period_start']),
+            models.Index(fields=['period', 'course', 'period_start']),
+            models.Index(fields=['period', 'instructor', 'period_start']),
+            models.Index(fields=['period', 'category', 'period_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.batch_id} - {self.period} of {self.period_start}"
+
+
+class RecalculationJob(models.Model):
+    """
+    Background progress recalculation over some batches or the whole institute
+    
+    The enrollments in scope are split into id ranges (chunks) when the job
+    starts; finished chunks are recorded as they complete, so an interrupted
+    or failed job picks up where it stopped when run again.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # None means every batch
+    batch_ids = models.JSONField(null=True, blank=True)
+    chunk_size = models.PositiveIntegerField(default=500)
+    
+    # [first_enrollment_id, last_enrollment_id] per chunk, fixed when planned
+    chunks = models.JSONField(default=list, blank=True)
+    completed_chunks = models.JSONField(default=list, blank=True)
+    total_enrollments = models.IntegerField(default=0)
+    processed_enrollments = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='recalculation_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Heartbeat: bumped after every chunk, used to spot abandoned jobs
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'recalculation_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"Recalculation #{self.pk} ({self.status})"
+    
+    @property
+    def progress_percent(self):
+        if not self.chunks:
+            return 100 if self.status == 'completed' else 0
+        return round(len(self.completed_chunks) * 100 / len(self.chunks), 1)
+
+
+class GradingScale(models.Model):
+    """
+    Percentage -> letter grade / GPA bands
+    
+    The scale without a course is the institute default; a course may have
+    its own. Looked up through api.grading, which caches every scale.
+    """
+    name = models.CharField(max_length=100)
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, null=True, blank=True, related_name='grading_scale',
+        help_text="Leave empty for the institute-wide default scale"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'grading_scales'
+        constraints = [
+            # NULLs never collide in a unique index, so map the default to 0
+            models.UniqueConstraint(
+                Coalesce('course', models.Value(0)), name='unique_default_grading_scale'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.course.code if self.course_id else 'institute default'})"
+
+
+class GradeBand(models.Model):
+    """One band of a grading scale: min_percentage and above (up to the next band)"""
+    scale = models.ForeignKey(GradingScale, on_delete=models.CASCADE, related_name='bands')
+    letter = models.CharField(max_length=5)
+    min_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+    gpa = models.DecimalField(max_digits=3, decimal_places=2)
+    
+    class Meta:
+        db_table = 'grade_bands'
+        ordering = ['scale', '-min_percentage']
+        unique_together = [['scale', 'letter'], ['scale', 'min_percentage']]
+    
+    def __str__(self):
+        return f"{self.letter} >= {self.min_percentage}%"
@@ -0,0 +1,175 @@
+"""
+Keyset (cursor) pagination for list endpoints
+
+Pages are addressed by the (ordering field, pk) of the last row seen instead
+of an OFFSET, so fetching page 1000 costs the same index range scan as page 1.
+The pk tie-breaker keeps pages stable on coarse fields such as
+Enrollment.enrollment_date (a DateField shared by every row of the day).
+
+Pagination is opt-in per request (?cursor= or ?page_size=) so existing
+clients that expect a plain list keep working; set
+KEYSET_PAGINATION_REQUIRED = True to paginate every list response.
+"""
+import base64
+import json
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on (ordering field, pk)"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+    results_key = 'results'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        # Views without an `ordering` attribute (e.g. function views) pass one in
+        self.ordering = ordering
+
+    # ------------------------------------------------------------ request --
+
+    def is_requested(self, request):
+        if getattr(settings, 'KEYSET_PAGINATION_REQUIRED', False):
+            return True
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """First ordering field requested through OrderingFilter, else the view's default"""
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return ordering[0]
+        ordering = self.ordering or getattr(view, 'ordering', None) or queryset.query.order_by or ['-pk']
+        return ordering[0] if isinstance(ordering, (list, tuple)) else ordering
+
+    # ------------------------------------------------------------- cursor --
+
+    def encode_cursor(self, field_value, pk, reverse=False):
+        if hasattr(field_value, 'isoformat'):
+            field_value = field_value.isoformat()
+        elif isinstance(field_value, Decimal):
+            field_value = str(field_value)
+        payload = json.dumps([field_value, pk, int(reverse)], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            field_value, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return field_value, pk, bool(reverse)
+
+    # ----------------------------------------------------------- paginate --
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        if self.field == 'id':
+            self.field = 'pk'
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        # Walking backwards flips the sort, then the page is flipped back
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+
+        limit = self.page_size_value + 1
+        try:
+            rows = self._fetch(queryset, cursor, descending, limit)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = (cursor is not None) if not reverse else has_more
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def _fetch(self, queryset, cursor, descending, limit):
+        if not cursor:
+            return list(queryset[:limit])
+
+        field_value, pk = cursor[0], cursor[1]
+        lookup = 'lt' if descending else 'gt'
+        if self.field == 'pk':
+            return list(queryset.filter(**{f'pk__{lookup}': pk})[:limit])
+
+        # Two index seeks instead of one OR: first the rest of the rows tied
+        # on the cursor value, then the rows past it
+        rows = list(queryset.filter(**{self.field: field_value, f'pk__{lookup}': pk})[:limit])
+        if len(rows) < limit:
+            rows += list(queryset.filter(**{f'{self.field}__{lookup}': field_value})[:limit - len(rows)])
+        return rows
+
+    def _row_key(self, row):
+        value = row.pk if self.field == 'pk' else getattr(row, self.field)
+        return value, row.pk
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self._row_key(self.last_row)))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.first_row is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(*self._row_key(self.first_row), reverse=True)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            (self.results_key, data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': [self.results_key],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                self.results_key: schema,
+            },
+        }
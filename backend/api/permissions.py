@@ -196,7 +196,7 @@ class CanMarkAttendance(BasePermission):
         
         # Only instructors of the batch can mark attendance
         if request.user.role == 'instructor':
-            return obj.schedule.batch.instructor.id == request.user.id
+            return teaches_batch(request.user, obj.schedule.batch)
         
         return False
 
@@ -230,6 +230,16 @@ def has_role(user, *roles):
     return user.is_authenticated and user.role in roles
 
 
+def teaches_batch(user, batch):
+    """
+    Whether user is the batch's instructor, or the course instructor of a
+    batch without its own instructor (batch.course must be loaded)
+    """
+    if batch.instructor_id is not None:
+        return batch.instructor_id == user.id
+    return batch.course.instructor_id == user.id
+
+
 def can_create_user(user, target_role):
     """
     Check if user can create a user with target_role
@@ -0,0 +1,237 @@
+"""
+Prerequisite service
+
+The prerequisite graph is built from a single scan of the
+Course.prerequisites through table and kept in this process, so lookups
+in loops (serializers, bulk enrollment) don't unpickle it from the cache
+every time. The Django cache only holds a version token: signals (see
+signals.py) replace it whenever the prerequisite M2M changes or a course
+is deleted, and every process rebuilds its graph once when the token
+changes. The signals also reject links that would make the graph cyclic,
+so readers never walk the M2M per course. "Which prerequisites does this student lack" is
+then one set-difference query against the student's completed enrollments.
+"""
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+from .models import Course, Enrollment
+
+PREREQUISITE_GRAPH_VERSION_KEY = 'api:prerequisite_graph_version'
+
+# (version, PrerequisiteGraph) built in this process
+_graph = None
+
+
+class PrerequisiteCycle(ValidationError):
+    """Raised when a new prerequisite link would make the graph cyclic"""
+
+
+class PrerequisiteGraph:
+    """
+    In-memory prerequisite DAG
+
+    prerequisites: course_id -> tuple of direct prerequisite ids
+    required_for:  course_id -> tuple of courses that list it as a prerequisite
+    Neighbours are kept in the Course default ordering, so rendered trees list
+    prerequisites in the same order as course.prerequisites.all().
+    """
+
+    def __init__(self, edges):
+        prerequisites = {}
+        required_for = {}
+        for course_id, prereq_id in edges:
+            prerequisites.setdefault(course_id, []).append(prereq_id)
+            required_for.setdefault(prereq_id, []).append(course_id)
+        self.prerequisites = {course_id: tuple(ids) for course_id, ids in prerequisites.items()}
+        self.required_for = {course_id: tuple(ids) for course_id, ids in required_for.items()}
+
+    @classmethod
+    def load(cls):
+        """Build the graph from one scan of the prerequisites through table"""
+        through = Course.prerequisites.through
+        return cls(
+            through.objects.order_by('-to_course__created_at', 'id')
+            .values_list('from_course_id', 'to_course_id')
+        )
+
+    def _reachable(self, course_id, links):
+        seen = {course_id}
+        ordered = []
+        queue = deque(links.get(course_id, ()))
+        while queue:
+            next_id = queue.popleft()
+            if next_id in seen:
+                continue
+            seen.add(next_id)
+            ordered.append(next_id)
+            queue.extend(links.get(next_id, ()))
+        return ordered
+
+    def ancestors(self, course_id):
+        """Transitive prerequisites, nearest first"""
+        return self._reachable(course_id, self.prerequisites)
+
+    def descendants(self, course_id):
+        """Every course this one unlocks, directly or transitively, nearest first"""
+        return self._reachable(course_id, self.required_for)
+
+    def would_create_cycle(self, course_id, prereq_ids):
+        """True if making prereq_ids prerequisites of course_id closes a loop"""
+        prereq_ids = set(prereq_ids)
+        if course_id in prereq_ids:
+            return True
+        return bool(prereq_ids.intersection(self.descendants(course_id)))
+
+    def topological_order(self, course_id):
+        """
+        Suggested course order to reach course_id: every transitive prerequisite
+        before the courses that need it, course_id last
+        """
+        order = []
+        done = set()
+        on_path = set()
+        stack = [(course_id, iter(self.prerequisites.get(course_id, ())))]
+        on_path.add(course_id)
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in done and child not in on_path:
+                    on_path.add(child)
+                    stack.append((child, iter(self.prerequisites.get(child, ()))))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(node)
+                done.add(node)
+                order.append(node)
+        return order
+
+    def tree(self, course_id, render):
+        """
+        Nested prerequisite tree below course_id
+
+        render(course_id) -> dict of node fields. Subtrees are built once per
+        course and shared, so diamond-shaped graphs cost O(nodes + edges).
+        Returns: list of nodes, or None when the course has no prerequisites
+        """
+        memo = {}
+
+        def build(node_id, path):
+            if node_id in memo:
+                return memo[node_id]
+            path = path | {node_id}
+            children = []
+            for prereq_id in self.prerequisites.get(node_id, ()):
+                if prereq_id in path:
+                    continue  # Prevent circular dependencies
+                child = dict(render(prereq_id))
+                subtree = build(prereq_id, path)
+                if subtree:
+                    child['prerequisites'] = subtree
+                children.append(child)
+            memo[node_id] = children or None
+            return memo[node_id]
+
+        return build(course_id, frozenset())
+
+
+def get_cache_timeout():
+    """Safety net for caches that are not shared between processes"""
+    return getattr(settings, 'PREREQUISITE_CACHE_TIMEOUT', 300)
+
+
+def get_graph_version():
+    """Current version token, minting one if the cache has none"""
+    version = cache.get(PREREQUISITE_GRAPH_VERSION_KEY)
+    if version is None:
+        # add() keeps a token another process minted meanwhile
+        cache.add(PREREQUISITE_GRAPH_VERSION_KEY, uuid.uuid4().hex, get_cache_timeout())
+        version = cache.get(PREREQUISITE_GRAPH_VERSION_KEY)
+    return version
+
+
+def get_prerequisite_graph():
+    """PrerequisiteGraph, built once per process for each version"""
+    global _graph
+    version = get_graph_version()
+    if _graph is None or version is None or _graph[0] != version:
+        _graph = (version, PrerequisiteGraph.load())
+    return _graph[1]
+
+
+def invalidate_prerequisite_graph():
+    global _graph
+    _graph = None
+    cache.delete(PREREQUISITE_GRAPH_VERSION_KEY)
+
+
+def direct_prerequisite_ids(course_id):
+    return get_prerequisite_graph().prerequisites.get(course_id, ())
+
+
+def transitive_prerequisite_ids(course_id):
+    """Every course reachable through prerequisite links (cycle safe), nearest first"""
+    return get_prerequisite_graph().ancestors(course_id)
+
+
+def check_prerequisite_cycle(new_links, replacing=None):
+    """
+    Validate new (course_id, prereq_id) links against the current graph
+
+    replacing: course id whose current prerequisites are being replaced by
+    new_links (e.g. a form saving the full prerequisite list)
+    Raises: PrerequisiteCycle if adding them would make the graph cyclic
+    """
+    # Read the table, not the cache: a stale graph could let a cycle through
+    graph = PrerequisiteGraph.load()
+    if replacing is not None:
+        for prereq_id in graph.prerequisites.pop(replacing, ()):
+            graph.required_for[prereq_id] = tuple(
+                course_id for course_id in graph.required_for[prereq_id] if course_id != replacing
+            )
+    for course_id, prereq_id in new_links:
+        if graph.would_create_cycle(course_id, [prereq_id]):
+            raise PrerequisiteCycle('Adding these prerequisites would create a circular prerequisite chain')
+        graph.prerequisites[course_id] = graph.prerequisites.get(course_id, ()) + (prereq_id,)
+        graph.required_for[prereq_id] = graph.required_for.get(prereq_id, ()) + (course_id,)
+
+
+def completed_course_ids(student_ids, course_ids):
+    """
+    Which of course_ids each student has completed (one query)
+    Returns: dict of student_id -> set of course ids
+    """
+    completed = {}
+    if not course_ids:
+        return completed
+    for student_id, course_id in Enrollment.objects.filter(
+        student_id__in=student_ids,
+        course_id__in=course_ids,
+        status='completed'
+    ).values_list('student_id', 'course_id'):
+        completed.setdefault(student_id, set()).add(course_id)
+    return completed
+
+
+def missing_prerequisites(student, course):
+    """
+    Direct prerequisites of course the student has not completed
+    One query, none at all when the course has no prerequisites.
+    Returns: list of Course
+    """
+    prereq_ids = direct_prerequisite_ids(course.pk)
+    if not prereq_ids:
+        return []
+    return list(
+        Course.objects.filter(id__in=prereq_ids).exclude(
+            id__in=Enrollment.objects.filter(
+                student=student,
+                course_id__in=prereq_ids,
+                status='completed'
+            ).values('course_id')
+        )
+    )
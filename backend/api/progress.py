@@ -0,0 +1,257 @@
+"""
+Student progress engine
+
+Recomputes StudentProgress for any set of enrollments (one enrollment, a
+batch, the whole institute) with one grouped aggregate query per source
+table - assignments, exams, submissions, exam results - and a single
+bulk_update (plus one bulk_create for enrollments without a row yet),
+instead of walking submissions per student in Python and saving each
+progress row several times. Attendance comes from the per-enrollment
+counters (Enrollment.present_count etc.), so the attendance table is never
+scanned here.
+
+Risk (is_at_risk, risk_factors, risk_score) is scored in the same pass.
+Grading and result entry recompute their students right away. Other
+inputs only flag rows: attendance marks set risk_stale (see counters.py),
+and assignment due dates passing are found by comparison with
+last_updated. refresh_stale_progress() recomputes just those rows.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Avg, Count, Exists, F, FloatField, OuterRef, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .analytics import invalidate_batch_analytics
+from .counters import ATTENDANCE_COUNTERS, ATTENDED_STATUSES
+from .grading import get_scale
+from .models import Assignment, AssignmentSubmission, Enrollment, Exam, ExamResult, StudentProgress
+
+# Enrollments that carry a progress record
+PROGRESS_ENROLLMENT_STATUSES = ('pending', 'active', 'completed')
+
+# Share of each component in the overall percentage
+ASSIGNMENT_WEIGHT = Decimal('0.30')
+EXAM_WEIGHT = Decimal('0.50')
+ATTENDANCE_WEIGHT = Decimal('0.20')
+
+# Risk thresholds and each one's share of the 0-100 risk score; a shortfall
+# scores proportionally (e.g. 37.5% attendance is half of the attendance share)
+RISK_RULES = (
+    # (progress field, threshold, weight)
+    ('attendance_percentage', Decimal('75'), Decimal('30')),
+    ('overall_percentage', Decimal('50'), Decimal('30')),
+    ('assignment_average', Decimal('60'), Decimal('15')),
+    ('exam_average', Decimal('60'), Decimal('15')),
+)
+MISSING_ASSIGNMENTS_WEIGHT = Decimal('10')
+
+PROGRESS_FIELDS = [
+    'assignment_average', 'exam_average', 'attendance_percentage', 'overall_percentage',
+    'current_grade', 'gpa', 'assignments_submitted', 'assignments_total',
+    'exams_completed', 'exams_total', 'is_at_risk', 'risk_factors', 'risk_score', 'risk_stale',
+    'last_updated',
+]
+
+TWO_PLACES = Decimal('0.01')
+
+
+def to_percentage(value):
+    """Round an aggregate (float/Decimal/None) to a 2-place Decimal"""
+    return Decimal(str(value or 0)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def weighted_overall(progress):
+    """Unrounded overall percentage from the component averages"""
+    return (
+        progress.assignment_average * ASSIGNMENT_WEIGHT +
+        progress.exam_average * EXAM_WEIGHT +
+        progress.attendance_percentage * ATTENDANCE_WEIGHT
+    )
+
+
+def apply_grade(progress, course_id=None):
+    """Set overall_percentage, current_grade and gpa from the component averages"""
+    overall = weighted_overall(progress)
+    progress.overall_percentage = to_percentage(overall)
+    progress.current_grade, progress.gpa = get_scale(course_id).grade(overall)
+
+
+def evaluate_risk(progress, submissions_count, assignments_due=0):
+    """
+    Set is_at_risk, risk_factors and risk_score
+
+    submissions_count: the student's submissions (any status) in the batch
+    assignments_due: assignments of the batch already past their due date
+    """
+    risk_factors = []
+
+    if progress.attendance_percentage < 75:
+        risk_factors.append('Low attendance (<75%)')
+    if progress.overall_percentage < 50:
+        risk_factors.append('Overall progress below 50%')
+    if progress.assignment_average < 60:
+        risk_factors.append('Assignment average below 60%')
+    if progress.exam_average < 60:
+        risk_factors.append('Exam average below 60%')
+    if submissions_count < 2 and progress.assignments_total >= 2:
+        risk_factors.append('Missing recent assignments')
+
+    progress.is_at_risk = len(risk_factors) > 0
+    progress.risk_factors = risk_factors
+
+    score = Decimal(0)
+    for field, threshold, weight in RISK_RULES:
+        shortfall = threshold - getattr(progress, field)
+        if shortfall > 0:
+            score += weight * min(shortfall, threshold) / threshold
+    missing = assignments_due - submissions_count
+    if missing > 0:
+        score += MISSING_ASSIGNMENTS_WEIGHT * missing / assignments_due
+    progress.risk_score = to_percentage(score)
+    progress.risk_stale = False
+    return progress.is_at_risk
+
+
+def recompute_progress(enrollments):
+    """
+    Recompute StudentProgress for every enrollment in the queryset
+
+    Creates missing progress rows. Runs a fixed number of queries whatever
+    the number of enrollments (one write per 500 rows).
+    Returns: number of progress rows written
+    """
+    enrollments = enrollments.filter(batch__isnull=False)
+    rows = list(enrollments.values_list(
+        'id', 'student_id', 'batch_id', 'batch__course_id', *ATTENDANCE_COUNTERS.values()
+    ))
+    if not rows:
+        return 0
+
+    batch_ids = enrollments.values('batch_id')
+    student_ids = enrollments.values('student_id')
+
+    now = timezone.now()
+    existing = dict(
+        StudentProgress.objects.filter(enrollment_id__in=enrollments.values('id'))
+        .values_list('enrollment_id', 'id')
+    )
+    assignments = {
+        batch_id: (total, due)
+        for batch_id, total, due in Assignment.objects.filter(batch_id__in=batch_ids)
+        .values('batch_id').annotate(total=Count('id'), due=Count('id', filter=Q(due_date__lte=now)))
+        .values_list('batch_id', 'total', 'due')
+    }
+    exams_total = dict(
+        Exam.objects.filter(batch_id__in=batch_ids)
+        .values('batch_id').annotate(n=Count('id')).values_list('batch_id', 'n')
+    )
+
+    graded = Q(status='graded')
+    submissions = {
+        (row['student_id'], row['assignment__batch_id']): row
+        for row in AssignmentSubmission.objects.filter(
+            assignment__batch_id__in=batch_ids, student_id__in=student_ids
+        ).values('student_id', 'assignment__batch_id').annotate(
+            submitted=Count('id'),
+            graded=Count('id', filter=graded),
+            average=Avg(
+                Cast('marks_obtained', FloatField()) * 100 / Cast(F('assignment__max_marks'), FloatField()),
+                filter=graded
+            ),
+        )
+    }
+    exam_results = {
+        (row['student_id'], row['exam__batch_id']): row
+        for row in ExamResult.objects.filter(
+            exam__batch_id__in=batch_ids, student_id__in=student_ids
+        ).values('student_id', 'exam__batch_id').annotate(
+            completed=Count('id'),
+            average=Avg('percentage'),
+        )
+    }
+
+    records = []
+    # course_id -> [(progress, unrounded overall)], graded per course scale below
+    to_grade = {}
+    for enrollment_id, student_id, batch_id, course_id, *marks in rows:
+        progress = StudentProgress(pk=existing.get(enrollment_id), enrollment_id=enrollment_id)
+        submission_row = submissions.get((student_id, batch_id), {})
+        exam_row = exam_results.get((student_id, batch_id), {})
+        marks = dict(zip(ATTENDANCE_COUNTERS, marks))
+
+        progress.assignment_average = to_percentage(submission_row.get('average'))
+        progress.assignments_submitted = submission_row.get('graded', 0)
+        progress.assignments_total, assignments_due = assignments.get(batch_id, (0, 0))
+
+        progress.exam_average = to_percentage(exam_row.get('average'))
+        progress.exams_completed = exam_row.get('completed', 0)
+        progress.exams_total = exams_total.get(batch_id, 0)
+
+        marked = sum(marks.values())
+        attended = sum(marks[status] for status in ATTENDED_STATUSES)
+        progress.attendance_percentage = to_percentage(attended * 100 / marked if marked else 0)
+
+        overall = weighted_overall(progress)
+        progress.overall_percentage = to_percentage(overall)
+        to_grade.setdefault(course_id, []).append((progress, overall))
+        evaluate_risk(progress, submission_row.get('submitted', 0), assignments_due)
+        progress.last_updated = now
+        records.append(progress)
+
+    for course_id, graded in to_grade.items():
+        grades = get_scale(course_id).grade_many([overall for _, overall in graded])
+        for (progress, _), (letter, gpa) in zip(graded, grades):
+            progress.current_grade, progress.gpa = letter, gpa
+
+    StudentProgress.objects.bulk_create([p for p in records if p.pk is None], batch_size=500)
+    StudentProgress.objects.bulk_update(
+        [p for p in records if p.enrollment_id in existing], PROGRESS_FIELDS, batch_size=500
+    )
+    invalidate_batch_analytics({batch_id for _, _, batch_id, *_ in rows})
+    return len(records)
+
+
+def recompute_for_enrollment(enrollment):
+    return recompute_progress(Enrollment.objects.filter(pk=enrollment.pk))
+
+
+def recompute_for_students(batch, student_ids):
+    """Progress of the given students in one batch (e.g. after grading)"""
+    return recompute_progress(Enrollment.objects.filter(batch=batch, student_id__in=student_ids))
+
+
+def recompute_for_batch(batch):
+    """Every progress-carrying enrollment of the batch, plus any that already has a record"""
+    return recompute_progress(Enrollment.objects.filter(
+        Q(status__in=PROGRESS_ENROLLMENT_STATUSES) | Q(progress__isnull=False), batch=batch
+    ))
+
+
+def recompute_all():
+    return recompute_progress(Enrollment.objects.filter(status__in=PROGRESS_ENROLLMENT_STATUSES))
+
+
+def stale_enrollment_ids():
+    """Enrollments whose progress is flagged stale or predates a due date that has since passed"""
+    missed_due_date = Assignment.objects.filter(
+        batch_id=OuterRef('enrollment__batch_id'),
+        due_date__gt=OuterRef('last_updated'),
+        due_date__lte=timezone.now()
+    )
+    return StudentProgress.objects.filter(
+        Q(risk_stale=True) | Exists(missed_due_date)
+    ).order_by('enrollment_id').values_list('enrollment_id', flat=True)
+
+
+def refresh_stale_progress(chunk_size=500):
+    """
+    Recompute only the progress rows whose inputs changed since their last
+    recompute, chunk_size enrollments per pass
+    Returns: number of progress rows written
+    """
+    stale = list(stale_enrollment_ids())
+    written = 0
+    for start in range(0, len(stale), chunk_size):
+        written += recompute_progress(Enrollment.objects.filter(pk__in=stale[start:start + chunk_size]))
+    return written
@@ -7,18 +7,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db.models import Avg, Count
-from decimal import Decimal
+from django.db.models import Avg, Count, Q
+from decimal import Decimal, InvalidOperation
 
 from .models import (
     Assignment, AssignmentSubmission, Exam, ExamResult, 
-    StudentProgress, Enrollment, Batch, User
+    StudentProgress, Enrollment, Batch, User, RecalculationJob, GradingScale
 )
 from .serializers import (
     AssignmentSerializer, AssignmentSubmissionSerializer,
-    ExamSerializer, ExamResultSerializer, StudentProgressSerializer
+    ExamSerializer, ExamResultSerializer, StudentProgressSerializer,
+    RecalculationJobSerializer, GradingScaleSerializer
 )
 from .permissions import IsAdminOrStaff
+from .pagination import KeysetPagination
+from .analytics import get_batch_analytics
+from .grading import grade_percentages
+from .bulk_operations import BulkGradingProcessor, ExamResultImporter, read_csv_rows
+from .progress import recompute_for_students
+from .recalculation import create_job, start_job
 
 
 class AssignmentViewSet(viewsets.ModelViewSet):
@@ -91,24 +98,63 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         
         submission = get_object_or_404(AssignmentSubmission, id=submission_id, assignment=assignment)
         
-        # Apply late penalty if applicable
-        if submission.is_late and assignment.late_penalty_percent > 0:
-            penalty = marks * (assignment.late_penalty_percent / 100)
-            submission.late_penalty_applied = penalty
-            marks = marks - penalty
-        
-        submission.marks_obtained = marks
-        submission.feedback = feedback
-        submission.status = 'graded'
-        submission.graded_by = request.user
-        submission.graded_at = timezone.now()
+        submission.set_grade(marks, feedback, request.user, timezone.now(), assignment=assignment)
         submission.save()
         
         # Update student progress
-        self._update_student_progress(submission.student, assignment.batch)
+        recompute_for_students(assignment.batch, [submission.student_id])
         
         return Response({'message': 'Assignment graded successfully'})
     
+    @action(detail=True, methods=['post'])
+    def bulk_grade(self, request, pk=None):
+        """Grade many submissions of this assignment at once (list or CSV)"""
+        if request.user.role not in ['admin', 'staff', 'instructor']:
+            return Response(
+                {'error': 'Only instructors can grade assignments'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        assignment = self.get_object()
+        
+        # CSV columns: submission_id or username, marks, feedback
+        csv_file = request.FILES.get('file')
+        if csv_file:
+            if not csv_file.name.endswith('.csv'):
+                return Response({'error': 'File must be a CSV file'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                grades = read_csv_rows(csv_file)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            processor = BulkGradingProcessor(assignment, grades, request.user, first_row=2)
+        else:
+            grades = request.data.get('grades', [])
+            if not isinstance(grades, list):
+                return Response({'error': 'grades must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+            processor = BulkGradingProcessor(assignment, grades, request.user)
+        
+        graded = processor.process()
+        if processor.errors:
+            return Response({
+                'error': 'No submissions were graded, fix the rows below and resubmit',
+                'error_count': len(processor.errors),
+                'errors': processor.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': f'{len(graded)} submissions graded successfully',
+            'graded': [
+                {
+                    'submission_id': submission.id,
+                    'student_id': submission.student_id,
+                    'username': submission.student.username,
+                    'marks_obtained': str(submission.marks_obtained),
+                    'late_penalty_applied': str(submission.late_penalty_applied)
+                }
+                for submission in graded
+            ]
+        })
+    
     @action(detail=True, methods=['get'])
     def submissions(self, request, pk=None):
         """Get all submissions for an assignment"""
@@ -116,35 +162,6 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         submissions = AssignmentSubmission.objects.filter(assignment=assignment)
         serializer = AssignmentSubmissionSerializer(submissions, many=True)
         return Response(serializer.data)
-    
-    def _update_student_progress(self, student, batch):
-        """Update student progress after grading"""
-        try:
-            enrollment = Enrollment.objects.get(student=student, batch=batch)
-            progress, created = StudentProgress.objects.get_or_create(enrollment=enrollment)
-            
-            # Calculate assignment average
-            submissions = AssignmentSubmission.objects.filter(
-                student=student,
-                assignment__batch=batch,
-                status='graded'
-            )
-            
-            if submissions.exists():
-                total_percentage = 0
-                for sub in submissions:
-                    percentage = (sub.marks_obtained / sub.assignment.max_marks) * 100
-                    total_percentage += percentage
-                progress.assignment_average = total_percentage / submissions.count()
-                progress.assignments_submitted = submissions.count()
-            
-            progress.assignments_total = Assignment.objects.filter(batch=batch).count()
-            progress.save()
-            progress.calculate_overall_grade()
-            progress.check_at_risk()
-            
-        except Enrollment.DoesNotExist:
-            pass
 
 
 class ExamViewSet(viewsets.ModelViewSet):
@@ -170,37 +187,30 @@ class ExamViewSet(viewsets.ModelViewSet):
             )
         
         exam = self.get_object()
-        results_data = request.data.get('results', [])
         
-        created_results = []
-        for result in results_data:
-            student_id = result.get('student_id')
-            marks = Decimal(str(result.get('marks')))
-            remarks = result.get('remarks', '')
-            
-            student = get_object_or_404(User, id=student_id)
-            
-            # Calculate percentage and grade
-            percentage = (marks / exam.max_marks) * 100
-            grade = StudentProgress.get_letter_grade(percentage)
-            result_status = 'pass' if marks >= exam.passing_marks else 'fail'
-            
-            exam_result, created = ExamResult.objects.update_or_create(
-                exam=exam,
-                student=student,
-                defaults={
-                    'marks_obtained': marks,
-                    'percentage': percentage,
-                    'grade': grade,
-                    'status': result_status,
-                    'remarks': remarks,
-                    'entered_by': request.user
-                }
-            )
-            created_results.append(exam_result)
-            
-            # Update student progress
-            self._update_student_progress(student, exam.batch)
+        # Large classes can upload a CSV (student_id or username, marks, remarks)
+        csv_file = request.FILES.get('file')
+        if csv_file:
+            if not csv_file.name.endswith('.csv'):
+                return Response({'error': 'File must be a CSV file'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                results_data = read_csv_rows(csv_file)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            importer = ExamResultImporter(exam, results_data, request.user, first_row=2)
+        else:
+            results_data = request.data.get('results', [])
+            if not isinstance(results_data, list):
+                return Response({'error': 'results must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+            importer = ExamResultImporter(exam, results_data, request.user)
+        
+        created_results = importer.process()
+        if importer.errors:
+            return Response({
+                'error': 'No results were saved, fix the rows below and resubmit',
+                'error_count': len(importer.errors),
+                'errors': importer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'message': f'{len(created_results)} results entered successfully',
@@ -214,31 +224,6 @@ class ExamViewSet(viewsets.ModelViewSet):
         results = ExamResult.objects.filter(exam=exam)
         serializer = ExamResultSerializer(results, many=True)
         return Response(serializer.data)
-    
-    def _update_student_progress(self, student, batch):
-        """Update student progress after exam"""
-        try:
-            enrollment = Enrollment.objects.get(student=student, batch=batch)
-            progress, created = StudentProgress.objects.get_or_create(enrollment=enrollment)
-            
-            # Calculate exam average
-            results = ExamResult.objects.filter(
-                student=student,
-                exam__batch=batch
-            )
-            
-            if results.exists():
-                avg_percentage = results.aggregate(Avg('percentage'))['percentage__avg']
-                progress.exam_average = avg_percentage
-                progress.exams_completed = results.count()
-            
-            progress.exams_total = Exam.objects.filter(batch=batch).count()
-            progress.save()
-            progress.calculate_overall_grade()
-            progress.check_at_risk()
-            
-        except Enrollment.DoesNotExist:
-            pass
 
 
 class StudentProgressViewSet(viewsets.ReadOnlyModelViewSet):
@@ -246,6 +231,7 @@ class StudentProgressViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = StudentProgress.objects.all()
     serializer_class = StudentProgressSerializer
     permission_classes = [IsAuthenticated]
+    AT_RISK_ORDERING = ('risk_score', 'overall_percentage', 'attendance_percentage', 'last_updated')
     
     def get_queryset(self):
         if self.request.user.role == 'student':
@@ -263,68 +249,158 @@ class StudentProgressViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def at_risk(self, request):
-        """Get list of at-risk students"""
+        """
+        Get at-risk students, highest risk score first
+        
+        Filters: batch, course, instructor, min_score. Instructors only see
+        their own batches. ordering: risk_score, overall_percentage,
+        attendance_percentage or last_updated (prefix - for descending).
+        Paginated with ?page_size= / ?cursor=
+        """
         if request.user.role not in ['admin', 'staff', 'instructor']:
             return Response(
                 {'error': 'Permission denied'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        at_risk_students = StudentProgress.objects.filter(is_at_risk=True)
-        serializer = self.get_serializer(at_risk_students, many=True)
+        params = request.query_params
+        ordering = params.get('ordering', '-risk_score')
+        if ordering.lstrip('-') not in self.AT_RISK_ORDERING:
+            return Response(
+                {'error': f'ordering must be one of: {", ".join(self.AT_RISK_ORDERING)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        at_risk_students = StudentProgress.objects.filter(is_at_risk=True).select_related(
+            'enrollment__student', 'enrollment__batch__course'
+        )
+        instructor_id = request.user.id if request.user.role == 'instructor' else params.get('instructor')
+        try:
+            if instructor_id:
+                # A batch without its own instructor is taught by the course instructor
+                at_risk_students = at_risk_students.filter(
+                    Q(enrollment__batch__instructor_id=int(instructor_id)) |
+                    Q(enrollment__batch__instructor__isnull=True,
+                      enrollment__batch__course__instructor_id=int(instructor_id))
+                )
+            if params.get('batch'):
+                at_risk_students = at_risk_students.filter(enrollment__batch_id=int(params['batch']))
+            if params.get('course'):
+                at_risk_students = at_risk_students.filter(enrollment__batch__course_id=int(params['course']))
+            if params.get('min_score'):
+                at_risk_students = at_risk_students.filter(risk_score__gte=Decimal(params['min_score']))
+        except (ValueError, InvalidOperation):
+            return Response({'error': 'Filters must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        paginator = KeysetPagination(ordering=[ordering])
+        page = paginator.paginate_queryset(at_risk_students, request)
+        if page is not None:
+            return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+        
+        # Same tie-break as the keyset pages
+        tie_break = '-pk' if ordering.startswith('-') else 'pk'
+        serializer = self.get_serializer(at_risk_students.order_by(ordering, tie_break), many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def batch_analytics(self, request):
-        """Get analytics for a batch"""
+        """
+        Get analytics for a batch (?batch_id=) or for several (?batch_ids=1,2,3)
+        """
         batch_id = request.query_params.get('batch_id')
-        if not batch_id:
+        batch_ids = request.query_params.get('batch_ids')
+        if not batch_id and not batch_ids:
             return Response({'error': 'batch_id required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        batch = get_object_or_404(Batch, id=batch_id)
-        progress_records = StudentProgress.objects.filter(enrollment__batch=batch)
-        
-        analytics = {
-            'batch': {
-                'id': batch.id,
-                'course': batch.course.name,
-                'batch_number': batch.batch_number
-            },
-            'total_students': progress_records.count(),
-            'at_risk_count': progress_records.filter(is_at_risk=True).count(),
-            'average_grade': progress_records.aggregate(Avg('overall_percentage'))['overall_percentage__avg'] or 0,
-            'grade_distribution': {},
-            'top_performers': [],
-            'struggling_students': []
-        }
-        
-        # Grade distribution
-        for grade in ['A+', 'A', 'B+', 'B', 'C+', 'C', 'D', 'F']:
-            count = progress_records.filter(current_grade=grade).count()
-            analytics['grade_distribution'][grade] = count
-        
-        # Top performers
-        top = progress_records.order_by('-overall_percentage')[:5]
-        analytics['top_performers'] = self.get_serializer(top, many=True).data
-        
-        # Struggling students
-        struggling = progress_records.filter(overall_percentage__lt=60).order_by('overall_percentage')[:10]
-        analytics['struggling_students'] = self.get_serializer(struggling, many=True).data
+        try:
+            ids = [int(value) for value in (batch_ids or batch_id).split(',') if value.strip()]
+        except ValueError:
+            return Response({'error': 'batch ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(analytics)
+        analytics = get_batch_analytics(list(dict.fromkeys(ids)))
+        if batch_ids:
+            return Response({'batches': analytics})
+        if not analytics:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(analytics[0])
     
     @action(detail=False, methods=['post'])
     def recalculate(self, request):
-        """Recalculate all progress for a batch"""
+        """
+        Start a background recalculation for a batch (batch_id), several
+        batches (batch_ids) or every batch (all: true)
+        Returns the job; poll recalculation_job for its progress
+        """
         if request.user.role not in ['admin', 'staff']:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        batch_id = request.data.get('batch_id')
-        batch = get_object_or_404(Batch, id=batch_id)
+        if request.data.get('all') in [True, 'true', '1']:
+            batch_ids = None
+        elif request.data.get('batch_ids') is not None:
+            batch_ids = request.data.get('batch_ids')
+            if not isinstance(batch_ids, list) or not batch_ids:
+                return Response({'error': 'batch_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                batch_ids = {int(batch_id) for batch_id in batch_ids}
+            except (TypeError, ValueError):
+                return Response({'error': 'batch ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            missing = batch_ids - set(Batch.objects.filter(id__in=batch_ids).values_list('id', flat=True))
+            if missing:
+                return Response(
+                    {'error': f'Unknown batch ids: {", ".join(map(str, sorted(missing)))}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            batch_ids = [get_object_or_404(Batch, id=request.data.get('batch_id')).id]
         
-        progress_records = StudentProgress.objects.filter(enrollment__batch=batch)
-        for progress in progress_records:
-            progress.calculate_overall_grade()
-            progress.check_at_risk()
+        job = create_job(batch_ids, requested_by=request.user)
+        start_job(job)
+        job.refresh_from_db()
         
-        return Response({'message': f'Recalculated progress for {progress_records.count()} students'})
+        return Response(RecalculationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'], url_path=r'recalculation-jobs/(?P<job_id>[0-9]+)')
+    def recalculation_job(self, request, job_id=None):
+        """Status and progress of a recalculation job"""
+        if request.user.role not in ['admin', 'staff']:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        job = get_object_or_404(RecalculationJob, id=job_id)
+        return Response(RecalculationJobSerializer(job).data)
+
+
+class GradingScaleViewSet(viewsets.ModelViewSet):
+    """ViewSet for grading scales (institute default and per-course)"""
+    queryset = GradingScale.objects.select_related('course').prefetch_related('bands')
+    serializer_class = GradingScaleSerializer
+    
+    def get_permissions(self):
+        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+            return [IsAuthenticated(), IsAdminOrStaff()]
+        return [IsAuthenticated()]
+    
+    @action(detail=False, methods=['post'])
+    def grade(self, request):
+        """
+        Grade a list of percentages in one call
+        Body: {"percentages": [..], "course": optional course id}
+        """
+        percentages = request.data.get('percentages')
+        if not isinstance(percentages, list):
+            return Response({'error': 'percentages must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            values = [Decimal(str(value)) for value in percentages]
+            course_id = int(request.data['course']) if request.data.get('course') else None
+        except (InvalidOperation, ValueError):
+            return Response({'error': 'percentages and course must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(value.is_finite() for value in values):
+            return Response({'error': 'percentages must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        grades = grade_percentages(values, course_id=course_id)
+        return Response({
+            'course': course_id,
+            'grades': [
+                {'percentage': str(value), 'letter': letter, 'gpa': str(gpa)}
+                for value, (letter, gpa) in zip(values, grades)
+            ]
+        })
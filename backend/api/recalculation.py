@@ -0,0 +1,183 @@
+"""
+Progress recalculation jobs
+
+A RecalculationJob recomputes StudentProgress for some batches (or all of
+them) outside the request. When the job starts, the enrollments in scope
+are split into id ranges of PROGRESS_RECALC_CHUNK_SIZE. Each chunk goes
+through the progress engine - a fixed number of queries per chunk - in a
+pool of PROGRESS_RECALC_WORKERS processes. The parent process records
+every finished chunk on the job, so the job reports progress as it goes.
+If the job fails or its process dies, running it again skips the chunks
+already done.
+
+Jobs are started by the recalculate endpoint in a background thread, or
+picked up by `python manage.py run_recalculation_jobs`, which also
+resumes jobs that stopped reporting.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import invalidate_batch_analytics
+from .models import Enrollment, RecalculationJob
+from .progress import PROGRESS_ENROLLMENT_STATUSES, recompute_progress
+from .workers import init_worker
+
+logger = logging.getLogger(__name__)
+
+# A running job whose heartbeat is older than this is treated as abandoned
+STALE_AFTER = timedelta(minutes=10)
+
+
+def get_chunk_size():
+    return getattr(settings, 'PROGRESS_RECALC_CHUNK_SIZE', 500)
+
+
+def get_workers():
+    return getattr(settings, 'PROGRESS_RECALC_WORKERS', 1)
+
+
+def job_scope(batch_ids):
+    """Enrollments a job over batch_ids (None: every batch) recalculates"""
+    enrollments = Enrollment.objects.filter(
+        Q(status__in=PROGRESS_ENROLLMENT_STATUSES) | Q(progress__isnull=False), batch__isnull=False
+    )
+    if batch_ids is not None:
+        enrollments = enrollments.filter(batch_id__in=batch_ids)
+    return enrollments
+
+
+def create_job(batch_ids=None, requested_by=None, chunk_size=None):
+    return RecalculationJob.objects.create(
+        batch_ids=sorted(set(batch_ids)) if batch_ids is not None else None,
+        chunk_size=chunk_size or get_chunk_size(),
+        requested_by=requested_by
+    )
+
+
+def plan_chunks(job):
+    """Split the job's enrollments into fixed id ranges (once per job)"""
+    ids = list(job_scope(job.batch_ids).order_by('id').values_list('id', flat=True))
+    job.chunks = [
+        [ids[start], ids[min(start + job.chunk_size, len(ids)) - 1]]
+        for start in range(0, len(ids), job.chunk_size)
+    ]
+    job.total_enrollments = len(ids)
+    job.save(update_fields=['chunks', 'total_enrollments', 'updated_at'])
+
+
+def recompute_chunk(batch_ids, first_id, last_id):
+    """
+    Recompute one chunk (runs in a worker process)
+    Returns: (progress rows written, batch ids touched)
+    """
+    enrollments = job_scope(batch_ids).filter(id__gte=first_id, id__lte=last_id)
+    touched = set(enrollments.values_list('batch_id', flat=True))
+    return recompute_progress(enrollments), touched
+
+
+def _use_pool(workers):
+    # Worker processes cannot see an in-memory SQLite database (tests)
+    return workers > 1 and not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def claim_job(job_id, stale_after=STALE_AFTER):
+    """
+    Mark the job running if it is not already being run
+
+    A job can be claimed when queued or failed, or when running but silent
+    for longer than stale_after (its process died).
+    Returns: the job, or None if another runner owns it or it is done
+    """
+    now = timezone.now()
+    claimed = RecalculationJob.objects.filter(
+        Q(status__in=['queued', 'failed']) | Q(status='running', updated_at__lt=now - stale_after),
+        pk=job_id
+    ).update(status='running', error='', started_at=now, finished_at=None, updated_at=now)
+    return RecalculationJob.objects.get(pk=job_id) if claimed else None
+
+
+def run_job(job, workers=None):
+    """
+    Process every chunk of a claimed job not yet completed
+    Returns: the job, completed or failed
+    """
+    workers = get_workers() if workers is None else workers
+    if not job.chunks:
+        plan_chunks(job)
+
+    done = set(job.completed_chunks)
+    pending = [index for index in range(len(job.chunks)) if index not in done]
+
+    def record(index, written, touched):
+        job.completed_chunks.append(index)
+        job.processed_enrollments += written
+        job.save(update_fields=['completed_chunks', 'processed_enrollments', 'updated_at'])
+        # Workers only clear their own cache; clear this process's as well
+        invalidate_batch_analytics(touched)
+
+    try:
+        if pending and _use_pool(workers):
+            # Workers open their own connections; don't hand them ours
+            database_name = str(connection.settings_dict['NAME'])
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(pending)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(database_name,)
+            ) as pool:
+                futures = {
+                    pool.submit(recompute_chunk, job.batch_ids, *job.chunks[index]): index
+                    for index in pending
+                }
+                for future in as_completed(futures):
+                    record(futures[future], *future.result())
+        else:
+            for index in pending:
+                record(index, *recompute_chunk(job.batch_ids, *job.chunks[index]))
+    except Exception as e:
+        logger.exception('Recalculation job %s failed', job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def run_job_by_id(job_id, workers=None):
+    job = claim_job(job_id)
+    if job is None:
+        return None
+    return run_job(job, workers=workers)
+
+
+def start_job(job):
+    """Run the job in a background thread, or inline if PROGRESS_RECALC_BACKGROUND is off"""
+    if not getattr(settings, 'PROGRESS_RECALC_BACKGROUND', True):
+        run_job_by_id(job.pk)
+        return
+
+    def target():
+        try:
+            run_job_by_id(job.pk)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=target, name=f'recalculation-job-{job.pk}', daemon=True).start()
+
+
+def resumable_jobs(stale_after=STALE_AFTER):
+    """Queued jobs and running jobs whose runner went silent, oldest first"""
+    return RecalculationJob.objects.filter(
+        Q(status='queued') | Q(status='running', updated_at__lt=timezone.now() - stale_after)
+    ).order_by('created_at')
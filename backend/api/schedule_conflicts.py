@@ -0,0 +1,143 @@
+"""
+Schedule conflict engine
+
+Loads all of a student's weekly slots in one query, buckets them by
+day_of_week and finds overlaps with a sweep over start times, instead of
+comparing every schedule of every enrollment pairwise.
+"""
+from collections import defaultdict
+
+from .models import Enrollment, Schedule
+
+ACTIVE_ENROLLMENT_STATUSES = ('active', 'pending')
+
+DAY_ORDER = {code: index for index, (code, _) in enumerate(Schedule.DAYS_OF_WEEK)}
+
+
+def student_slots_query(student_ids):
+    """Schedules of every active/pending enrollment of the given students"""
+    return Schedule.objects.filter(
+        batch__enrollments__student_id__in=student_ids,
+        batch__enrollments__status__in=ACTIVE_ENROLLMENT_STATUSES
+    ).select_related('batch', 'batch__course')
+
+
+def load_student_slots(student):
+    """All weekly slots the student currently attends (one query)"""
+    return list(student_slots_query([student.pk]))
+
+
+def load_slots_by_student(student_ids):
+    """
+    Weekly slots for a whole cohort in two queries
+    Returns: dict of student_id -> list of Schedule
+    """
+    batch_ids_by_student = defaultdict(set)
+    for student_id, batch_id in Enrollment.objects.filter(
+        student_id__in=student_ids,
+        status__in=ACTIVE_ENROLLMENT_STATUSES,
+        batch__isnull=False
+    ).values_list('student_id', 'batch_id'):
+        batch_ids_by_student[student_id].add(batch_id)
+
+    all_batch_ids = set().union(*batch_ids_by_student.values()) if batch_ids_by_student else set()
+    slots_by_batch = defaultdict(list)
+    for slot in Schedule.objects.filter(batch_id__in=all_batch_ids).select_related('batch', 'batch__course'):
+        slots_by_batch[slot.batch_id].append(slot)
+
+    return {
+        student_id: [slot for batch_id in batch_ids for slot in slots_by_batch[batch_id]]
+        for student_id, batch_ids in batch_ids_by_student.items()
+    }
+
+
+def bucket_by_day(slots):
+    """Group slots by day_of_week, each bucket sorted by start time"""
+    buckets = defaultdict(list)
+    for slot in slots:
+        buckets[slot.day_of_week].append(slot)
+    for day_slots in buckets.values():
+        day_slots.sort(key=lambda s: (s.start_time, s.end_time))
+    return buckets
+
+
+def find_overlaps(new_slots, existing_by_day):
+    """
+    Sweep-line overlap search
+
+    new_slots: slots of the batch being joined
+    existing_by_day: output of bucket_by_day() for the student's current slots
+    Returns: list of (new_slot, existing_slot) pairs that overlap, ordered by
+    day, then by start time
+    """
+    pairs = []
+    for day, new_day_slots in sorted(bucket_by_day(new_slots).items(), key=lambda item: DAY_ORDER.get(item[0], 99)):
+        existing_day_slots = existing_by_day.get(day)
+        if not existing_day_slots:
+            continue
+
+        # Merge both sides by start time; an interval overlaps exactly the
+        # intervals of the other side that are still open when it starts
+        events = sorted(
+            [(slot.start_time, 0, slot) for slot in new_day_slots] +
+            [(slot.start_time, 1, slot) for slot in existing_day_slots],
+            key=lambda event: (event[0], event[1])
+        )
+        open_slots = ([], [])  # (new, existing)
+        for start, side, slot in events:
+            other = [s for s in open_slots[1 - side] if s.end_time > start]
+            open_slots[1 - side][:] = other
+            for candidate in other:
+                new_slot, existing_slot = (slot, candidate) if side == 0 else (candidate, slot)
+                if new_slot.start_time < existing_slot.end_time and existing_slot.start_time < new_slot.end_time:
+                    pairs.append((new_slot, existing_slot))
+            open_slots[side].append(slot)
+    return pairs
+
+
+def _slot_details(slot):
+    return {
+        'day': slot.get_day_of_week_display(),
+        'start_time': slot.start_time.strftime('%H:%M'),
+        'end_time': slot.end_time.strftime('%H:%M'),
+        'room': slot.room_number,
+        'building': slot.building
+    }
+
+
+def build_conflict(new_batch, new_slot, existing_slot):
+    """Conflict dict in the shape returned by Schedule.check_schedule_conflicts"""
+    existing_batch = existing_slot.batch
+    _, conflict_msg = new_slot.conflicts_with(existing_slot)
+    return {
+        'existing_course': existing_batch.course.name,
+        'existing_course_code': existing_batch.course.code,
+        'existing_batch': existing_batch.batch_number,
+        'new_course': new_batch.course.name,
+        'new_course_code': new_batch.course.code,
+        'new_batch': new_batch.batch_number,
+        'conflict_description': conflict_msg,
+        'existing_schedule': _slot_details(existing_slot),
+        'new_schedule': _slot_details(new_slot)
+    }
+
+
+def conflicts_for_slots(new_batch, new_slots, existing_slots):
+    """Conflict dicts between a batch's slots and a student's existing slots"""
+    return [
+        build_conflict(new_batch, new_slot, existing_slot)
+        for new_slot, existing_slot in find_overlaps(new_slots, bucket_by_day(existing_slots))
+    ]
+
+
+def check_schedule_conflicts(student, new_batch):
+    """
+    Check if enrolling in new_batch would create schedule conflicts for student
+    Returns: (bool: has_conflicts, list: conflict_details)
+    """
+    new_slots = list(new_batch.schedules.all())
+    if not new_slots:
+        return False, []
+
+    conflicts = conflicts_for_slots(new_batch, new_slots, load_student_slots(student))
+    return len(conflicts) > 0, conflicts
@@ -0,0 +1,246 @@
+"""
+Seat reservation engine for batch enrollments
+
+Seats are taken with a conditional UPDATE on the batch row
+(``held_count + n`` only WHERE ``enrolled_count + held_count + n <= capacity``)
+so concurrent requests can never overbook a batch, no matter how stale the
+``Batch`` instance they loaded is. A successful take is recorded as a
+short-lived ``SeatHold``; confirming the hold creates the enrollment(s) and
+hands the seats over to ``enrolled_count``, releasing or expiring it gives the
+seats back.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Batch, Enrollment, SeatHold
+
+
+class SeatUnavailable(Exception):
+    """Raised when a batch has no free seats left"""
+
+
+class HoldExpired(SeatUnavailable):
+    """Raised when confirming a hold that was released or has expired"""
+
+
+def get_hold_ttl():
+    """Default lifetime of a seat hold"""
+    return timedelta(seconds=getattr(settings, 'SEAT_HOLD_TTL_SECONDS', 120))
+
+
+def free_seats(batch):
+    """Seats that can still be held, read fresh from the database"""
+    row = Batch.objects.filter(pk=batch.pk).values('capacity', 'enrolled_count', 'held_count').first()
+    if row is None:
+        return 0
+    return max(row['capacity'] - row['enrolled_count'] - row['held_count'], 0)
+
+
+def _take_seats(batch_id, seats):
+    """Atomically move `seats` into held_count if they fit. Returns True on success."""
+    return Batch.objects.filter(
+        pk=batch_id,
+        capacity__gte=F('enrolled_count') + F('held_count') + seats
+    ).update(held_count=F('held_count') + seats) == 1
+
+
+def _give_back_seats(batch_id, seats):
+    if seats > 0:
+        Batch.objects.filter(pk=batch_id).update(held_count=F('held_count') - seats)
+
+
+def hold_seats(batch, seats=1, student=None, ttl=None, partial=False):
+    """
+    Reserve seats in a batch for a short time
+
+    With partial=True, holds as many seats as are free (up to `seats`) instead
+    of failing when fewer than `seats` are left.
+    Returns: SeatHold
+    Raises: SeatUnavailable when nothing could be held
+    """
+    if seats < 1:
+        raise ValueError('seats must be at least 1')
+
+    ttl = ttl or get_hold_ttl()
+
+    with transaction.atomic():
+        taken = seats if _take_seats(batch.pk, seats) else 0
+
+        if not taken:
+            # Stale holds may be sitting on seats - reclaim them and retry once
+            if expire_stale_holds(batch=batch) and _take_seats(batch.pk, seats):
+                taken = seats
+
+        if not taken and partial:
+            # Grab whatever is left; retry while other writers race us for it
+            while True:
+                available = min(free_seats(batch), seats)
+                if available <= 0:
+                    break
+                if _take_seats(batch.pk, available):
+                    taken = available
+                    break
+
+        if not taken:
+            raise SeatUnavailable(f'No seats available in {batch}')
+
+        return SeatHold.objects.create(
+            batch=batch,
+            student=student,
+            seats=taken,
+            expires_at=timezone.now() + ttl
+        )
+
+
+def release_hold(hold):
+    """
+    Give the seats of a hold back to the batch
+    Returns: bool - False if the hold was no longer active
+    """
+    with transaction.atomic():
+        released = SeatHold.objects.filter(pk=hold.pk, status='held').update(status='released')
+        if released:
+            _give_back_seats(hold.batch_id, hold.seats)
+    hold.status = 'released' if released else hold.status
+    return bool(released)
+
+
+def confirm_hold(hold, students=None, status='active'):
+    """
+    Turn a hold into enrollments, one seat per student
+
+    Seats that are not used are returned to the batch. Everything happens in
+    one transaction, so a failed enrollment also rolls back the confirmation.
+    Returns: list of created Enrollment objects
+    Raises: HoldExpired if the hold is no longer active
+    """
+    if students is None:
+        students = [hold.student]
+    if len(students) > hold.seats:
+        raise ValueError(f'Hold covers {hold.seats} seat(s) but {len(students)} students were given')
+
+    batch = hold.batch
+
+    with transaction.atomic():
+        confirmed = SeatHold.objects.filter(
+            pk=hold.pk,
+            status='held',
+            expires_at__gt=timezone.now()
+        ).update(status='confirmed')
+        if not confirmed:
+            raise HoldExpired(f'Seat hold {hold.pk} is no longer active')
+
+        enrollments = [
+            Enrollment.objects.create(
+                student=student,
+                batch=batch,
+                course=batch.course,
+                status=status
+            )
+            for student in students
+        ]
+
+        # Seats now counted in enrolled_count (or unused) leave held_count
+        _give_back_seats(batch.pk, hold.seats)
+
+    hold.status = 'confirmed'
+    return enrollments
+
+
+def bulk_confirm_hold(hold, students, status='active'):
+    """
+    confirm_hold() for large cohorts: one bulk INSERT instead of a save per student
+
+    bulk_create bypasses the enrollment signals, so the counters are shifted
+    once here for the whole cohort.
+    Returns: list of created Enrollment objects
+    Raises: HoldExpired if the hold is no longer active
+    """
+    from .counters import COUNTED_STATUSES, shift_enrollment_counts
+
+    if len(students) > hold.seats:
+        raise ValueError(f'Hold covers {hold.seats} seat(s) but {len(students)} students were given')
+
+    batch = hold.batch
+
+    with transaction.atomic():
+        confirmed = SeatHold.objects.filter(
+            pk=hold.pk,
+            status='held',
+            expires_at__gt=timezone.now()
+        ).update(status='confirmed')
+        if not confirmed:
+            raise HoldExpired(f'Seat hold {hold.pk} is no longer active')
+
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=batch, course=batch.course, status=status)
+            for student in students
+        ], batch_size=500)
+
+        if status in COUNTED_STATUSES:
+            shift_enrollment_counts(batch.pk, len(enrollments))
+        _give_back_seats(batch.pk, hold.seats)
+
+    hold.status = 'confirmed'
+    return enrollments
+
+
+def confirm_hold_for(hold, save):
+    """
+    Confirm a hold for an enrollment that already exists (reactivation or
+    a move to another batch)
+
+    save() stores the enrollment in its seat-occupying state; the counter
+    signals add it to enrolled_count and the hold's seats leave held_count.
+    Returns: whatever save() returns
+    Raises: HoldExpired if the hold is no longer active
+    """
+    with transaction.atomic():
+        confirmed = SeatHold.objects.filter(
+            pk=hold.pk,
+            status='held',
+            expires_at__gt=timezone.now()
+        ).update(status='confirmed')
+        if not confirmed:
+            raise HoldExpired(f'Seat hold {hold.pk} is no longer active')
+        result = save()
+        _give_back_seats(hold.batch_id, hold.seats)
+    hold.status = 'confirmed'
+    return result
+
+
+def enroll_with_seat(batch, student, status='active'):
+    """
+    Hold a seat and enroll the student in one step
+    Returns: Enrollment
+    Raises: SeatUnavailable if the batch is full
+    """
+    with transaction.atomic():
+        hold = hold_seats(batch, student=student)
+        return confirm_hold(hold, [student], status=status)[0]
+
+
+def expire_stale_holds(batch=None):
+    """
+    Expire holds past their deadline and return their seats
+    Returns: number of holds expired
+    """
+    with transaction.atomic():
+        stale = SeatHold.objects.select_for_update().filter(status='held', expires_at__lte=timezone.now())
+        if batch is not None:
+            stale = stale.filter(batch=batch)
+
+        stale_ids = list(stale.values_list('id', flat=True))
+        if not stale_ids:
+            return 0
+
+        seats_by_batch = SeatHold.objects.filter(id__in=stale_ids).values('batch_id').annotate(seats=Sum('seats'))
+        for row in seats_by_batch:
+            _give_back_seats(row['batch_id'], row['seats'])
+
+        SeatHold.objects.filter(id__in=stale_ids).update(status='expired')
+        return len(stale_ids)
@@ -1,15 +1,45 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Count, OuterRef, Q, Subquery
 from .models import (
     User, CourseCategory, Course, Batch, Schedule, Enrollment,
     Payment, Attendance, Notification, ActivityLog, Announcement, Waitlist,
     PaymentPlan, Installment, Scholarship, ScholarshipApplication,
-    Assignment, AssignmentSubmission, Exam, ExamResult, StudentProgress, PasswordReset, EmailVerification
+    Assignment, AssignmentSubmission, Exam, ExamResult, StudentProgress, PasswordReset, EmailVerification,
+    RecalculationJob, GradingScale, GradeBand
 )
+from .grading import invalidate_grading_scales
 
 User = get_user_model()
 
 
+class SparseFieldsetMixin:
+    """
+    Limit output to ?fields=a,b,c on list/retrieve responses
+
+    Only the serializer created by the view (it is the one holding the request
+    in its context) is trimmed; unknown names are rejected with a 400.
+    """
+    fields_query_param = 'fields'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get(self.fields_query_param)
+        if not requested:
+            return
+        wanted = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({
+                self.fields_query_param: [f'Unknown field(s): {", ".join(sorted(unknown))}']
+            })
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
 # ===================== USER SERIALIZERS =====================
 
 class UserSerializer(serializers.ModelSerializer):
@@ -25,7 +55,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'enrollment_date', 'created_at']
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Detailed user serializer with sensitive fields (for self & admin only)"""
     role_display = serializers.CharField(source='get_role_display', read_only=True)
     
@@ -190,7 +220,7 @@ class BatchSerializer(serializers.ModelSerializer):
 
 # ===================== ENROLLMENT SERIALIZERS =====================
 
-class EnrollmentListSerializer(serializers.ModelSerializer):
+class EnrollmentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Simple enrollment serializer for listing"""
     student_name = serializers.CharField(source='student.get_full_name', read_only=True)
     batch_info = serializers.CharField(source='batch.__str__', read_only=True)
@@ -237,8 +267,32 @@ class EnrollmentDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'enrollment_date']
     
+    @classmethod
+    def annotate_queryset(cls, queryset):
+        """
+        Add the latest payment and attendance counts to each row, so
+        payment_status and attendance_count need no per-object queries
+        """
+        latest = Payment.objects.filter(enrollment=OuterRef('pk')).order_by('-payment_date')
+        return queryset.annotate(
+            latest_payment_status=Subquery(latest.values('status')[:1]),
+            latest_payment_amount=Subquery(latest.values('amount')[:1]),
+            latest_payment_date=Subquery(latest.values('payment_date')[:1]),
+            attendance_total=Count('attendance_records'),
+            attendance_present=Count('attendance_records', filter=Q(attendance_records__status='present')),
+        )
+    
     def get_payment_status(self, obj):
         """Get latest payment status"""
+        if hasattr(obj, 'latest_payment_status'):
+            if obj.latest_payment_status is None:
+                return None
+            return {
+                'status': obj.latest_payment_status,
+                'amount': str(obj.latest_payment_amount),
+                'date': obj.latest_payment_date
+            }
+        
         latest_payment = obj.payments.order_by('-payment_date').first()
         if latest_payment:
             return {
@@ -250,6 +304,9 @@ class EnrollmentDetailSerializer(serializers.ModelSerializer):
     
     def get_attendance_count(self, obj):
         """Get attendance statistics"""
+        if hasattr(obj, 'attendance_total'):
+            return {'total': obj.attendance_total, 'present': obj.attendance_present}
+        
         total = obj.attendance_records.count()
         present = obj.attendance_records.filter(status='present').count()
         return {'total': total, 'present': present}
@@ -267,6 +324,7 @@ class WaitlistSerializer(serializers.ModelSerializer):
     batch_number = serializers.CharField(source='batch.batch_number', read_only=True)
     batch_info = serializers.CharField(source='batch.__str__', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    position = serializers.IntegerField(read_only=True, allow_null=True)
     
     class Meta:
         model = Waitlist
@@ -276,6 +334,11 @@ class WaitlistSerializer(serializers.ModelSerializer):
             'position', 'priority', 'joined_date', 'notified', 'status', 'status_display', 'notes'
         ]
         read_only_fields = ['id', 'position', 'joined_date', 'notified']
+    
+    @classmethod
+    def annotate_queryset(cls, queryset):
+        """Rank waiting entries in the query, so position needs no per-object queries"""
+        return Waitlist.with_positions(queryset)
 
 
 class PrerequisiteCheckSerializer(serializers.Serializer):
@@ -292,7 +355,7 @@ class PrerequisiteCheckSerializer(serializers.Serializer):
 
 # ===================== PAYMENT SERIALIZERS =====================
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Payment serializer"""
     student_name = serializers.CharField(source='enrollment.student.get_full_name', read_only=True)
     course_name = serializers.CharField(source='enrollment.batch.course.name', read_only=True)
@@ -307,9 +370,9 @@ class PaymentSerializer(serializers.ModelSerializer):
             'id', 'enrollment', 'student_name', 'course_name', 'batch_info',
             'amount', 'status', 'status_display', 'payment_method', 'method_display',
             'transaction_id', 'receipt_number', 'payment_date', 'verified_date',
-            'verified_by', 'verified_by_name', 'notes', 'created_at'
+            'verified_by', 'verified_by_name', 'notes'
         ]
-        read_only_fields = ['id', 'payment_date', 'verified_date', 'verified_by', 'created_at']
+        read_only_fields = ['id', 'payment_date', 'verified_date', 'verified_by']
 
 
 class PaymentVerifySerializer(serializers.ModelSerializer):
@@ -326,7 +389,7 @@ class PaymentVerifySerializer(serializers.ModelSerializer):
 
 # ===================== ATTENDANCE SERIALIZERS =====================
 
-class AttendanceSerializer(serializers.ModelSerializer):
+class AttendanceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Attendance serializer"""
     student_name = serializers.CharField(source='enrollment.student.get_full_name', read_only=True)
     instructor_name = serializers.CharField(source='marked_by.get_full_name', read_only=True)
@@ -347,7 +410,7 @@ class AttendanceSerializer(serializers.ModelSerializer):
 
 # ===================== NOTIFICATION SERIALIZERS =====================
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Notification serializer"""
     type_display = serializers.CharField(source='get_notification_type_display', read_only=True)
     channel_display = serializers.CharField(source='get_channel_display', read_only=True)
@@ -363,7 +426,7 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 # ===================== ACTIVITY LOG SERIALIZERS =====================
 
-class ActivityLogSerializer(serializers.ModelSerializer):
+class ActivityLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Activity log serializer - admin only"""
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
     target_user_name = serializers.CharField(source='target_user.get_full_name', read_only=True)
@@ -587,6 +650,97 @@ class StudentProgressSerializer(serializers.ModelSerializer):
             'overall_percentage', 'current_grade', 'gpa',
             'assignments_submitted', 'assignments_total',
             'exams_completed', 'exams_total',
-            'is_at_risk', 'risk_factors', 'last_updated'
+            'is_at_risk', 'risk_factors', 'risk_score', 'last_updated'
+        ]
+        read_only_fields = ['id', 'risk_score', 'last_updated']
+
+
+class GradeBandSerializer(serializers.ModelSerializer):
+    """Serializer for one band of a grading scale"""
+    class Meta:
+        model = GradeBand
+        fields = ['letter', 'min_percentage', 'gpa']
+    
+    def validate_min_percentage(self, value):
+        if not 0 <= value <= 100:
+            raise serializers.ValidationError("min_percentage must be between 0 and 100")
+        return value
+    
+    def validate_gpa(self, value):
+        if value < 0:
+            raise serializers.ValidationError("gpa cannot be negative")
+        return value
+
+
+class GradingScaleSerializer(serializers.ModelSerializer):
+    """Serializer for grading scales; saving replaces all bands"""
+    bands = GradeBandSerializer(many=True)
+    course_name = serializers.CharField(source='course.name', read_only=True)
+    
+    class Meta:
+        model = GradingScale
+        fields = ['id', 'name', 'course', 'course_name', 'bands', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def validate_bands(self, value):
+        if not value:
+            raise serializers.ValidationError("A grading scale needs at least one band")
+        letters = [band['letter'] for band in value]
+        minimums = [band['min_percentage'] for band in value]
+        if len(set(letters)) != len(letters):
+            raise serializers.ValidationError("Letters must be unique within a scale")
+        if len(set(minimums)) != len(minimums):
+            raise serializers.ValidationError("min_percentage must be unique within a scale")
+        if min(minimums) != 0:
+            raise serializers.ValidationError("The lowest band must start at 0")
+        return value
+    
+    def validate(self, attrs):
+        # NULL courses never clash in the unique index check DRF runs
+        course = attrs.get('course', self.instance.course if self.instance else None)
+        if course is None:
+            defaults = GradingScale.objects.filter(course__isnull=True)
+            if self.instance:
+                defaults = defaults.exclude(pk=self.instance.pk)
+            if defaults.exists():
+                raise serializers.ValidationError({'course': "The institute default scale already exists"})
+        return attrs
+    
+    def create(self, validated_data):
+        bands = validated_data.pop('bands')
+        scale = GradingScale.objects.create(**validated_data)
+        GradeBand.objects.bulk_create([GradeBand(scale=scale, **band) for band in bands])
+        # bulk_create sends no post_save, so the band signals don't fire
+        invalidate_grading_scales()
+        return scale
+    
+    def update(self, instance, validated_data):
+        bands = validated_data.pop('bands', None)
+        instance = super().update(instance, validated_data)
+        if bands is not None:
+            instance.bands.all().delete()
+            GradeBand.objects.bulk_create([GradeBand(scale=instance, **band) for band in bands])
+            invalidate_grading_scales()
+        return instance
+
+
+class RecalculationJobSerializer(serializers.ModelSerializer):
+    """Serializer for progress recalculation jobs"""
+    progress_percent = serializers.FloatField(read_only=True)
+    total_chunks = serializers.SerializerMethodField()
+    completed_chunks = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = RecalculationJob
+        fields = [
+            'id', 'status', 'batch_ids', 'chunk_size', 'total_chunks', 'completed_chunks',
+            'progress_percent', 'total_enrollments', 'processed_enrollments', 'error',
+            'requested_by', 'created_at', 'started_at', 'finished_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'last_updated']
+        read_only_fields = fields
+    
+    def get_total_chunks(self, obj):
+        return len(obj.chunks)
+    
+    def get_completed_chunks(self, obj):
+        return len(obj.completed_chunks)
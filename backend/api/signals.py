@@ -1,98 +1,206 @@
 """
 Django signals for automatic enrollment count management
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import Enrollment
+from .models import Attendance, Batch, Course, Enrollment, GradeBand, GradingScale, StudentProgress
+from .counters import (
+    COUNTED_STATUSES, reconcile_attendance_counts, reconcile_enrollment_counts,
+    shift_attendance_counts, shift_enrollment_counts
+)
+from .waitlist import schedule_promotion
+
+# Marker for instances loaded without their status/batch columns (e.g. .only())
+_UNKNOWN = object()
+
+
+def _counted_batch_id(instance):
+    """Batch whose seat this enrollment occupies, or None if it holds no seat"""
+    if 'status' not in instance.__dict__ or 'batch_id' not in instance.__dict__:
+        return _UNKNOWN
+    return instance.batch_id if instance.status in COUNTED_STATUSES else None
+
+
+def _sync_cached_batch(instance, delta):
+    """Keep an already-loaded instance.batch in step with the database"""
+    if delta and Enrollment.batch.is_cached(instance) and instance.batch is not None:
+        instance.batch.enrolled_count += delta
+
+
+@receiver(post_init, sender=Enrollment)
+def remember_counted_state(sender, instance, **kwargs):
+    """Snapshot the seat-occupying state so saves can apply a delta"""
+    instance._counted_batch_id = _counted_batch_id(instance)
+
+
+@receiver(pre_save, sender=Enrollment)
+@receiver(pre_delete, sender=Enrollment)
+def remember_stored_batch(sender, instance, update_fields=None, **kwargs):
+    """
+    For instances whose counted state is unknown, note the batch the row is
+    stored under, so the recount after the write can be limited to it
+    """
+    if update_fields is not None and not {'status', 'batch', 'batch_id'} & set(update_fields):
+        return
+    if instance._counted_batch_id is _UNKNOWN and instance.pk is not None:
+        instance._stored_batch_id = Enrollment.objects.filter(pk=instance.pk).values_list('batch_id', flat=True).first()
+
+
+def _reconcile_batches(*batch_ids):
+    """Recount the given batches (and their courses), skipping missing ids"""
+    batch_ids = {batch_id for batch_id in batch_ids if batch_id}
+    if batch_ids:
+        reconcile_enrollment_counts(batch_ids)
 
 
 @receiver(post_save, sender=Enrollment)
-def update_counts_on_enrollment_save(sender, instance, created, **kwargs):
+def update_counts_on_enrollment_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Update batch and course enrollment counts when an enrollment is created or updated
+    
+    Applies +1/-1 deltas for creations and for status or batch changes
+    (e.g. active -> dropped, pending -> active, active -> completed).
     """
-    if created:
-        # Increment counts when new enrollment is created
-        batch = instance.batch
-        if batch:
-            # Update batch enrolled count
-            batch.enrolled_count = batch.enrollments.filter(status__in=['active', 'pending']).count()
-            batch.save(update_fields=['enrolled_count'])
-            
-            # Update course enrolled count
-            course = batch.course
-            if course:
-                course.enrolled_count = Enrollment.objects.filter(
-                    batch__course=course,
-                    status__in=['active', 'pending']
-                ).count()
-                course.save(update_fields=['enrolled_count'])
+    if update_fields is not None and not {'status', 'batch', 'batch_id'} & set(update_fields):
+        return
+    
+    old_batch_id = None if created else instance._counted_batch_id
+    new_batch_id = _counted_batch_id(instance)
+    
+    if old_batch_id is _UNKNOWN or new_batch_id is _UNKNOWN:
+        # Can't tell what changed - recount the batches it was and is in
+        _reconcile_batches(
+            getattr(instance, '_stored_batch_id', None),
+            instance.__dict__.get('batch_id')
+        )
+    elif old_batch_id != new_batch_id:
+        if old_batch_id:
+            shift_enrollment_counts(old_batch_id, -1)
+            # The seat it gave up may go to the waitlist
+            schedule_promotion(old_batch_id)
+        if new_batch_id:
+            shift_enrollment_counts(new_batch_id, 1)
+            _sync_cached_batch(instance, 1)
+    
+    instance._counted_batch_id = new_batch_id
 
 
 @receiver(post_delete, sender=Enrollment)
 def update_counts_on_enrollment_delete(sender, instance, **kwargs):
     """
     Update batch and course enrollment counts when an enrollment is deleted
-    Also process waitlist for auto-enrollment
+    Also hand the freed seat to the waitlist (see waitlist.py)
+    """
+    counted_batch_id = instance._counted_batch_id
+    if counted_batch_id is _UNKNOWN:
+        stored_batch_id = getattr(instance, '_stored_batch_id', None)
+        _reconcile_batches(stored_batch_id)
+        schedule_promotion(stored_batch_id)
+    elif counted_batch_id:
+        shift_enrollment_counts(counted_batch_id, -1)
+        schedule_promotion(counted_batch_id)
+
+
+@receiver(post_init, sender=Batch)
+def remember_batch_seats(sender, instance, **kwargs):
+    """Snapshot capacity and is_active so saves that free seats can be spotted"""
+    instance._seat_state = (instance.__dict__.get('capacity'), instance.__dict__.get('is_active'))
+
+
+@receiver(post_save, sender=Batch)
+def promote_waitlist_on_batch_change(sender, instance, created, **kwargs):
+    """A batch that grew or reopened may have seats for its waitlist"""
+    old_capacity, was_active = instance._seat_state
+    instance._seat_state = (instance.__dict__.get('capacity'), instance.__dict__.get('is_active'))
+    if created or not instance.is_active:
+        return
+    if was_active is False or (old_capacity is not None and instance.capacity > old_capacity):
+        schedule_promotion(instance.pk)
+
+
+@receiver(m2m_changed, sender=Course.prerequisites.through)
+def guard_prerequisite_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Reject prerequisite links that would create a cycle, and drop the cached
+    prerequisite graph once links have changed
     """
-    from .models import Waitlist, Notification
-    from django.utils import timezone
+    from .prerequisites import check_prerequisite_cycle, invalidate_prerequisite_graph
+    
+    if action == 'pre_add' and pk_set:
+        if reverse:
+            # instance.required_for.add(...): instance becomes a prerequisite
+            check_prerequisite_cycle([(course_id, instance.pk) for course_id in pk_set])
+        else:
+            check_prerequisite_cycle([(instance.pk, prereq_id) for prereq_id in pk_set])
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_prerequisite_graph()
+
+
+@receiver(post_delete, sender=Course)
+def invalidate_prerequisites_on_course_delete(sender, instance, **kwargs):
+    """Deleting a course removes its prerequisite links without an m2m_changed signal"""
+    from .prerequisites import invalidate_prerequisite_graph
+    
+    invalidate_prerequisite_graph()
+
+
+def _attendance_mark(instance):
+    """(enrollment_id, status) this record counts towards"""
+    if 'status' not in instance.__dict__ or 'enrollment_id' not in instance.__dict__:
+        return _UNKNOWN
+    return instance.enrollment_id, instance.status
+
+
+@receiver(post_init, sender=Attendance)
+def remember_attendance_mark(sender, instance, **kwargs):
+    """Snapshot the counted mark so saves can apply a delta"""
+    instance._counted_mark = _attendance_mark(instance)
+
+
+@receiver(post_save, sender=Attendance)
+def update_attendance_counts_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Move the mark between Enrollment attendance counters when it is created or changed"""
+    if update_fields is not None and not {'status', 'enrollment', 'enrollment_id'} & set(update_fields):
+        return
+    
+    old_mark = None if created else instance._counted_mark
+    new_mark = _attendance_mark(instance)
     
-    batch = instance.batch
-    if batch:
-        # Update batch enrolled count
-        batch.enrolled_count = batch.enrollments.filter(status__in=['active', 'pending']).count()
-        batch.save(update_fields=['enrolled_count'])
-        
-        # Update course enrolled count
-        course = batch.course
-        if course:
-            course.enrolled_count = Enrollment.objects.filter(
-                batch__course=course,
-                status__in=['active', 'pending']
-            ).count()
-            course.save(update_fields=['enrolled_count'])
-        
-        # Process waitlist - auto-enroll next student if seat available
-        if batch.enrolled_count < batch.capacity:
-            # Get the next waiting student (FCFS - lowest position)
-            next_waitlist = Waitlist.objects.filter(
-                batch=batch,
-                status='waiting'
-            ).order_by('position', 'joined_date').first()
-            
-            if next_waitlist:
-                # Create enrollment for the waitlisted student
-                new_enrollment = Enrollment.objects.create(
-                    student=next_waitlist.student,
-                    batch=batch,
-                    course=batch.course,
-                    status='active'
-                )
-                
-                # Update waitlist status
-                next_waitlist.status = 'enrolled'
-                next_waitlist.notified = True
-                next_waitlist.save()
-                
-                # Send notification to student
-                Notification.objects.create(
-                    user=next_waitlist.student,
-                    notification_type='enrollment',
-                    channel='in_app',
-                    title='Enrolled from Waitlist!',
-                    message=f'Great news! A seat opened up and you have been automatically enrolled in {batch.course.name} - Batch {batch.batch_number}.',
-                    related_enrollment=new_enrollment
-                )
-                
-                # Reorder remaining waitlist positions
-                remaining_waitlist = Waitlist.objects.filter(
-                    batch=batch,
-                    status='waiting'
-                ).order_by('position', 'joined_date')
-                
-                for index, waitlist_entry in enumerate(remaining_waitlist, start=1):
-                    if waitlist_entry.position != index:
-                        waitlist_entry.position = index
-                        waitlist_entry.save(update_fields=['position'])
+    if old_mark is _UNKNOWN or new_mark is _UNKNOWN:
+        # Can't tell what changed - recount this enrollment
+        reconcile_attendance_counts([instance.enrollment_id])
+    elif old_mark != new_mark:
+        if old_mark:
+            shift_attendance_counts(*old_mark, -1)
+        shift_attendance_counts(*new_mark, 1)
+    
+    instance._counted_mark = new_mark
+
+
+@receiver(post_delete, sender=Attendance)
+def update_attendance_counts_on_delete(sender, instance, **kwargs):
+    if instance._counted_mark is _UNKNOWN:
+        reconcile_attendance_counts([instance.enrollment_id])
+    else:
+        shift_attendance_counts(*instance._counted_mark, -1)
 
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+def invalidate_analytics_on_progress_change(sender, instance, **kwargs):
+    """Single-row progress writes (bulk recomputes invalidate for themselves)"""
+    from .analytics import invalidate_batch_analytics
+    
+    invalidate_batch_analytics(
+        Enrollment.objects.filter(pk=instance.enrollment_id).values_list('batch_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=GradingScale)
+@receiver(post_delete, sender=GradingScale)
+@receiver(post_save, sender=GradeBand)
+@receiver(post_delete, sender=GradeBand)
+def invalidate_grading_scales_on_change(sender, instance, **kwargs):
+    from .grading import invalidate_grading_scales
+    
+    invalidate_grading_scales()
@@ -1,3 +1,1779 @@
-from django.test import TestCase
+import json
+import queue
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.forms.models import model_to_dict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .activity_archive import _append, archive_activity_logs, day_start, stream_activity_logs
+from .admin import CourseAdminForm
+from .audit import flush_activity_log, record_activity, writer
+from .bulk_operations import BulkEnrollmentProcessor, BulkGradingProcessor
+from .counters import reconcile_attendance_counts, reconcile_enrollment_counts
+from .management.benchmark import add_schedule, make_batch, make_students
+from .management.commands.bench_schedule_conflicts import legacy_check_schedule_conflicts
+from .models import (
+    ActivityLog, ActivityLogArchive, ActivityLogSummary, Assignment, AssignmentSubmission, Attendance, Batch, Enrollment, Exam, ExamResult, Installment,
+    GradingScale, Notification, Payment, PaymentPlan, RecalculationJob, SeatHold, StudentProgress, User, Waitlist
+)
+from .grading import get_scale, grade_percentages, invalidate_grading_scales
+from .prerequisites import (
+    PREREQUISITE_GRAPH_VERSION_KEY, PrerequisiteCycle, PrerequisiteGraph, check_prerequisite_cycle,
+    direct_prerequisite_ids, missing_prerequisites
+)
+from .progress import recompute_for_batch, refresh_stale_progress
+from .recalculation import claim_job, create_job, run_job
+from .schedule_conflicts import (
+    bucket_by_day, check_schedule_conflicts, find_overlaps, load_slots_by_student, load_student_slots
+)
+from .pagination import KeysetPagination
+from .seat_reservation import (
+    HoldExpired, SeatUnavailable, confirm_hold, enroll_with_seat, expire_stale_holds, hold_seats
+)
+from . import waitlist
+from .waitlist import promote_all, promote_waitlist, schedule_promotion
+
+
+class ListQueryBudgetTests(TestCase):
+    """
+    List endpoints must not issue per-row queries: the query count for a page
+    of 500 rows has to match the count for a single row and stay in budget
+    """
+    SMALL = 1
+    LARGE = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='budget_admin', role='admin', password='!')
+        cls.instructor = User.objects.create(
+            username='budget_instructor', role='instructor', first_name='Ada', last_name='Lovelace', password='!'
+        )
+        cls.batch = make_batch('QB', capacity=cls.LARGE, instructor=cls.instructor)
+        cls.schedule = add_schedule(cls.batch, 'MON', 9)
+        cls.students = make_students(cls.LARGE, prefix='budget')
+
+    def count_queries(self, url, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(ctx.captured_queries), response.json()
+
+    def assertQueryBudget(self, url, seed, budget, user=None):
+        """Seed 1 row, count, seed up to 500 rows, count again"""
+        user = user or self.admin
+        seed(self.students[:self.SMALL])
+        small, small_data = self.count_queries(url, user)
+        seed(self.students[self.SMALL:self.LARGE])
+        large, large_data = self.count_queries(url, user)
+
+        self.assertEqual(len(small_data), self.SMALL)
+        self.assertEqual(len(large_data), self.LARGE)
+        self.assertEqual(small, large, f'{url}: {small} queries for 1 row, {large} for {self.LARGE}')
+        self.assertLessEqual(large, budget, f'{url}: {large} queries, budget is {budget}')
+
+    def enroll(self, students):
+        return Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=self.batch, course=self.batch.course, status='active')
+            for student in students
+        ])
+
+    def test_enrollment_list(self):
+        self.assertQueryBudget('/api/enrollments/', self.enroll, budget=1)
+
+    def test_enrollment_list_for_instructor(self):
+        self.assertQueryBudget('/api/enrollments/', self.enroll, budget=1, user=self.instructor)
+
+    def test_payment_list(self):
+        def seed(students):
+            Payment.objects.bulk_create([
+                Payment(enrollment=enrollment, amount=100, payment_method='cash', verified_by=self.admin)
+                for enrollment in self.enroll(students)
+            ])
+        self.assertQueryBudget('/api/payments/', seed, budget=1)
+
+    def test_attendance_list(self):
+        def seed(students):
+            Attendance.objects.bulk_create([
+                Attendance(enrollment=enrollment, schedule=self.schedule, status='present', marked_by=self.instructor)
+                for enrollment in self.enroll(students)
+            ])
+        self.assertQueryBudget('/api/attendance/', seed, budget=1)
+
+    def test_activity_log_list(self):
+        def seed(students):
+            ActivityLog.objects.bulk_create([
+                ActivityLog(user=self.admin, target_user=student, action='user_update', description='-')
+                for student in students
+            ])
+        self.assertQueryBudget('/api/activity-logs/', seed, budget=1)
+
+    def test_notification_list(self):
+        def seed(students):
+            Notification.objects.bulk_create([
+                Notification(user=self.admin, notification_type='announcement', title=student.username, message='-')
+                for student in students
+            ])
+        self.assertQueryBudget('/api/notifications/', seed, budget=1)
+
+    def test_waitlist_list(self):
+        def seed(students):
+            Waitlist.objects.bulk_create([
+                Waitlist(student=student, batch=self.batch, sequence=index)
+                for index, student in enumerate(students, start=Waitlist.objects.count() + 1)
+            ])
+        self.assertQueryBudget('/api/waitlists/', seed, budget=1)
+
+
+class EnrollmentDetailQueryTests(TestCase):
+    """Enrollment detail reads payment and attendance summaries from annotations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='detail_admin', role='admin', password='!')
+        cls.batch = make_batch('ED', capacity=5)
+        cls.schedules = [add_schedule(cls.batch, day, 9) for day in ('MON', 'TUE', 'WED')]
+        cls.enrollment = Enrollment.objects.create(
+            student=make_students(1, prefix='detail')[0], batch=cls.batch, course=cls.batch.course
+        )
+
+    def get_detail(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(f'/api/enrollments/{self.enrollment.id}/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_summaries_without_per_object_queries(self):
+        empty_queries, data = self.get_detail()
+        self.assertIsNone(data['payment_status'])
+        self.assertEqual(data['attendance_count'], {'total': 0, 'present': 0})
+
+        Payment.objects.bulk_create([
+            Payment(enrollment=self.enrollment, amount=amount, payment_method='cash', status='pending')
+            for amount in (100, 200, 300)
+        ])
+        latest = Payment.objects.create(enrollment=self.enrollment, amount=450, payment_method='cash', status='completed')
+        Attendance.objects.bulk_create([
+            Attendance(enrollment=self.enrollment, schedule=schedule, status=status)
+            for schedule, status in zip(self.schedules, ('present', 'absent', 'present'))
+        ])
+
+        queries, data = self.get_detail()
+        self.assertEqual(queries, empty_queries)
+        # Row + prefetched schedules
+        self.assertLessEqual(queries, 2)
+        self.assertEqual(data['payment_status']['status'], 'completed')
+        self.assertEqual(data['payment_status']['amount'], str(latest.amount))
+        self.assertEqual(data['attendance_count'], {'total': 3, 'present': 2})
+        self.assertEqual(len(data['batch_details']['schedules']), 3)
+
+
+class ProgressRecomputeTests(TestCase):
+    """Batch progress recomputation is set-based and matches the per-student rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('PR', capacity=50)
+        cls.schedules = [add_schedule(cls.batch, day, 9) for day in ('MON', 'TUE', 'WED', 'THU')]
+        due = timezone.now() + timedelta(days=7)
+        cls.assignments = [
+            Assignment.objects.create(
+                batch=cls.batch, title=f'A{i}', description='-', assignment_type='homework',
+                max_marks=50, weightage=10, due_date=due
+            )
+            for i in range(2)
+        ]
+        cls.exam = Exam.objects.create(
+            batch=cls.batch, title='Midterm', description='-', exam_type='midterm',
+            max_marks=100, weightage=50, passing_marks=40, exam_date=due, duration_minutes=60
+        )
+
+    def enroll(self, students):
+        enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=self.batch, course=self.batch.course, status='active')
+            for student in students
+        ])
+        for enrollment in enrollments:
+            AssignmentSubmission.objects.create(
+                assignment=self.assignments[0], student=enrollment.student,
+                marks_obtained=40, status='graded'
+            )
+            ExamResult.objects.create(
+                exam=self.exam, student=enrollment.student, marks_obtained=70,
+                percentage=70, grade='C+', status='pass'
+            )
+            Attendance.objects.bulk_create([
+                Attendance(enrollment=enrollment, schedule=schedule, status=status)
+                for schedule, status in zip(self.schedules, ('present', 'late', 'present', 'absent'))
+            ])
+        # bulk_create skips the counter signals: roll the marks up explicitly
+        reconcile_attendance_counts([enrollment.id for enrollment in enrollments])
+        return enrollments
+
+    def recompute(self):
+        get_scale()  # Grading scales load once per process, not per recompute
+        with CaptureQueriesContext(connection) as ctx:
+            updated = recompute_for_batch(self.batch)
+        return updated, len(ctx.captured_queries)
+
+    def test_constant_queries_and_values(self):
+        students = make_students(40, prefix='progress')
+        # Both measured runs update existing rows and create new ones
+        self.enroll(students[:1])
+        self.recompute()
+        self.enroll(students[1:2])
+        updated, small = self.recompute()
+        self.assertEqual(updated, 2)
+
+        self.enroll(students[2:])
+        updated, large = self.recompute()
+        self.assertEqual(updated, 40)
+        self.assertEqual(small, large)
+
+        progress = StudentProgress.objects.get(enrollment__student=students[-1])
+        self.assertEqual(progress.assignment_average, Decimal('80.00'))
+        self.assertEqual(progress.exam_average, Decimal('70.00'))
+        self.assertEqual(progress.attendance_percentage, Decimal('75.00'))
+        # 80 * 0.3 + 70 * 0.5 + 75 * 0.2
+        self.assertEqual(progress.overall_percentage, Decimal('74.00'))
+        self.assertEqual(progress.current_grade, 'C+')
+        self.assertEqual(progress.gpa, Decimal('2.70'))
+        self.assertEqual((progress.assignments_submitted, progress.assignments_total), (1, 2))
+        self.assertEqual((progress.exams_completed, progress.exams_total), (1, 1))
+        self.assertEqual(progress.risk_factors, ['Missing recent assignments'])
+        self.assertTrue(progress.is_at_risk)
+
+
+class ExamResultEntryTests(TestCase):
+    """Exam results for a whole class are entered in a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create(username='results_instructor', role='instructor', password='!')
+        cls.batch = make_batch('ER', capacity=100)
+        cls.students = make_students(60, prefix='results')
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=cls.batch, course=cls.batch.course, status='active')
+            for student in cls.students
+        ])
+        cls.exam = Exam.objects.create(
+            batch=cls.batch, title='Final', description='-', exam_type='final', max_marks=80,
+            weightage=50, passing_marks=32, exam_date=timezone.now(), duration_minutes=90
+        )
+
+    def setUp(self):
+        get_scale()  # Grading scales load once per process, not per entry
+
+    def enter(self, payload, **kwargs):
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(f'/api/exams/{self.exam.id}/enter_results/', payload, **kwargs)
+        return response, len(ctx.captured_queries)
+
+    def test_constant_queries(self):
+        # Both measured entries update existing progress rows and create new ones
+        self.enter({'results': [{'student_id': self.students[0].id, 'marks': 60}]}, format='json')
+        response, small = self.enter({'results': [
+            {'student_id': student.id, 'marks': 60} for student in self.students[:2]
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response, large = self.enter({'results': [
+            {'student_id': student.id, 'marks': 20 + index} for index, student in enumerate(self.students)
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['results']), 60)
+        self.assertEqual(small, large)
+
+        result = ExamResult.objects.get(exam=self.exam, student=self.students[0])
+        self.assertEqual((result.marks_obtained, result.percentage, result.status), (Decimal('20'), Decimal('25'), 'fail'))
+        self.assertEqual(StudentProgress.objects.get(enrollment__student=self.students[0]).exam_average, Decimal('25'))
+
+    def test_invalid_rows_save_nothing(self):
+        outsider = make_students(1, prefix='outsider')[0]
+        response, _ = self.enter({'results': [
+            {'student_id': self.students[0].id, 'marks': 50},
+            {'student_id': outsider.id, 'marks': 50},
+            {'student_id': self.students[1].id, 'marks': 81},
+            {'student_id': self.students[0].id, 'marks': 40},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [2, 3, 4])
+        self.assertFalse(ExamResult.objects.filter(exam=self.exam).exists())
+
+    def test_malformed_rows_are_reported(self):
+        response, _ = self.enter({'results': [1, 2]}, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(
+            [(error['row'], error['errors']) for error in response.json()['errors']],
+            [(1, ['Row must be an object']), (2, ['Row must be an object'])]
+        )
+        self.assertFalse(ExamResult.objects.filter(exam=self.exam).exists())
+
+    def test_csv_upload(self):
+        content = 'username,marks,remarks\n' + ''.join(
+            f'{student.username},{60},ok\n' for student in self.students[:3]
+        )
+        upload = SimpleUploadedFile('marks.csv', content.encode(), content_type='text/csv')
+        response, _ = self.enter({'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(ExamResult.objects.filter(exam=self.exam, status='pass', remarks='ok').count(), 3)
+
+
+class BulkGradingTests(TestCase):
+    """bulk_grade applies late penalties per row and saves all rows or none"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create(username='grading_instructor', role='instructor', password='!')
+        cls.batch = make_batch('BG', capacity=10)
+        cls.students = make_students(3, prefix='grading')
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=cls.batch, course=cls.batch.course, status='active')
+            for student in cls.students
+        ])
+        cls.assignment = Assignment.objects.create(
+            batch=cls.batch, title='Essay', description='-', assignment_type='homework', max_marks=50,
+            weightage=10, due_date=timezone.now(), late_penalty_percent=10
+        )
+        cls.submissions = AssignmentSubmission.objects.bulk_create([
+            AssignmentSubmission(assignment=cls.assignment, student=student, is_late=index == 0)
+            for index, student in enumerate(cls.students)
+        ])
+
+    def grade(self, grades):
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+        return client.post(f'/api/assignments/{self.assignment.id}/bulk_grade/', {'grades': grades}, format='json')
+
+    def test_late_penalty_and_progress(self):
+        late, on_time, by_username = self.submissions
+        response = self.grade([
+            {'submission_id': late.id, 'marks': 40, 'feedback': 'late'},
+            {'submission_id': on_time.id, 'marks': 40},
+            {'username': self.students[2].username, 'marks': 25},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+
+        late.refresh_from_db()
+        self.assertEqual((late.marks_obtained, late.late_penalty_applied), (Decimal('36'), Decimal('4')))
+        self.assertEqual((late.status, late.feedback, late.graded_by), ('graded', 'late', self.instructor))
+        on_time.refresh_from_db()
+        self.assertEqual((on_time.marks_obtained, on_time.late_penalty_applied), (Decimal('40'), Decimal('0')))
+        progress = StudentProgress.objects.get(enrollment__student=self.students[2])
+        self.assertEqual(progress.assignment_average, Decimal('50'))
+
+    def test_invalid_rows_save_nothing(self):
+        response = self.grade([
+            {'submission_id': self.submissions[0].id, 'marks': 40},
+            {'submission_id': self.submissions[1].id, 'marks': 51},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['row'], 2)
+        self.assertFalse(AssignmentSubmission.objects.filter(status='graded').exists())
+
+    def test_updates_rows_in_place(self):
+        withdrawn = self.submissions[1]
+
+        class RacingProcessor(BulkGradingProcessor):
+            def load_submissions(self):
+                # The student withdraws the submission after grading has loaded it
+                loaded = super().load_submissions()
+                AssignmentSubmission.objects.filter(pk=withdrawn.pk).delete()
+                return loaded
+
+        submitted_at = AssignmentSubmission.objects.get(pk=self.submissions[0].pk).submitted_at
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        graded = RacingProcessor(assignment, [
+            {'submission_id': submission.id, 'marks': 30} for submission in self.submissions[:2]
+        ], self.instructor).process()
+        self.assertEqual(len(graded), 2)
+        self.assertFalse(AssignmentSubmission.objects.filter(pk=withdrawn.pk).exists())
+        self.assertEqual(AssignmentSubmission.objects.get(pk=self.submissions[0].pk).submitted_at, submitted_at)
+
+
+class EnrollmentCounterTests(TestCase):
+    """Batch and course enrolled_count follow enrollment writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('EC', capacity=5)
+        cls.other = make_batch('EC2', capacity=5)
+        cls.students = make_students(3, prefix='enrolcount')
+
+    def counts(self, batch):
+        batch.refresh_from_db()
+        batch.course.refresh_from_db()
+        return batch.enrolled_count, batch.course.enrolled_count
+
+    def enroll(self, student, status='active'):
+        return Enrollment.objects.create(student=student, batch=self.batch, course=self.batch.course, status=status)
+
+    def test_status_transitions(self):
+        enrollment = self.enroll(self.students[0], status='pending')
+        self.enroll(self.students[1])
+        self.assertEqual(self.counts(self.batch), (2, 2))
+
+        for status, expected in (('active', 2), ('dropped', 1), ('completed', 1), ('pending', 2)):
+            enrollment.status = status
+            enrollment.save()
+            self.assertEqual(self.counts(self.batch), (expected, expected), status)
+
+    def test_delete(self):
+        seated = self.enroll(self.students[0])
+        dropped = self.enroll(self.students[1], status='dropped')
+        dropped.delete()
+        self.assertEqual(self.counts(self.batch), (1, 1))
+        seated.delete()
+        self.assertEqual(self.counts(self.batch), (0, 0))
+
+    def test_batch_move(self):
+        enrollment = self.enroll(self.students[0])
+        enrollment.batch = self.other
+        enrollment.save()
+        self.assertEqual(self.counts(self.batch), (0, 0))
+        self.assertEqual(self.counts(self.other), (1, 1))
+
+    def test_partially_loaded_instances_recount_their_batches(self):
+        enrollment = self.enroll(self.students[0])
+        self.enroll(self.students[1])
+        Batch.objects.filter(pk=self.other.pk).update(enrolled_count=7)
+
+        partial = Enrollment.objects.only('id').get(pk=enrollment.pk)
+        partial.status = 'dropped'
+        partial.save()
+        self.assertEqual(self.counts(self.batch), (1, 1))
+        # Batches the enrollment never touched are left alone
+        self.assertEqual(self.counts(self.other)[0], 7)
+
+        Enrollment.objects.only('id').get(pk=enrollment.pk).delete()
+        self.assertEqual(self.counts(self.batch), (1, 1))
+
+    def test_reconcile_repairs_drift(self):
+        self.enroll(self.students[0])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=self.batch, course=self.batch.course, status='active')
+            for student in self.students[1:]
+        ])
+        Batch.objects.filter(pk=self.other.pk).update(enrolled_count=4)
+        self.assertEqual(self.counts(self.batch), (1, 1))
+
+        drift = reconcile_enrollment_counts(batch_ids=[self.batch.id])
+        self.assertEqual(drift['batches'], {self.batch.id: (1, 3)})
+        self.assertEqual(drift['courses'], {self.batch.course_id: (1, 3)})
+        self.assertEqual(self.counts(self.batch), (3, 3))
+        self.assertEqual(self.counts(self.other)[0], 4)
+
+        self.assertEqual(reconcile_enrollment_counts()['batches'], {self.other.id: (4, 0)})
+        self.assertEqual(reconcile_enrollment_counts(), {'batches': {}, 'held': {}, 'courses': {}})
+
+
+class AttendanceCounterTests(TestCase):
+    """Enrollment attendance counters follow attendance writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('AC', capacity=5)
+        cls.schedules = [add_schedule(cls.batch, day, 9) for day in ('MON', 'TUE', 'WED')]
+        cls.enrollment = Enrollment.objects.create(
+            student=make_students(1, prefix='counter')[0], batch=cls.batch, course=cls.batch.course
+        )
+
+    def counts(self):
+        self.enrollment.refresh_from_db()
+        return (
+            self.enrollment.present_count, self.enrollment.late_count,
+            self.enrollment.absent_count, self.enrollment.excused_count
+        )
+
+    def test_signals_and_reconcile(self):
+        marks = [
+            Attendance.objects.create(enrollment=self.enrollment, schedule=schedule, status=status)
+            for schedule, status in zip(self.schedules, ('present', 'absent', 'present'))
+        ]
+        self.assertEqual(self.counts(), (2, 0, 1, 0))
+
+        marks[1].status = 'excused'
+        marks[1].save()
+        marks[0].status = 'late'
+        marks[0].save(update_fields=['status'])
+        marks[2].delete()
+        self.assertEqual(self.counts(), (0, 1, 0, 1))
+
+        # Writes that bypass signals drift until the rollup runs
+        Attendance.objects.filter(pk=marks[0].pk).update(status='present')
+        self.assertEqual(reconcile_attendance_counts(), {self.enrollment.id: ((0, 1, 0, 1), (1, 0, 0, 1))})
+        self.assertEqual(self.counts(), (1, 0, 0, 1))
+        self.assertEqual(reconcile_attendance_counts(), {})
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class RollCallTests(TestCase):
+    """Roll call marks a whole session within a fixed query budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create(username='roll_instructor', role='instructor', password='!')
+        cls.batch = make_batch('RC', capacity=60, instructor=cls.instructor)
+        cls.schedule = add_schedule(cls.batch, 'MON', 9)
+        cls.enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=cls.batch, course=cls.batch.course, status='active')
+            for student in make_students(60, prefix='roll')
+        ])
+
+    def roll_call(self, marks, user=None):
+        client = APIClient()
+        client.force_authenticate(user or self.instructor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                '/api/attendance/roll_call/', {'schedule': self.schedule.id, 'marks': marks}, format='json'
+            )
+        return response, len(ctx.captured_queries)
+
+    def test_fixed_query_budget(self):
+        first = self.enrollments[0]
+        response, small = self.roll_call({first.id: 'present'})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        statuses = ('present', 'absent', 'late')
+        response, large = self.roll_call({
+            enrollment.id: statuses[index % 3] for index, enrollment in enumerate(self.enrollments)
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['summary'], {'present': 20, 'absent': 20, 'late': 20})
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 12)
+
+        self.assertEqual(Attendance.objects.filter(schedule=self.schedule).count(), 60)
+        self.assertEqual(ActivityLog.objects.filter(action='attendance_mark').count(), 2)
+        first.refresh_from_db()
+        self.assertEqual((first.present_count, first.absent_count), (1, 0))
+        self.assertEqual(reconcile_attendance_counts(), {})
+
+    def test_rejects_foreign_enrollments_and_other_instructors(self):
+        other = Enrollment.objects.create(student=make_students(1, prefix='roll_other')[0])
+        response, _ = self.roll_call({self.enrollments[0].id: 'present', other.id: 'present'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'enrollment_id': other.id, 'errors': ['Enrollment not in this batch']}])
+        self.assertFalse(Attendance.objects.exists())
+
+        stranger = User.objects.create(username='roll_stranger', role='instructor', password='!')
+        response, _ = self.roll_call({self.enrollments[0].id: 'present'}, user=stranger)
+        self.assertEqual(response.status_code, 403)
+
+    def test_course_instructor_and_admin_can_take_roll_call(self):
+        course_instructor = User.objects.create(username='roll_course_instructor', role='instructor', password='!')
+        batch = make_batch('RC2', capacity=5, instructor=None)
+        batch.course.instructor = course_instructor
+        batch.course.save()
+        schedule = add_schedule(batch, 'TUE', 9)
+        enrollment = Enrollment.objects.create(student=make_students(1, prefix='roll_course')[0], batch=batch)
+
+        admin = User.objects.create(username='roll_admin', role='admin', password='!')
+        for user, expected in ((course_instructor, 200), (admin, 200), (self.instructor, 403)):
+            client = APIClient()
+            client.force_authenticate(user)
+            response = client.post(
+                '/api/attendance/roll_call/', {'schedule': schedule.id, 'marks': {enrollment.id: 'present'}},
+                format='json'
+            )
+            self.assertEqual(response.status_code, expected, (user.username, response.content))
+
+    def test_corrections_record_who_and_when(self):
+        first = self.enrollments[0]
+        self.roll_call({first.id: 'absent'})
+        mark = Attendance.objects.get(enrollment=first, schedule=self.schedule)
+        Attendance.objects.filter(pk=mark.pk).update(marked_date=mark.marked_date - timedelta(hours=1))
+
+        admin = User.objects.create(username='roll_corrector', role='admin', password='!')
+        response, _ = self.roll_call({first.id: 'present'}, user=admin)
+        self.assertEqual(response.status_code, 200, response.content)
+        corrected = Attendance.objects.get(pk=mark.pk)
+        self.assertEqual((corrected.status, corrected.marked_by), ('present', admin))
+        self.assertGreater(corrected.marked_date, mark.marked_date - timedelta(minutes=1))
+
+    def test_non_string_status_is_a_row_error(self):
+        first, second = self.enrollments[:2]
+        response, _ = self.roll_call({first.id: ['present'], second.id: {'status': 'late'}})
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual([error['enrollment_id'] for error in response.json()['errors']], [first.id, second.id])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class BatchAnalyticsTests(TestCase):
+    """batch_analytics aggregates in a fixed number of queries and is cached per batch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='analytics_admin', role='admin', password='!')
+        cls.batches = [make_batch(f'AN{i}', capacity=20) for i in range(3)]
+        for batch in cls.batches:
+            enrollments = Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status='active')
+                for student in make_students(12, prefix=f'analytics{batch.id}')
+            ])
+            StudentProgress.objects.bulk_create([
+                StudentProgress(
+                    enrollment=enrollment, overall_percentage=40 + index * 5,
+                    current_grade=StudentProgress.get_letter_grade(40 + index * 5), is_at_risk=index < 3
+                )
+                for index, enrollment in enumerate(enrollments)
+            ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/progress/batch_analytics/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_single_batch(self):
+        data, _ = self.get(f'batch_id={self.batches[0].id}')
+        self.assertEqual((data['total_students'], data['at_risk_count']), (12, 3))
+        self.assertEqual(Decimal(str(data['average_grade'])), Decimal('67.5'))
+        self.assertEqual(data['grade_distribution'], {
+            'A+': 2, 'A': 1, 'B+': 1, 'B': 1, 'C+': 1, 'C': 1, 'D': 1, 'F': 4
+        })
+        self.assertEqual(Decimal(data['percentiles']['p50']), Decimal('65'))
+        self.assertEqual([row['overall_percentage'] for row in data['top_performers']],
+                         ['95.00', '90.00', '85.00', '80.00', '75.00'])
+        self.assertEqual(len(data['struggling_students']), 4)
+
+    def test_many_batches_cached_and_invalidated(self):
+        _, one = self.get(f'batch_ids={self.batches[0].id}')
+        cache.clear()
+        data, many = self.get('batch_ids=' + ','.join(str(batch.id) for batch in self.batches))
+        self.assertEqual([entry['batch']['id'] for entry in data['batches']], [batch.id for batch in self.batches])
+        self.assertEqual(one, many)
+
+        _, cached = self.get('batch_ids=' + ','.join(str(batch.id) for batch in self.batches))
+        self.assertEqual(cached, 0)
+
+        recompute_for_batch(self.batches[1])
+        data, partial = self.get('batch_ids=' + ','.join(str(batch.id) for batch in self.batches))
+        self.assertEqual(partial, many)
+        # Recomputed from (empty) grades, attendance and exams: everyone is at risk
+        self.assertEqual(data['batches'][1]['at_risk_count'], 12)
+        self.assertEqual(data['batches'][0]['at_risk_count'], 3)
+
+
+class AnalyticsRollupTests(TestCase):
+    """The analytics cube matches the source tables and answers slices from the rollup table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='cube_admin', role='admin', password='!')
+        instructors = [
+            User.objects.create(username=f'cube_instructor{i}', role='instructor', password='!') for i in range(2)
+        ]
+        cls.batches = [make_batch(f'CU{i}', capacity=10, instructor=instructors[i]) for i in range(2)]
+        schedule = add_schedule(cls.batches[0], 'MON', 9)
+
+        statuses = ['active', 'active', 'completed', 'dropped']
+        for batch in cls.batches:
+            enrollments = Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status=statuses[index])
+                for index, student in enumerate(make_students(4, prefix=f'cube{batch.id}'))
+            ])
+            StudentProgress.objects.bulk_create([
+                StudentProgress(enrollment=enrollment, overall_percentage=60 + index * 10)
+                for index, enrollment in enumerate(enrollments[:2])
+            ])
+            Payment.objects.bulk_create([
+                Payment(enrollment=enrollment, amount=500, payment_method='cash', status=payment_status)
+                for enrollment, payment_status in zip(enrollments, ['completed', 'verified', 'pending', 'failed'])
+            ])
+        first = Enrollment.objects.filter(batch=cls.batches[0]).order_by('id')
+        Attendance.objects.bulk_create([
+            Attendance(enrollment=enrollment, schedule=schedule, status=mark)
+            for enrollment, mark in zip(first, ['present', 'late', 'absent', 'excused'])
+        ])
+        plan = PaymentPlan.objects.create(
+            enrollment=first[0], total_amount=900, down_payment=0, remaining_amount=900,
+            number_of_installments=3, installment_amount=300, start_date=timezone.now().date()
+        )
+        Installment.objects.bulk_create([
+            Installment(payment_plan=plan, installment_number=i + 1, amount=300, due_date=timezone.now().date(),
+                        status=installment_status, paid_amount=paid)
+            for i, (installment_status, paid) in enumerate([('pending', 100), ('paid', 300), ('overdue', 0)])
+        ])
+
+    def test_build_and_slice(self):
+        from .analytics import build_rollups
+        self.assertEqual(build_rollups('month'), 2)
+        self.assertEqual(build_rollups('week'), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/analytics/?period=month&group_by=instructor')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+        first, second = response.json()['results']
+        self.assertEqual(first['instructor'], self.batches[0].instructor_id)
+        self.assertEqual((first['enrollments'], first['completions'], first['drops']), (4, 1, 1))
+        self.assertEqual(first['drop_rate'], 25.0)
+        self.assertEqual(Decimal(first['revenue']), Decimal('1000'))
+        self.assertEqual(Decimal(first['outstanding_installments']), Decimal('500'))
+        self.assertEqual(first['average_grade'], 65.0)
+        self.assertEqual(first['attendance_rate'], 50.0)
+        self.assertIsNone(second['attendance_rate'])
+
+        response = client.get(f'/api/analytics/?period=week&course={self.batches[1].course_id}')
+        totals, = response.json()['results']
+        self.assertEqual((totals['enrollments'], Decimal(totals['revenue'])), (4, Decimal('1000')))
+
+    def test_rejects_students_and_bad_dimensions(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='cube_student', role='student', password='!'))
+        self.assertEqual(client.get('/api/analytics/').status_code, 403)
+
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.get('/api/analytics/?group_by=room').status_code, 400)
+
+
+@override_settings(PROGRESS_RECALC_BACKGROUND=False, PROGRESS_RECALC_CHUNK_SIZE=4)
+class RecalculationJobTests(TestCase):
+    """Recalculation runs as a chunked job and resumes from the chunks already done"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(username='recalc_staff', role='staff', password='!')
+        cls.batches = [make_batch(f'RJ{i}', capacity=10) for i in range(2)]
+        for batch in cls.batches:
+            Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status='active')
+                for student in make_students(5, prefix=f'recalc{batch.id}')
+            ])
+
+    def test_endpoint_returns_job(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.post('/api/progress/recalculate/', {'all': True}, format='json')
+        self.assertEqual(response.status_code, 202, response.content)
+        job = response.json()
+        self.assertEqual((job['status'], job['total_chunks'], job['processed_enrollments']), ('completed', 3, 10))
+        self.assertEqual(StudentProgress.objects.count(), 10)
+
+        response = client.get(f'/api/progress/recalculation-jobs/{job["id"]}/')
+        self.assertEqual(response.json()['progress_percent'], 100.0)
+
+        response = client.post('/api/progress/recalculate/', {'batch_ids': [self.batches[0].id, 0]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/progress/recalculate/', {'batch_id': self.batches[1].id}, format='json')
+        self.assertEqual(response.json()['total_enrollments'], 5)
+
+    def test_failed_job_resumes(self):
+        from . import recalculation
+
+        job = claim_job(create_job().pk)
+        real = recalculation.recompute_progress
+        calls = []
+
+        def flaky(enrollments):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('worker lost')
+            return real(enrollments)
+
+        with mock.patch.object(recalculation, 'recompute_progress', flaky), self.assertLogs('api.recalculation'):
+            job = run_job(job, workers=1)
+        self.assertEqual((job.status, job.completed_chunks, job.error), ('failed', [0], 'worker lost'))
+
+        with mock.patch.object(recalculation, 'recompute_progress', side_effect=real) as resumed:
+            job = run_job(claim_job(job.pk), workers=1)
+        self.assertEqual(resumed.call_count, 2)
+        self.assertEqual((job.status, sorted(job.completed_chunks)), ('completed', [0, 1, 2]))
+        self.assertEqual(job.processed_enrollments, 10)
+        self.assertIsNone(claim_job(job.pk))
+        self.assertEqual(RecalculationJob.objects.get(pk=job.pk).progress_percent, 100.0)
+
+
+class GradingScaleTests(TestCase):
+    """Grades come from the configured scales and follow edits immediately"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='scale_admin', role='admin', password='!')
+        cls.batch = make_batch('GS', capacity=5)
+
+    def setUp(self):
+        # Scales are cached per process; rolled-back test data sends no signals
+        invalidate_grading_scales()
+        self.addCleanup(invalidate_grading_scales)
+
+    def test_default_scale_matches_previous_ladder(self):
+        ladder = [(90, 'A+', '4.00'), (85, 'A', '3.70'), (80, 'B+', '3.30'), (75, 'B', '3.00'),
+                  (70, 'C+', '2.70'), (65, 'C', '2.30'), (60, 'D', '2.00'), (0, 'F', '0.00')]
+        percentages = [Decimal(step) / 4 for step in range(0, 401)] + [Decimal('89.99'), Decimal('-1')]
+        expected = [
+            next(((letter, Decimal(gpa)) for minimum, letter, gpa in ladder if percentage >= minimum), ('F', Decimal('0.00')))
+            for percentage in percentages
+        ]
+        self.assertEqual(grade_percentages(percentages), expected)
+        self.assertEqual(StudentProgress.get_letter_grade(Decimal('84.99')), 'B+')
+        self.assertEqual(StudentProgress.get_gpa(90.0), Decimal('4.00'))
+
+    def test_course_scale_applies_to_progress_and_grade_api(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/grading-scales/', {
+            'name': 'Pass/fail', 'course': self.batch.course_id,
+            'bands': [{'letter': 'P', 'min_percentage': '50', 'gpa': '4.00'},
+                      {'letter': 'NP', 'min_percentage': '0', 'gpa': '0.00'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(get_scale(self.batch.course_id).letters, ['NP', 'P'])
+
+        student, = make_students(1, prefix='scale')
+        Enrollment.objects.create(student=student, batch=self.batch, course=self.batch.course, status='active')
+        exam = Exam.objects.create(
+            batch=self.batch, title='Final', description='-', exam_type='final', max_marks=100,
+            weightage=50, passing_marks=40, exam_date=timezone.now(), duration_minutes=60
+        )
+        response = client.post(f'/api/exams/{exam.id}/enter_results/', {
+            'results': [{'student_id': student.id, 'marks': 70}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(ExamResult.objects.get(exam=exam).grade, 'P')
+        self.assertEqual(StudentProgress.objects.get(enrollment__student=student).current_grade, 'NP')
+
+        response = client.post('/api/grading-scales/grade/', {
+            'percentages': [49.5, 50], 'course': self.batch.course_id
+        }, format='json')
+        self.assertEqual([row['letter'] for row in response.json()['grades']], ['NP', 'P'])
+
+        # Editing the scale is visible on the next lookup
+        scale_id = GradingScale.objects.get(course=self.batch.course).id
+        response = client.patch(f'/api/grading-scales/{scale_id}/', {
+            'bands': [{'letter': 'S', 'min_percentage': '0', 'gpa': '1.00'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(grade_percentages([99], course_id=self.batch.course_id), [('S', Decimal('1.00'))])
+
+    def test_rejects_second_default_and_bad_bands(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        bands = [{'letter': 'A', 'min_percentage': '0', 'gpa': '4.00'}]
+        response = client.post('/api/grading-scales/', {'name': 'Again', 'bands': bands}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post('/api/grading-scales/', {
+            'name': 'Gap', 'course': self.batch.course_id,
+            'bands': [{'letter': 'A', 'min_percentage': '40', 'gpa': '4.00'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RiskScoringTests(TestCase):
+    """Risk is rescored only where inputs changed and listed by score per instructor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructors = [
+            User.objects.create(username=f'risk_instructor{i}', role='instructor', password='!') for i in range(2)
+        ]
+        cls.batches = [make_batch(f'RS{i}', capacity=10, instructor=cls.instructors[i]) for i in range(2)]
+        cls.schedule = add_schedule(cls.batches[0], 'MON', 9)
+        cls.enrollments = []
+        for batch in cls.batches:
+            cls.enrollments += Enrollment.objects.bulk_create([
+                Enrollment(student=student, batch=batch, course=batch.course, status='active')
+                for student in make_students(3, prefix=f'risk{batch.id}')
+            ])
+        for batch in cls.batches:
+            recompute_for_batch(batch)
+
+    def test_only_changed_inputs_are_rescored(self):
+        self.assertEqual(refresh_stale_progress(), 0)
+
+        first = self.enrollments[0]
+        before = StudentProgress.objects.get(enrollment=first).risk_score
+        Attendance.objects.create(enrollment=first, schedule=self.schedule, status='present')
+        self.assertTrue(StudentProgress.objects.get(enrollment=first).risk_stale)
+        self.assertEqual(refresh_stale_progress(), 1)
+        progress = StudentProgress.objects.get(enrollment=first)
+        self.assertFalse(progress.risk_stale)
+        self.assertLess(progress.risk_score, before)
+
+        # A due date passing since the last recompute flags the batch
+        StudentProgress.objects.update(last_updated=timezone.now() - timedelta(days=2))
+        Assignment.objects.create(
+            batch=self.batches[1], title='Essay', description='-', assignment_type='homework', max_marks=10,
+            weightage=10, due_date=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(refresh_stale_progress(), 3)
+        self.assertEqual(refresh_stale_progress(), 0)
+        missed = StudentProgress.objects.get(enrollment=self.enrollments[3])
+        self.assertGreater(missed.risk_score, StudentProgress.objects.get(enrollment=self.enrollments[1]).risk_score)
+
+    def test_at_risk_is_scoped_sorted_and_paginated(self):
+        StudentProgress.objects.filter(enrollment=self.enrollments[1]).update(risk_score=99)
+        client = APIClient()
+        client.force_authenticate(self.instructors[0])
+
+        response = client.get('/api/progress/at_risk/')
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = response.json()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['enrollment'], self.enrollments[1].id)
+        self.assertEqual([Decimal(row['risk_score']) for row in rows],
+                         sorted((Decimal(row['risk_score']) for row in rows), reverse=True))
+
+        seen = []
+        url = '/api/progress/at_risk/?page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                page = client.get(url).json()
+            self.assertLessEqual(len(ctx.captured_queries), 3)
+            seen += [row['enrollment'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [row['enrollment'] for row in rows])
+
+        response = client.get('/api/progress/at_risk/?ordering=student')
+        self.assertEqual(response.status_code, 400)
+
+
+class WaitlistQueueTests(TestCase):
+    """Leaving a waitlist writes one row; positions are ranked when read"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('WQ', capacity=1)
+        cls.students = make_students(300, prefix='queue')
+        cls.entries = [Waitlist.objects.create(student=student, batch=cls.batch) for student in cls.students]
+
+    def test_cancel_does_not_renumber_the_queue(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(f'/api/waitlists/{self.entries[0].id}/cancel/')
+        self.assertEqual(response.status_code, 200, response.content)
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(len(writes), 2)  # the entry and its notification
+
+        client.force_authenticate(self.students[-1])
+        response = client.get(f'/api/waitlists/my_position/?batch={self.batch.id}')
+        self.assertEqual(response.json()['position'], 299)
+        self.assertEqual(response.json()['total_waiting'], 299)
+
+    def test_positions_follow_join_order(self):
+        Waitlist.objects.filter(pk=self.entries[1].pk).update(status='enrolled')
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='queue_admin', role='admin', password='!'))
+        rows = client.get('/api/waitlists/').json()
+        self.assertEqual([row['id'] for row in rows], [entry.id for entry in self.entries])
+        self.assertEqual([row['position'] for row in rows[:4]], [1, None, 2, 3])
+        self.assertEqual(rows[-1]['position'], 299)
+        self.assertEqual(Waitlist.objects.get(pk=self.entries[2].pk).position, 2)
+
+    def test_bulk_created_entries_join_the_queue(self):
+        late = Waitlist.objects.bulk_create([
+            Waitlist(student=student, batch=self.batch) for student in make_students(2, prefix='queue_bulk')
+        ])
+        self.assertEqual([entry.sequence for entry in late], [entry.pk for entry in late])
+        self.assertFalse(Waitlist.objects.filter(sequence__isnull=True).exists())
+        self.assertEqual(Waitlist.with_positions(Waitlist.objects.filter(pk=late[1].pk)).get().queue_position, 302)
+
+    def test_admin_changelist_ranks_positions_in_one_query(self):
+        superuser = User.objects.create(username='queue_super', role='admin', is_staff=True, is_superuser=True)
+        client = APIClient()
+        client.force_login(superuser)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/admin/api/waitlist/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_str_runs_no_queries(self):
+        entry = Waitlist.objects.select_related('student', 'batch__course').get(pk=self.entries[5].pk)
+        with self.assertNumQueries(0):
+            self.assertIn(f'#{entry.sequence}', str(entry))
+
+
+@override_settings(WAITLIST_PROMOTION_BACKGROUND=False)
+class WaitlistPromotionTests(TestCase):
+    """Freed seats go to the front of the waitlist, in bulk, exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('WP', capacity=2)
+        cls.seated = Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=cls.batch, course=cls.batch.course, status='active')
+            for student in make_students(2, prefix='seated')
+        ])
+        reconcile_enrollment_counts()
+        cls.waiting = make_students(5, prefix='waiting')
+        cls.entries = [Waitlist.objects.create(student=student, batch=cls.batch) for student in cls.waiting]
+
+    def enrolled_students(self):
+        return set(Enrollment.objects.filter(batch=self.batch, status='active').values_list('student_id', flat=True))
+
+    def test_capacity_increase_fills_every_free_seat(self):
+        self.batch.refresh_from_db()
+        self.batch.capacity = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.save()
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.enrolled_count, self.batch.held_count), (5, 0))
+        self.assertTrue({student.id for student in self.waiting[:3]} <= self.enrolled_students())
+        self.assertEqual(Notification.objects.filter(title='Enrolled from Waitlist!').count(), 3)
+        self.assertEqual(Waitlist.objects.get(pk=self.entries[3].pk).position, 1)
+        self.assertEqual(promote_waitlist(self.batch.id), [])
+
+    def test_dropping_out_promotes_the_next_student(self):
+        # The head of the queue once dropped out of this batch: the old row comes back
+        Enrollment.objects.create(student=self.waiting[0], batch=self.batch, course=self.batch.course, status='dropped')
+        enrollment = Enrollment.objects.get(pk=self.seated[0].pk)
+        enrollment.status = 'dropped'
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.save()
+
+        self.assertIn(self.waiting[0].id, self.enrolled_students())
+        self.assertEqual(Enrollment.objects.filter(batch=self.batch, student=self.waiting[0]).count(), 1)
+        self.assertEqual(Waitlist.objects.get(pk=self.entries[0].pk).status, 'enrolled')
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.enrolled_count, 2)
+
+        # Deleting frees a seat as well
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.get(pk=self.seated[1].pk).delete()
+        self.assertIn(self.waiting[1].id, self.enrolled_students())
+
+    def test_concurrent_claim_rolls_back(self):
+        from .seat_reservation import hold_seats
+
+        def racing_hold(*args, **kwargs):
+            hold = hold_seats(*args, **kwargs)
+            Waitlist.objects.filter(pk=self.entries[0].pk).update(status='enrolled')
+            return hold
+
+        Batch.objects.filter(pk=self.batch.pk).update(capacity=4)
+        with mock.patch('api.waitlist.hold_seats', side_effect=racing_hold):
+            self.assertEqual(promote_waitlist(self.batch.id), [])
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.enrolled_count, self.batch.held_count), (2, 0))
+        self.assertEqual(Waitlist.objects.filter(status='waiting').count(), 5)
+
+        # The sweeper picks the batch up and fills it
+        self.assertEqual(promote_all(), 2)
+        self.assertEqual(promote_all(), 0)
+
+    def test_settled_students_leave_the_queue_without_a_seat(self):
+        finished, seated = self.waiting[:2]
+        Enrollment.objects.create(student=finished, batch=self.batch, course=self.batch.course, status='completed')
+        Enrollment.objects.create(student=seated, batch=self.batch, course=self.batch.course, status='pending')
+        Batch.objects.filter(pk=self.batch.pk).update(capacity=5)
+
+        promoted = promote_waitlist(self.batch.id)
+        self.assertEqual([entry.student_id for entry in promoted], [s.id for s in self.waiting[2:4]])
+        self.assertEqual(Enrollment.objects.get(student=finished, batch=self.batch).status, 'completed')
+        self.assertEqual(Waitlist.objects.get(pk=self.entries[0].pk).status, 'cancelled')
+        self.assertEqual(Waitlist.objects.get(pk=self.entries[1].pk).status, 'enrolled')
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.enrolled_count, self.batch.held_count), (5, 0))
+
+    @override_settings(WAITLIST_PROMOTION_BACKGROUND=True)
+    def test_background_promotions_coalesce_per_batch(self):
+        other = make_batch('WP2', capacity=1)
+        with mock.patch('api.waitlist.threading.Thread') as thread, \
+                mock.patch('api.waitlist._run_promotion') as run, \
+                mock.patch('api.waitlist.connections'):
+            thread.return_value.is_alive.return_value = True
+            with self.captureOnCommitCallbacks(execute=True):
+                for batch_id in (self.batch.id, other.id, self.batch.id, self.batch.id):
+                    schedule_promotion(batch_id)
+            self.assertEqual(thread.call_count, 1)
+            self.assertEqual(list(waitlist._pending), [self.batch.id, other.id])
+
+            waitlist._drain()
+        self.assertEqual([call.args for call in run.call_args_list], [(self.batch.id,), (other.id,)])
+        self.assertEqual((waitlist._pending, waitlist._worker), ({}, None))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(TestCase):
+    """Logins read the user with one indexed lookup and leave the audit write to the writer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='login_user', email='login@example.com', password='s3cret-pass')
+
+    def setUp(self):
+        # Flush by hand instead of from the writer thread
+        patcher = mock.patch.object(writer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(flush_activity_log)
+
+    def test_login_queues_the_audit_row(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/auth/login/', {'email': 'login@example.com', 'password': 's3cret-pass'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertFalse(ActivityLog.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/auth/login/', {'email': 'login@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+        before_flush = timezone.now()
+        self.assertEqual(flush_activity_log(), 2)
+        logs = ActivityLog.objects.order_by('id')
+        self.assertEqual([log.user_id for log in logs], [self.user.id, None])
+        self.assertTrue(all(log.created_at <= before_flush for log in logs))
+
+    @override_settings(ACTIVITY_LOG_BUFFERED=False)
+    def test_unified_login_matches_username_or_email(self):
+        client = APIClient()
+        for identity in ({'username': 'login_user'}, {'email': 'login@example.com'}):
+            response = client.post('/api/auth/unified-login/', {**identity, 'password': 's3cret-pass'})
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response.json()['action'], 'login')
+            self.assertEqual(response.json()['user']['id'], self.user.id)
+
+        response = client.post('/api/auth/unified-login/', {'email': 'new@example.com', 'password': 's3cret-pass'})
+        self.assertEqual(response.json()['action'], 'registered')
+        self.assertEqual(ActivityLog.objects.filter(action='login').count(), 3)
+
+
+class ActivityLogWriterTests(TestCase):
+    """Buffered audit rows follow their transaction and never queue without bound"""
+
+    def setUp(self):
+        patcher = mock.patch.object(writer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(flush_activity_log)
+
+    def test_rolled_back_rows_are_not_written(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ZeroDivisionError), transaction.atomic():
+                record_activity(action='user_update', description='rolled back')
+                1 / 0
+            with transaction.atomic():
+                record_activity(action='user_update', description='committed')
+        flush_activity_log()
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['committed'])
+
+    def test_full_queue_writes_inline(self):
+        with mock.patch.object(writer, '_queue', queue.Queue(3)):
+            with self.captureOnCommitCallbacks(execute=True):
+                for index in range(3):
+                    record_activity(action='logout', description=str(index))
+            self.assertEqual(writer.pending(), 3)
+            self.assertFalse(ActivityLog.objects.exists())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                record_activity(action='logout', description='3')
+            self.assertEqual(writer.pending(), 0)
+            self.assertEqual(ActivityLog.objects.count(), 4)
+
+
+class ActivityLogRetentionTests(TestCase):
+    """Old logs move to monthly archives and stay readable through the API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='retention_admin', role='admin', password='!')
+        now = timezone.now()
+        cls.logs = ActivityLog.objects.bulk_create([
+            ActivityLog(user=cls.admin, action=action, description=f'{days} days ago', created_at=now - timedelta(days=days))
+            for days, action in [(400, 'login'), (200, 'login'), (200, 'logout'), (120, 'login'), (5, 'login')]
+        ])
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        patcher = override_settings(ACTIVITY_LOG_ARCHIVE_DIR=archive_dir.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_archive_keeps_only_the_retention_window(self):
+        self.assertEqual(archive_activity_logs(retention_days=90, chunk_size=2), 4)
+        self.assertEqual(list(ActivityLog.objects.values_list('id', flat=True)), [self.logs[-1].id])
+        self.assertEqual(sum(ActivityLogArchive.objects.values_list('row_count', flat=True)), 4)
+        self.assertEqual(ActivityLogSummary.objects.filter(action='login').count(), 3)
+        self.assertEqual(archive_activity_logs(retention_days=90), 0)
+
+    def test_rows_archived_out_of_id_order_are_all_read_back(self):
+        month = (timezone.localdate() - timedelta(days=450)).replace(day=1)
+        # The lower id is recorded later in the month (e.g. flushed first by the buffered writer)
+        lower, higher = ActivityLog.objects.bulk_create([
+            ActivityLog(user=self.admin, action='login', description='lower id', created_at=day_start(month.replace(day=25))),
+            ActivityLog(user=self.admin, action='logout', description='higher id', created_at=day_start(month.replace(day=1))),
+        ])
+        # First run only reaches the start of the month, the second the rest
+        first_cutoff = (timezone.localdate() - month.replace(day=10)).days
+        archive_activity_logs(retention_days=first_cutoff)
+        self.assertTrue(ActivityLog.objects.filter(pk=lower.pk).exists())
+        self.assertFalse(ActivityLog.objects.filter(pk=higher.pk).exists())
+        archive_activity_logs(retention_days=90)
+
+        end = month.replace(day=28)
+        ids = [row['id'] for row in stream_activity_logs(month, end) if row['id'] in (lower.id, higher.id)]
+        self.assertEqual(sorted(ids), [lower.id, higher.id])
+
+    def test_overlapping_runs_count_each_row_once(self):
+        from . import activity_archive
+
+        append = activity_archive._append
+        overlapped = []
+
+        def append_then_overlap(month, lines):
+            append(month, lines)
+            if not overlapped:
+                # A second cron run archives the same chunk before this one deletes it
+                overlapped.append(None)
+                overlapped[0] = archive_activity_logs(retention_days=90)
+
+        with mock.patch.object(activity_archive, '_append', side_effect=append_then_overlap):
+            first = archive_activity_logs(retention_days=90)
+        self.assertEqual((first, overlapped), (0, [4]))
+        self.assertEqual(sum(ActivityLogArchive.objects.values_list('row_count', flat=True)), 4)
+        self.assertEqual(sum(ActivityLogSummary.objects.values_list('count', flat=True)), 4)
+
+    def test_stream_and_summary_cover_archived_rows(self):
+        archive_activity_logs(retention_days=90, chunk_size=2)
+        # A rerun after a crash between writing and deleting repeats a chunk
+        archive = ActivityLogArchive.objects.get(row_count=2)
+        _append(archive.month, [json.dumps({'id': self.logs[1].id, 'action': 'login'}) + '\n'])
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        start = (timezone.localdate() - timedelta(days=401)).isoformat()
+        response = client.get(f'/api/activity-logs/stream/?start={start}')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [log.id for log in self.logs])
+        self.assertEqual(rows[0]['action_display'], 'Login')
+
+        response = client.get(f'/api/activity-logs/stream/?start={start}&action=logout')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)
+
+        response = client.get(f'/api/activity-logs/summary/?start={start}')
+        self.assertEqual(sum(row['count'] for row in response.json()), 5)
+        self.assertEqual(client.get('/api/activity-logs/summary/?start=soon').status_code, 400)
+
+
+class SeatReservationTests(TestCase):
+    """Seats are taken with a conditional UPDATE on enrolled_count + held_count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = make_batch('SR', capacity=3)
+        cls.students = make_students(5, prefix='seat')
+
+    def seats(self):
+        self.batch.refresh_from_db()
+        return self.batch.enrolled_count, self.batch.held_count
+
+    def test_full_batch_rejects_overbooking(self):
+        for student in self.students[:3]:
+            enroll_with_seat(self.batch, student)
+        with self.assertRaises(SeatUnavailable):
+            enroll_with_seat(self.batch, self.students[3])
+        self.assertEqual(self.seats(), (3, 0))
+        self.assertEqual(Enrollment.objects.filter(batch=self.batch).count(), 3)
+
+    def test_partial_hold_takes_what_is_left(self):
+        enroll_with_seat(self.batch, self.students[0])
+        with self.assertRaises(SeatUnavailable):
+            hold_seats(self.batch, seats=5)
+        hold = hold_seats(self.batch, seats=5, partial=True)
+        self.assertEqual(hold.seats, 2)
+        self.assertEqual(self.seats(), (1, 2))
+        with self.assertRaises(SeatUnavailable):
+            hold_seats(self.batch, partial=True)
+
+    def test_expired_holds_give_their_seats_back(self):
+        hold = hold_seats(self.batch, seats=3)
+        self.assertEqual(expire_stale_holds(), 0)
+        SeatHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(expire_stale_holds(), 1)
+        self.assertEqual(self.seats(), (0, 0))
+        self.assertEqual(SeatHold.objects.get(pk=hold.pk).status, 'expired')
+
+    def test_confirming_an_expired_hold_fails(self):
+        hold = hold_seats(self.batch, student=self.students[0])
+        SeatHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(HoldExpired):
+            confirm_hold(hold)
+        self.assertFalse(Enrollment.objects.filter(batch=self.batch).exists())
+        self.assertEqual(expire_stale_holds(), 1)
+        self.assertEqual(self.seats(), (0, 0))
+
+    def test_updates_that_take_a_seat_respect_capacity(self):
+        admin = User.objects.create(username='seat_admin', role='admin', password='!')
+        other = make_batch('SR2', capacity=3)
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        dropped = enroll_with_seat(self.batch, self.students[0])
+        dropped.status = 'dropped'
+        dropped.save()
+        for student in self.students[1:4]:
+            enroll_with_seat(self.batch, student)
+        moving = enroll_with_seat(other, self.students[4])
+
+        response = client.patch(f'/api/enrollments/{dropped.id}/', {'status': 'active'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Batch is full'})
+        response = client.patch(f'/api/enrollments/{moving.id}/', {'batch': self.batch.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.seats(), (3, 0))
+        self.assertEqual(Enrollment.objects.get(pk=moving.pk).batch_id, other.id)
+
+        response = client.patch(f'/api/enrollments/{dropped.id}/', {'batch': other.id, 'status': 'active'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        other.refresh_from_db()
+        self.assertEqual((other.enrolled_count, other.held_count), (2, 0))
+        self.assertEqual(self.seats(), (3, 0))
+
+
+class ScheduleConflictTests(TestCase):
+    """The sweep-line engine finds exactly the pairs the old nested loop did"""
+
+    DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_students(1, prefix='sweep')[0]
+        cls.enrolled = [make_batch(f'SW{i}') for i in range(3)]
+        cls.morning = add_schedule(cls.enrolled[0], 'MON', 9)
+        cls.noon = add_schedule(cls.enrolled[1], 'MON', 11, 2)
+        cls.tuesday = add_schedule(cls.enrolled[2], 'TUE', 9)
+        Enrollment.objects.bulk_create([
+            Enrollment(student=cls.student, batch=batch, course=batch.course, status='active')
+            for batch in cls.enrolled
+        ])
+
+    def engine_pairs(self, batch):
+        existing = bucket_by_day(load_student_slots(self.student))
+        return sorted((new.pk, old.pk) for new, old in find_overlaps(list(batch.schedules.all()), existing))
+
+    def legacy_pairs(self, batch):
+        _, conflicts = legacy_check_schedule_conflicts(self.student, batch)
+        return sorted((new_pk, old_pk) for new_pk, old_pk, _ in conflicts)
+
+    def test_boundaries_identical_slots_and_days(self):
+        target = make_batch('SWT')
+        add_schedule(target, 'MON', 10)              # touches both Monday slots
+        identical = add_schedule(target, 'MON', 11, 2)
+        add_schedule(target, 'WED', 9)               # same hours, other day
+        early = add_schedule(target, 'TUE', 8, 2)    # 08:00-10:00 over 09:00-10:00
+
+        expected = sorted([(identical.pk, self.noon.pk), (early.pk, self.tuesday.pk)])
+        self.assertEqual(self.engine_pairs(target), expected)
+        self.assertEqual(self.legacy_pairs(target), expected)
+
+        has_conflicts, conflicts = check_schedule_conflicts(self.student, target)
+        self.assertTrue(has_conflicts)
+        self.assertEqual(
+            [c['conflict_description'] for c in conflicts],
+            ['Monday 11:00-13:00 conflicts with 11:00-13:00', 'Tuesday 08:00-10:00 conflicts with 09:00-10:00']
+        )
+        self.assertEqual(conflicts[0]['existing_course_code'], 'SW1')
+        self.assertEqual(conflicts[0]['new_course_code'], 'SWT')
+
+    def test_touching_slots_never_conflict(self):
+        target = make_batch('SWE')
+        add_schedule(target, 'MON', 8)
+        add_schedule(target, 'MON', 10)
+        add_schedule(target, 'MON', 13)
+        self.assertEqual(self.engine_pairs(target), [])
+        self.assertEqual(check_schedule_conflicts(self.student, target), (False, []))
+
+    def test_random_timetables_match_the_nested_loop(self):
+        rng = random.Random(7)
+        for i in range(6):
+            batch = make_batch(f'SWR{i}')
+            for _ in range(rng.randint(2, 4)):
+                add_schedule(batch, rng.choice(self.DAYS), rng.randint(8, 16), rng.randint(1, 3))
+            Enrollment.objects.create(student=self.student, batch=batch, course=batch.course)
+
+        for i in range(10):
+            target = make_batch(f'SWN{i}')
+            for _ in range(rng.randint(1, 4)):
+                add_schedule(target, rng.choice(self.DAYS), rng.randint(8, 16), rng.randint(1, 3))
+            self.assertEqual(self.engine_pairs(target), self.legacy_pairs(target), target.course.code)
+
+
+class CohortValidationTests(TestCase):
+    """Bulk enrollment validates a cohort in a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='cohort_admin', role='admin', password='!')
+        cls.busy = make_batch('CV1', capacity=40)
+        cls.free = make_batch('CV2', capacity=40)
+        cls.busy_slot = add_schedule(cls.busy, 'MON', 9, 2)
+        add_schedule(cls.free, 'TUE', 9)
+        cls.target = make_batch('CVT', capacity=40, schedule_conflict_checking='strict')
+        add_schedule(cls.target, 'MON', 10)
+        cls.students = make_students(20, prefix='cohort')
+        batches = [cls.busy if i % 2 == 0 else cls.free for i in range(len(cls.students))]
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=batch, course=batch.course, status='active')
+            for student, batch in zip(cls.students, batches)
+        ])
+
+    def prefetch(self, students):
+        processor = BulkEnrollmentProcessor(self.target, [s.id for s in students], self.admin)
+        with CaptureQueriesContext(connection) as ctx:
+            processor.prefetch_cohort()
+        return processor, len(ctx.captured_queries)
+
+    def test_slots_load_in_two_queries(self):
+        for size in (2, 20):
+            with self.assertNumQueries(2):
+                slots = load_slots_by_student([s.id for s in self.students[:size]])
+            self.assertEqual(len(slots), size)
+        self.assertEqual([slot.pk for slot in slots[self.students[0].id]], [self.busy_slot.pk])
+        self.assertEqual([slot.batch.course.code for slot in slots[self.students[1].id]], ['CV2'])
+
+    def test_constant_queries_as_the_cohort_grows(self):
+        self.prefetch(self.students[:1])  # warm the prerequisite map cache
+        _, small = self.prefetch(self.students[:2])
+        processor, large = self.prefetch(self.students)
+        self.assertEqual(small, large)
+
+        with self.assertNumQueries(0):
+            results = [processor.validate_student_enrollment(student) for student in self.students]
+        for i, (errors, warnings) in enumerate(results):
+            if i % 2 == 0:
+                self.assertEqual(errors, ['Schedule conflict: Monday 10:00-11:00 conflicts with 09:00-11:00'])
+            else:
+                self.assertEqual(errors, [])
+            self.assertEqual(warnings, [])
+
+    def test_warning_mode_reports_conflict_counts(self):
+        self.target.course.schedule_conflict_checking = 'warning'
+        self.target.course.save()
+        processor, _ = self.prefetch(self.students[:2])
+        self.assertEqual(
+            processor.validate_student_enrollment(self.students[0]),
+            ([], ['Schedule conflicts detected (1 conflict(s))'])
+        )
+        self.assertEqual(processor.validate_student_enrollment(self.students[1]), ([], []))
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class BulkEnrollmentCommitTests(TestCase):
+    """commit_mode='bulk' seats first come, first served in one transaction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='bulk_enrol_admin', role='admin', password='!')
+        cls.batch = make_batch('BE', capacity=3)
+        cls.students = make_students(5, prefix='bulkenrol')
+
+    def process(self, student_ids, processor_class=BulkEnrollmentProcessor):
+        return processor_class(self.batch, student_ids, self.admin, commit_mode='bulk').process()
+
+    def test_capacity_and_result_rows(self):
+        ids = [s.id for s in self.students]
+        results = self.process(ids[:2] + [ids[0], 'abc'] + ids[2:])
+
+        self.assertEqual([row['student_id'] for row in results['success']], ids[:3])
+        enrollments = dict(Enrollment.objects.filter(batch=self.batch).values_list('student_id', 'id'))
+        self.assertEqual([row['enrollment_id'] for row in results['success']], [enrollments[i] for i in ids[:3]])
+        self.assertEqual(
+            [(row['student_id'], row['errors']) for row in results['errors']],
+            [(ids[0], ['Already enrolled in this batch']), ('abc', ['Student not found']),
+             (ids[3], ['Batch is full']), (ids[4], ['Batch is full'])]
+        )
+        self.assertEqual(results['errors'][0]['username'], self.students[0].username)
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.enrolled_count, self.batch.held_count), (3, 0))
+        self.assertEqual(SeatHold.objects.get(batch=self.batch).status, 'confirmed')
+        self.assertEqual(Notification.objects.filter(related_enrollment__batch=self.batch).count(), 3)
+        self.assertEqual(ActivityLog.objects.filter(action='bulk_enrollment').count(), 1)
+
+    def test_full_batch_rejects_everyone(self):
+        for student in self.students[:3]:
+            enroll_with_seat(self.batch, student)
+        results = self.process([s.id for s in self.students[3:]])
+        self.assertEqual(results['success'], [])
+        self.assertEqual([row['errors'] for row in results['errors']], [['Batch is full']] * 2)
+
+    def test_concurrent_duplicate_falls_back_to_row_commits(self):
+        racer = self.students[1]
+        batch = self.batch
+
+        class RacingProcessor(BulkEnrollmentProcessor):
+            def prefetch_cohort(self):
+                # Another request enrolls a student after validation has read the cohort
+                cohort = super().prefetch_cohort()
+                enroll_with_seat(batch, racer)
+                return cohort
+
+        results = self.process([s.id for s in self.students[:3]], RacingProcessor)
+        self.assertEqual([row['student_id'] for row in results['success']], [self.students[0].id, self.students[2].id])
+        self.assertEqual(
+            [(row['student_id'], row['errors']) for row in results['errors']],
+            [(racer.id, ['Already enrolled in this batch'])]
+        )
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.enrolled_count, self.batch.held_count), (3, 0))
+        self.assertEqual(Enrollment.objects.filter(batch=self.batch).count(), 3)
+
+
+class PrerequisiteValidationTests(TestCase):
+    """Enrollment checks direct prerequisites; links can never form a cycle"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.basics = make_batch('PRA')
+        cls.middle = make_batch('PRB')
+        cls.advanced = make_batch('PRC')
+        cls.middle.course.prerequisites.add(cls.basics.course)
+        cls.advanced.course.prerequisites.add(cls.middle.course)
+        cls.student = make_students(1, prefix='prereq')[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, batch):
+        Enrollment.objects.create(student=self.student, batch=batch, course=batch.course, status='completed')
+
+    def test_missing_prerequisites(self):
+        self.assertEqual(missing_prerequisites(self.student, self.advanced.course), [self.middle.course])
+        self.complete(self.middle)
+        with self.assertNumQueries(1):
+            self.assertEqual(missing_prerequisites(self.student, self.advanced.course), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(missing_prerequisites(self.student, self.basics.course), [])
+
+    def test_enrollment_with_unmet_prerequisites_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        response = client.post('/api/enrollments/', {'batch': self.advanced.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Prerequisites not met')
+        self.assertEqual([p['code'] for p in response.json()['missing_prerequisites']], ['PRB'])
+        self.assertFalse(Enrollment.objects.filter(batch=self.advanced).exists())
+
+        self.complete(self.middle)
+        response = client.post('/api/enrollments/', {'batch': self.advanced.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_m2m_add_rejects_cycles(self):
+        basics, advanced = self.basics.course, self.advanced.course
+        # add() doesn't use a savepoint, so each attempt gets its own
+        for add in (
+            lambda: basics.prerequisites.add(advanced),
+            lambda: advanced.required_for.add(basics),
+            lambda: basics.prerequisites.add(basics),
+        ):
+            with self.assertRaises(PrerequisiteCycle), transaction.atomic():
+                add()
+        self.assertFalse(basics.prerequisites.exists())
+
+        # Links that keep the graph acyclic are still accepted
+        advanced.prerequisites.add(basics)
+        self.assertEqual(set(advanced.prerequisites.all()), {basics, self.middle.course})
+
+    def test_replacing_a_prerequisite_list(self):
+        middle = self.middle.course
+        # Re-saving the current list, or swapping it, is fine
+        check_prerequisite_cycle([(middle.id, self.basics.course_id)], replacing=middle.id)
+        check_prerequisite_cycle([], replacing=middle.id)
+        # A cycle through other courses' links is still caught
+        with self.assertRaises(PrerequisiteCycle):
+            check_prerequisite_cycle([(middle.id, self.advanced.course_id)], replacing=middle.id)
+        # Links checked together see each other
+        with self.assertRaises(PrerequisiteCycle):
+            check_prerequisite_cycle([(self.basics.course_id, middle.id)])
+
+    def admin_form(self, course, prerequisites):
+        data = model_to_dict(course)
+        data.update({
+            'prerequisites': [prerequisite.id for prerequisite in prerequisites],
+            'category': data['category'] or '',
+            'instructor': data['instructor'] or '',
+        })
+        return CourseAdminForm(data=data, instance=course)
+
+    def test_admin_form_rejects_cycles(self):
+        form = self.admin_form(self.basics.course, [self.advanced.course])
+        self.assertFalse(form.is_valid())
+        self.assertIn('prerequisites', form.errors)
+
+        form = self.admin_form(self.middle.course, [self.basics.course])
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class PrerequisiteTreeTests(TestCase):
+    """Trees and course orders come from the cached graph, which follows link changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Diamond: top needs left and right, both of which need base
+        cls.base, cls.left, cls.right, cls.top = [make_batch(code).course for code in ('PTA', 'PTB', 'PTC', 'PTD')]
+        cls.left.prerequisites.add(cls.base)
+        cls.right.prerequisites.add(cls.base)
+        cls.top.prerequisites.add(cls.left, cls.right)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, course, view='prerequisite_tree'):
+        response = self.client.get(f'/api/courses/{course.id}/{view}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @staticmethod
+    def codes(nodes):
+        return [node['code'] for node in nodes]
+
+    def test_diamond_tree_shape(self):
+        data = self.get(self.top)
+        self.assertTrue(data['has_prerequisites'])
+        tree = data['prerequisite_tree']
+        self.assertEqual(self.codes(tree), [course.code for course in self.top.prerequisites.all()])
+        for node in tree:
+            self.assertEqual(node['prerequisites'], [{
+                'id': self.base.id, 'name': self.base.name, 'code': 'PTA', 'description': 'Benchmark course'
+            }])
+
+        order = self.codes(data['suggested_order'])
+        self.assertEqual(sorted(order), ['PTA', 'PTB', 'PTC', 'PTD'])
+        self.assertEqual((order[0], order[-1]), ('PTA', 'PTD'))
+
+        data = self.get(self.base)
+        self.assertEqual((data['prerequisite_tree'], data['has_prerequisites']), ([], False))
+        self.assertEqual(self.codes(data['suggested_order']), ['PTA'])
+
+    def test_graph_order_and_unlocks(self):
+        graph = PrerequisiteGraph.load()
+        order = graph.topological_order(self.top.id)
+        self.assertEqual(len(order), 4)
+        for course in (self.left, self.right, self.top):
+            for prerequisite in course.prerequisites.all():
+                self.assertLess(order.index(prerequisite.id), order.index(course.id))
+
+        data = self.get(self.base, 'unlocks')
+        self.assertEqual(sorted(self.codes(data['required_for'])), ['PTB', 'PTC'])
+        self.assertEqual(sorted(self.codes(data['unlocks'])), ['PTB', 'PTC', 'PTD'])
+
+    def test_graph_is_built_once_per_version(self):
+        with mock.patch.object(PrerequisiteGraph, 'load', wraps=PrerequisiteGraph.load) as load:
+            with self.assertNumQueries(1):
+                for _ in range(50):
+                    self.assertEqual(len(direct_prerequisite_ids(self.top.id)), 2)
+            self.assertEqual(load.call_count, 1)
+
+            # Another process changed the links and replaced the version token
+            cache.delete(PREREQUISITE_GRAPH_VERSION_KEY)
+            direct_prerequisite_ids(self.top.id)
+            self.assertEqual(load.call_count, 2)
+
+    def test_link_changes_invalidate_the_cached_graph(self):
+        self.get(self.top)
+        version = cache.get(PREREQUISITE_GRAPH_VERSION_KEY)
+        self.assertIsNotNone(version)
+        extra = make_batch('PTE').course
+
+        self.base.prerequisites.add(extra)
+        self.assertIsNone(cache.get(PREREQUISITE_GRAPH_VERSION_KEY))
+        self.assertEqual(self.codes(self.get(self.top)['suggested_order'])[0], 'PTE')
+        self.assertEqual(self.codes(self.get(extra, 'unlocks')['unlocks'])[-1], 'PTD')
+
+        self.base.prerequisites.remove(extra)
+        self.assertNotIn('PTE', self.codes(self.get(self.top)['suggested_order']))
+
+        self.top.prerequisites.add(extra)
+        self.assertIn('PTE', self.codes(self.get(self.top)['prerequisite_tree']))
+        extra.delete()
+        self.assertNotIn('PTE', self.codes(self.get(self.top)['prerequisite_tree']))
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages on (ordering field, pk), opt-in per request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='keyset_admin', role='admin', password='!')
+        batch = make_batch('KP', capacity=10)
+        # Every enrollment_date ties (same day), so paging leans on the pk
+        cls.enrollments = Enrollment.objects.bulk_create([
+            Enrollment(student=student, batch=batch, course=batch.course, status='active')
+            for student in make_students(7, prefix='keyset')
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_forwards_and_backwards_through_ties(self):
+        expected = sorted((e.id for e in self.enrollments), reverse=True)
+        pages = [self.get('/api/enrollments/?page_size=3')]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        self.assertEqual([[row['id'] for row in page['results']] for page in pages],
+                         [expected[:3], expected[3:6], expected[6:]])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = [pages[-1]]
+        while back[-1]['previous']:
+            back.append(self.get(back[-1]['previous']))
+        self.assertEqual([[row['id'] for row in page['results']] for page in back[1:]],
+                         [expected[3:6], expected[:3]])
+
+        ascending = self.get('/api/enrollments/?page_size=4&ordering=enrollment_date')
+        self.assertEqual([row['id'] for row in ascending['results']], sorted(expected)[:4])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 2):
+            data = self.get('/api/enrollments/?page_size=1000')
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(len(self.get('/api/enrollments/?page_size=0')['results']), 1)
+
+    def test_unpaginated_unless_requested_or_required(self):
+        data = self.get('/api/enrollments/')
+        self.assertIsInstance(data, list)
+        self.assertEqual(len(data), 7)
+
+        with override_settings(KEYSET_PAGINATION_REQUIRED=True):
+            data = self.get('/api/enrollments/')
+        self.assertEqual(len(data['results']), 7)
+        self.assertIsNone(data['next'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/enrollments/?cursor=not-a-cursor').status_code, 404)
+
+    def test_sparse_fieldsets(self):
+        data = self.get('/api/enrollments/?fields=id, status')
+        self.assertEqual([set(row) for row in data], [{'id', 'status'}] * 7)
+        data = self.get('/api/enrollments/?fields=id&page_size=2')
+        self.assertEqual(data['results'], [{'id': e.id} for e in sorted(self.enrollments, key=lambda e: -e.id)[:2]])
+
+        response = self.client.get('/api/enrollments/?fields=id,secret,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): password, secret']})
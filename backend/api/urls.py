@@ -26,11 +26,17 @@ router.register(r'scholarships', ScholarshipViewSet, basename='scholarship')
 router.register(r'scholarship-applications', ScholarshipApplicationViewSet, basename='scholarship_application')
 
 # Import progress tracking views
-from .progress_views import AssignmentViewSet, ExamViewSet, StudentProgressViewSet
+from .progress_views import AssignmentViewSet, ExamViewSet, GradingScaleViewSet, StudentProgressViewSet
 
 router.register(r'assignments', AssignmentViewSet, basename='assignment')
 router.register(r'exams', ExamViewSet, basename='exam')
 router.register(r'progress', StudentProgressViewSet, basename='progress')
+router.register(r'grading-scales', GradingScaleViewSet, basename='grading_scale')
+
+# Import analytics views
+from .analytics_views import AnalyticsViewSet
+
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
     # Authentication endpoints
@@ -9,6 +9,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Prefetch
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
@@ -31,12 +32,14 @@ from .serializers import (
     WaitlistSerializer
 )
 from .permissions import (
-    IsAdmin, IsStaff, IsInstructor, IsStudent, IsAdminOrStaff,
+    IsAdmin, IsStaff, IsInstructor, IsStudent, IsAdminOrStaff, IsAdminOrInstructor,
     IsOwnProfile, IsOwnEnrollment, IsOwnPayment, CanViewUser,
     CanDeleteUser, CanManageCourse, CanManageEnrollment,
     CanMarkAttendance, CanVerifyPayment, CanViewActivityLog,
-    can_create_user, can_delete_user
+    can_create_user, can_delete_user, teaches_batch
 )
+from .pagination import KeysetPagination
+from .audit import record_activity
 
 User = get_user_model()
 
@@ -51,6 +54,35 @@ def get_client_ip(request):
     return ip
 
 
+class SerializerRelationsMixin:
+    """
+    ViewSets declare the relations their serializers read, so list queries
+    stay constant however many rows a page holds
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    
+    def get_select_related_fields(self):
+        return self.select_related_fields
+    
+    def get_prefetch_related_fields(self):
+        return self.prefetch_related_fields
+    
+    def with_relations(self, queryset):
+        select_related = self.get_select_related_fields()
+        prefetch_related = self.get_prefetch_related_fields()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        
+        # Serializers may ask for per-row aggregates (see EnrollmentDetailSerializer)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'annotate_queryset'):
+            queryset = serializer_class.annotate_queryset(queryset)
+        return queryset
+
+
 # ===================== AUTHENTICATION VIEWS =====================
 
 @api_view(['POST'])
@@ -63,7 +95,7 @@ def register(request):
         refresh = RefreshToken.for_user(user)
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=user,
             action='login',
             description=f'User {user.username} registered',
@@ -96,10 +128,9 @@ def login(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Find user by email only
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
+    # Find user by email only (indexed exact match)
+    user = User.objects.filter(email=email).first()
+    if user is None:
         return Response(
             {'error': 'Invalid email or password'},
             status=status.HTTP_401_UNAUTHORIZED
@@ -108,7 +139,7 @@ def login(request):
     # Verify password
     if not user.check_password(password):
         # Log failed attempt
-        ActivityLog.objects.create(
+        record_activity(
             action='login',
             description=f'Failed login attempt for {email}',
             ip_address=get_client_ip(request)
@@ -128,7 +159,7 @@ def login(request):
     refresh = RefreshToken.for_user(user)
     
     # Log successful login
-    ActivityLog.objects.create(
+    record_activity(
         user=user,
         action='login',
         description=f'User {user.email} logged in',
@@ -178,8 +209,9 @@ def unified_login(request):
     if not email:
         email = f"{username}@temp.local"
     
-    # Try to find existing user by username or email
-    user = User.objects.filter(Q(username=username) | Q(email=email)).first()
+    # Try to find existing user by username, then by email: two exact
+    # lookups on their own indexes instead of one OR across both
+    user = User.objects.filter(username=username).first() or User.objects.filter(email=email).first()
     
     if user:
         # User exists - attempt login
@@ -210,7 +242,7 @@ def unified_login(request):
             action = 'registered'
             
             # Log registration activity
-            ActivityLog.objects.create(
+            record_activity(
                 user=user,
                 action='user_create',
                 description=f'User {user.username} auto-registered via unified auth',
@@ -227,7 +259,7 @@ def unified_login(request):
     refresh = RefreshToken.for_user(user)
     
     # Log login activity
-    ActivityLog.objects.create(
+    record_activity(
         user=user,
         action='login',
         description=f'User {user.username} logged in via unified auth',
@@ -250,7 +282,7 @@ def unified_login(request):
 @permission_classes([IsAuthenticated])
 def logout(request):
     """Logout user"""
-    ActivityLog.objects.create(
+    record_activity(
         user=request.user,
         action='logout',
         description=f'User {request.user.username} logged out',
@@ -432,7 +464,7 @@ def complete_signup(request):
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=user,
             action='user_create',
             description=f'User {user.username} registered via Coursera-style auth',
@@ -593,7 +625,7 @@ def reset_password_with_code(request):
         user.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=user,
             action='password_reset',
             description=f'User {user.username} reset their password',
@@ -678,7 +710,7 @@ def request_password_reset(request):
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=user,
             action='password_reset',
             description=f'Password reset requested for {user.username}',
@@ -736,7 +768,7 @@ def confirm_password_reset(request):
         password_reset.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=user,
             action='password_reset',
             description=f'Password reset completed for {user.username}',
@@ -775,7 +807,7 @@ def update_profile(request):
         user = serializer.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user,
             action='user_update',
             description=f'User {request.user.username} updated their profile',
@@ -832,7 +864,7 @@ def create_admin(request):
         admin_user.save()
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=admin_user,
             action='admin_created',
             description=f'Admin user {username} created',
@@ -880,7 +912,7 @@ def create_staff(request):
             username=username, email=email, password=password,
             first_name=first_name, last_name=last_name, role='staff'
         )
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user, action='staff_created',
             description=f'Admin {request.user.username} created staff {username}',
             target_user=staff_user, ip_address=get_client_ip(request)
@@ -920,7 +952,7 @@ def create_instructor(request):
             username=username, email=email, password=password,
             first_name=first_name, last_name=last_name, role='instructor', phone=phone
         )
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user, action='instructor_created',
             description=f'{request.user.role} {request.user.username} created instructor {username}',
             target_user=instructor_user, ip_address=get_client_ip(request)
@@ -959,7 +991,7 @@ def create_student(request):
             username=username, email=email, password=password,
             first_name=first_name, last_name=last_name, role='student'
         )
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user, action='student_created',
             description=f'{request.user.role} {request.user.username} created student {username}',
             target_user=student_user, ip_address=get_client_ip(request)
@@ -983,7 +1015,7 @@ def reset_user_password(request, user_id):
         user.set_password(new_password)
         user.save()
         
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user, action='password_reset',
             description=f'Admin {request.user.username} reset password for {user.username}',
             target_user=user, ip_address=get_client_ip(request)
@@ -1004,7 +1036,7 @@ def delete_user_admin(request, user_id):
         user = User.objects.get(id=user_id)
         username = user.username
         
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user, action='user_deleted',
             description=f'Admin {request.user.username} deleted user {username}',
             target_user=user, ip_address=get_client_ip(request)
@@ -1035,7 +1067,14 @@ def get_all_users(request):
             Q(first_name__icontains=search) | Q(last_name__icontains=search)
         )
     
-    serializer = UserDetailSerializer(users, many=True)
+    paginator = KeysetPagination(ordering=['-date_joined'])
+    paginator.results_key = 'users'
+    page = paginator.paginate_queryset(users, request)
+    if page is not None:
+        serializer = UserDetailSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+    
+    serializer = UserDetailSerializer(users, many=True, context={'request': request})
     return Response({'count': users.count(), 'users': serializer.data})
 
 
@@ -1049,7 +1088,7 @@ def edit_user_admin(request, user_id):
         
         if serializer.is_valid():
             updated_user = serializer.save()
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user, action='user_updated',
                 description=f'Admin {request.user.username} updated user {user.username}',
                 target_user=updated_user, ip_address=get_client_ip(request)
@@ -1109,7 +1148,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             user = serializer.save()
             
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user,
                 action='user_create',
                 description=f'{request.user.username} created {user.role} account for {user.username}',
@@ -1133,7 +1172,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user,
             action='user_delete',
             description=f'{request.user.username} deleted {instance.role} account for {instance.username}',
@@ -1251,7 +1290,7 @@ class CourseViewSet(viewsets.ModelViewSet):
             # Ensure is_active is True by default if not provided
             course = serializer.save(is_active=request.data.get('is_active', True))
             
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user,
                 action='course_create',
                 description=f'{request.user.username} created course {course.code}',
@@ -1272,7 +1311,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             course = serializer.save()
             
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user,
                 action='course_update',
                 description=f'{request.user.username} updated course {course.code}',
@@ -1301,43 +1340,54 @@ class CourseViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def prerequisite_tree(self, request, pk=None):
-        """Get prerequisite tree for a course (recursive)"""
+        """Get prerequisite tree and suggested course order (from the cached prerequisite graph)"""
+        from .prerequisites import get_prerequisite_graph
+        
         course = self.get_object()
+        graph = get_prerequisite_graph()
         
-        def build_tree(c, visited=None):
-            """Recursively build prerequisite tree"""
-            if visited is None:
-                visited = set()
-            if c.id in visited:
-                return None  # Prevent circular dependencies
-            visited.add(c.id)
-            
-            prereqs = []
-            for prereq in c.prerequisites.all():
-                subtree = build_tree(prereq, visited.copy())
-                prereq_data = {
-                    'id': prereq.id,
-                    'name': prereq.name,
-                    'code': prereq.code,
-                    'description': prereq.description[:100] if prereq.description else ''
-                }
-                if subtree:
-                    prereq_data['prerequisites'] = subtree
-                prereqs.append(prereq_data)
-            return prereqs if prereqs else None
+        # One query for every course in the tree
+        courses = Course.objects.only('id', 'name', 'code', 'description').in_bulk(graph.ancestors(course.id))
+        courses[course.id] = course
         
-        tree = build_tree(course)
+        tree = graph.tree(course.id, lambda course_id: self._course_summary(courses[course_id]))
         
         return Response({
-            'course': {
-                'id': course.id,
-                'name': course.name,
-                'code': course.code,
-                'description': course.description[:100] if course.description else ''
-            },
+            'course': self._course_summary(course),
             'prerequisite_tree': tree if tree else [],
-            'has_prerequisites': course.has_prerequisites()
+            'has_prerequisites': bool(graph.prerequisites.get(course.id)),
+            'suggested_order': [
+                self._course_summary(courses[course_id])
+                for course_id in graph.topological_order(course.id)
+            ]
         })
+    
+    @action(detail=True, methods=['get'])
+    def unlocks(self, request, pk=None):
+        """Courses that list this course as a prerequisite, directly or transitively"""
+        from .prerequisites import get_prerequisite_graph
+        
+        course = self.get_object()
+        graph = get_prerequisite_graph()
+        
+        direct_ids = graph.required_for.get(course.id, ())
+        all_ids = graph.descendants(course.id)
+        courses = Course.objects.only('id', 'name', 'code', 'description').in_bulk(all_ids)
+        
+        return Response({
+            'course': self._course_summary(course),
+            'required_for': [self._course_summary(courses[course_id]) for course_id in direct_ids],
+            'unlocks': [self._course_summary(courses[course_id]) for course_id in all_ids]
+        })
+    
+    @staticmethod
+    def _course_summary(course):
+        return {
+            'id': course.id,
+            'name': course.name,
+            'code': course.code,
+            'description': course.description[:100] if course.description else ''
+        }
 
 
 
@@ -1403,7 +1453,7 @@ class ScheduleViewSet(viewsets.ModelViewSet):
 
 # ===================== ENROLLMENT VIEWS =====================
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
+class EnrollmentViewSet(SerializerRelationsMixin, viewsets.ModelViewSet):
     """ViewSet for student enrollments"""
     serializer_class = EnrollmentListSerializer
     permission_classes = [IsAuthenticated]
@@ -1411,21 +1461,32 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
     search_fields = ['student__username', 'batch__course__name']
     ordering_fields = ['enrollment_date', 'status']
     ordering = ['-enrollment_date']
+    pagination_class = KeysetPagination
+    # EnrollmentListSerializer: student name, batch/course labels, instructor fallbacks
+    select_related_fields = (
+        'student', 'batch__course__instructor', 'batch__instructor', 'course__instructor'
+    )
+    
+    def get_prefetch_related_fields(self):
+        if self.action == 'retrieve':
+            # EnrollmentDetailSerializer nests the batch schedules
+            return ('batch__schedules',)
+        return ()
     
     def get_queryset(self):
         """Filter enrollments based on user role"""
         user = self.request.user
         
         if user.role == 'admin':
-            return Enrollment.objects.select_related('student', 'batch')
+            return self.with_relations(Enrollment.objects.all())
         elif user.role == 'staff':
-            return Enrollment.objects.select_related('student', 'batch')
+            return self.with_relations(Enrollment.objects.all())
         elif user.role == 'instructor':
             # Instructors see only their batch enrollments
-            return Enrollment.objects.filter(batch__instructor=user).select_related('student', 'batch')
+            return self.with_relations(Enrollment.objects.filter(batch__instructor=user))
         elif user.role == 'student':
             # Students see only their own enrollments
-            return Enrollment.objects.filter(student=user).select_related('student', 'batch')
+            return self.with_relations(Enrollment.objects.filter(student=user))
         
         return Enrollment.objects.none()
 
@@ -1458,6 +1519,40 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             return EnrollmentDetailSerializer
         return EnrollmentListSerializer
     
+    def update(self, request, *args, **kwargs):
+        from .seat_reservation import SeatUnavailable
+        
+        try:
+            return super().update(request, *args, **kwargs)
+        except SeatUnavailable:
+            return Response(
+                {'error': 'Batch is full'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def perform_update(self, serializer):
+        """
+        Changes that make an enrollment take a seat (dropped -> active/pending,
+        or a move to another batch) go through the seat engine, so updates
+        can't overbook a batch any more than new enrollments can
+        """
+        from .counters import COUNTED_STATUSES
+        from .seat_reservation import confirm_hold_for, hold_seats
+        
+        enrollment = serializer.instance
+        batch = serializer.validated_data.get('batch', enrollment.batch)
+        new_status = serializer.validated_data.get('status', enrollment.status)
+        takes_seat = batch is not None and new_status in COUNTED_STATUSES and (
+            enrollment.status not in COUNTED_STATUSES or batch.pk != enrollment.batch_id
+        )
+        if not takes_seat:
+            serializer.save()
+            return
+        
+        with transaction.atomic():
+            hold = hold_seats(batch, student=enrollment.student)
+            confirm_hold_for(hold, serializer.save)
+    
     def get_permissions(self):
         if self.action in ['create']:
             return [IsAuthenticated()]  # Allow students to create their own enrollments
@@ -1504,8 +1599,8 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if batch is full
-        if batch.enrolled_count >= batch.capacity:
+        # Check if batch is full (cheap early exit - the seat itself is taken atomically below)
+        if batch.available_seats <= 0:
             return Response(
                 {'error': 'Batch is full'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -1556,7 +1651,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             if not met:
                 # Log warning but allow enrollment
                 missing_names = [f"{p.code} - {p.name}" for p in missing]
-                ActivityLog.objects.create(
+                record_activity(
                     user=request.user,
                     action='enrollment_create',
                     description=f'Student {student.username} enrolled in {course.code} without completing prerequisites: {", ".join(missing_names)}',
@@ -1586,7 +1681,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                     f"{c['existing_course_code']} vs {c['new_course_code']}"
                     for c in conflicts
                 ])
-                ActivityLog.objects.create(
+                record_activity(
                     user=request.user,
                     action='enrollment_create',
                     description=f'Student {student.username} enrolled in {course.code} with schedule conflicts: {conflict_summary}',
@@ -1594,13 +1689,22 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                     ip_address=get_client_ip(request)
                 )
         
-        # Create enrollment
-        enrollment = Enrollment.objects.create(
-            student=student,
-            batch=batch,
-            course=batch.course,
-            status='active'
-        )
+        # Reserve a seat and create the enrollment atomically so concurrent
+        # requests can never overbook the batch
+        from .seat_reservation import enroll_with_seat, SeatUnavailable
+        
+        try:
+            enrollment = enroll_with_seat(batch, student)
+        except SeatUnavailable:
+            return Response(
+                {'error': 'Batch is full'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except IntegrityError:
+            return Response(
+                {'error': 'Student is already enrolled in this batch'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Note: Enrollment counts are now automatically updated by signals
         # No need to manually increment batch.enrolled_count or course.enrolled_count
@@ -1616,7 +1720,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user,
             action='enrollment_create',
             description=f'{request.user.username} enrolled {student.username} in {batch}',
@@ -1639,9 +1743,9 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             )
         
         # Get all enrollments for batches where user is instructor
-        enrollments = Enrollment.objects.filter(
+        enrollments = self.with_relations(Enrollment.objects.filter(
             batch__instructor=request.user
-        ).select_related('student', 'batch').order_by('-enrollment_date')
+        )).order_by('-enrollment_date')
         
         serializer = self.get_serializer(enrollments, many=True)
         return Response(serializer.data)
@@ -1676,16 +1780,24 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 'message': 'This course has no prerequisites'
             })
         
-        met, missing = course.check_prerequisites_met(student)
+        # Get detailed prerequisite status: one query for the courses, one for the completions
+        from .prerequisites import direct_prerequisite_ids
+        
+        prereq_ids = direct_prerequisite_ids(course.id)
+        completed = {}
+        for enrollment in Enrollment.objects.filter(
+            student=student,
+            course_id__in=prereq_ids,
+            status='completed'
+        ):
+            completed.setdefault(enrollment.course_id, enrollment)
         
-        # Get detailed prerequisite status
         prerequisite_status = []
-        for prereq in course.prerequisites.all():
-            enrollment = Enrollment.objects.filter(
-                student=student,
-                course=prereq,
-                status='completed'
-            ).first()
+        missing = []
+        for prereq in Course.objects.filter(id__in=prereq_ids):
+            enrollment = completed.get(prereq.id)
+            if enrollment is None:
+                missing.append(prereq)
             
             prerequisite_status.append({
                 'id': prereq.id,
@@ -1695,6 +1807,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 'enrollment_status': enrollment.status if enrollment else None,
                 'grade': enrollment.grade if enrollment else None
             })
+        met = not missing
         
         return Response({
             'has_prerequisites': True,
@@ -1824,10 +1937,17 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        batch = get_object_or_404(Batch, id=batch_id)
+        commit_mode = request.data.get('commit_mode', 'bulk')
+        if commit_mode not in BulkEnrollmentProcessor.COMMIT_MODES:
+            return Response(
+                {'error': f'commit_mode must be one of: {", ".join(BulkEnrollmentProcessor.COMMIT_MODES)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        batch = get_object_or_404(Batch.objects.select_related('course'), id=batch_id)
         
         # Process bulk enrollment
-        processor = BulkEnrollmentProcessor(batch, student_ids, request.user)
+        processor = BulkEnrollmentProcessor(batch, student_ids, request.user, commit_mode=commit_mode)
         results = processor.process()
         
         return Response({
@@ -1846,7 +1966,7 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
 
 # ===================== PAYMENT VIEWS =====================
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(SerializerRelationsMixin, viewsets.ModelViewSet):
     """ViewSet for payments"""
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
@@ -1854,18 +1974,21 @@ class PaymentViewSet(viewsets.ModelViewSet):
     search_fields = ['enrollment__student__username', 'transaction_id']
     ordering_fields = ['payment_date', 'status']
     ordering = ['-payment_date']
+    pagination_class = KeysetPagination
+    # PaymentSerializer: student name, course name, batch label, verifier name
+    select_related_fields = ('enrollment__student', 'enrollment__batch__course', 'verified_by')
     
     def get_queryset(self):
         """Filter payments based on user role"""
         user = self.request.user
         
         if user.role == 'admin':
-            return Payment.objects.select_related('enrollment', 'verified_by')
+            return self.with_relations(Payment.objects.all())
         elif user.role == 'staff':
-            return Payment.objects.select_related('enrollment', 'verified_by')
+            return self.with_relations(Payment.objects.all())
         elif user.role == 'student':
             # Students see only their payments
-            return Payment.objects.filter(enrollment__student=user).select_related('enrollment', 'verified_by')
+            return self.with_relations(Payment.objects.filter(enrollment__student=user))
         
         return Payment.objects.none()
     
@@ -1898,7 +2021,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 related_enrollment=payment.enrollment
             )
             
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user,
                 action='payment_verify',
                 description=f'{request.user.username} verified payment {payment.id}',
@@ -1914,7 +2037,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
 # ===================== ATTENDANCE VIEWS =====================
 
-class AttendanceViewSet(viewsets.ModelViewSet):
+class AttendanceViewSet(SerializerRelationsMixin, viewsets.ModelViewSet):
     """ViewSet for attendance records"""
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
@@ -1923,25 +2046,31 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     search_fields = ['enrollment__student__username']
     ordering_fields = ['marked_date', 'status']
     ordering = ['-marked_date']
+    pagination_class = KeysetPagination
+    # AttendanceSerializer: student name, course name/id, marking instructor
+    select_related_fields = ('enrollment__student', 'enrollment__batch__course', 'marked_by')
     
     def get_queryset(self):
         """Filter attendance based on user role"""
         user = self.request.user
         
         if user.role == 'admin':
-            return Attendance.objects.select_related('enrollment', 'marked_by')
+            return self.with_relations(Attendance.objects.all())
         elif user.role == 'instructor':
             # Instructors see attendance for their batches
-            return Attendance.objects.filter(
+            return self.with_relations(Attendance.objects.filter(
                 schedule__batch__instructor=user
-            ).select_related('enrollment', 'marked_by')
+            ))
         elif user.role == 'student':
             # Students see their own attendance
-            return Attendance.objects.filter(enrollment__student=user).select_related('enrollment', 'marked_by')
+            return self.with_relations(Attendance.objects.filter(enrollment__student=user))
         
         return Attendance.objects.none()
     
     def get_permissions(self):
+        if self.action == 'roll_call':
+            # Batch ownership is checked in the action
+            return [IsAuthenticated(), IsAdminOrInstructor()]
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsInstructor()]
         return [IsAuthenticated()]
@@ -1952,7 +2081,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             attendance = serializer.save(marked_by=request.user)
             
-            ActivityLog.objects.create(
+            record_activity(
                 user=request.user,
                 action='attendance_mark',
                 description=f'{request.user.username} marked attendance for {attendance.enrollment.student.username}',
@@ -1964,6 +2093,48 @@ class AttendanceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def roll_call(self, request):
+        """
+        Mark a whole session: {"schedule": id, "marks": {enrollment_id: status}}
+        All marks are saved or none
+        """
+        from .bulk_operations import AttendanceRollCall
+        
+        schedule_id = request.data.get('schedule')
+        marks = request.data.get('marks')
+        if not schedule_id:
+            return Response({'error': 'schedule is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not marks or not isinstance(marks, dict):
+            return Response(
+                {'error': 'marks must be a non-empty object of enrollment id -> status'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        schedule = get_object_or_404(Schedule.objects.select_related('batch__course'), id=schedule_id)
+        if request.user.role != 'admin' and not (
+            request.user.role == 'instructor' and teaches_batch(request.user, schedule.batch)
+        ):
+            return Response(
+                {'error': 'Only the instructor of this batch can take roll call'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        roll_call = AttendanceRollCall(schedule, marks, request.user, ip_address=get_client_ip(request))
+        saved = roll_call.process()
+        if roll_call.errors:
+            return Response({
+                'error': 'No attendance was saved, fix the marks below and resubmit',
+                'error_count': len(roll_call.errors),
+                'errors': roll_call.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'message': f'Attendance marked for {saved} students',
+            'schedule': schedule.id,
+            'summary': roll_call.summary
+        })
 
 
 # ===================== NOTIFICATION VIEWS =====================
@@ -1975,6 +2146,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['created_at', 'is_read']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Users see only their own notifications"""
@@ -1998,7 +2170,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ===================== ACTIVITY LOG VIEWS (Admin Only) =====================
 
-class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
+class ActivityLogViewSet(SerializerRelationsMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for activity logs (admin only)"""
     queryset = ActivityLog.objects.all()
     serializer_class = ActivityLogSerializer
@@ -2007,6 +2179,63 @@ class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['user__username', 'action']
     ordering_fields = ['created_at', 'action']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    # ActivityLogSerializer: actor and target names
+    select_related_fields = ('user', 'target_user')
+    
+    def get_queryset(self):
+        return self.with_relations(ActivityLog.objects.all())
+    
+    def _date_range(self, request):
+        """(start, end) dates from ?start=&end= (end defaults to today), or an error Response"""
+        from datetime import date
+        
+        try:
+            start = date.fromisoformat(request.query_params['start'])
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else timezone.localdate()
+        except (KeyError, ValueError):
+            return None, Response(
+                {'error': 'start (and optionally end) must be YYYY-MM-DD dates'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start:
+            return None, Response({'error': 'end must not be before start'}, status=status.HTTP_400_BAD_REQUEST)
+        return (start, end), None
+    
+    @action(detail=False, methods=['get'])
+    def stream(self, request):
+        """
+        Every log in a date range as JSON lines, whether still in the table
+        or already archived (see activity_archive.py)
+        Query params: start, end (YYYY-MM-DD, inclusive), action, user
+        """
+        import json
+        from django.http import StreamingHttpResponse
+        from .activity_archive import stream_activity_logs
+        
+        dates, error = self._date_range(request)
+        if error:
+            return error
+        user_id = request.query_params.get('user')
+        if user_id is not None and not user_id.isdigit():
+            return Response({'error': 'user must be a user id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = stream_activity_logs(
+            *dates, action=request.query_params.get('action'), user_id=int(user_id) if user_id else None
+        )
+        return StreamingHttpResponse(
+            (json.dumps(row) + '\n' for row in rows), content_type='application/x-ndjson'
+        )
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Daily count per action in a date range, archived days included"""
+        from .activity_archive import summarize_activity_logs
+        
+        dates, error = self._date_range(request)
+        if error:
+            return error
+        return Response(summarize_activity_logs(*dates))
 
 
 # ===================== ANNOUNCEMENT VIEWS =====================
@@ -2054,31 +2283,34 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
 
 # ===================== WAITLIST VIEWS =====================
 
-class WaitlistViewSet(viewsets.ModelViewSet):
+class WaitlistViewSet(SerializerRelationsMixin, viewsets.ModelViewSet):
     """ViewSet for waitlist management"""
     serializer_class = WaitlistSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['student__username', 'batch__course__name']
-    ordering_fields = ['position', 'joined_date']
-    ordering = ['position', 'joined_date']
+    # sequence is the queue order; positions are ranked from it when read
+    ordering_fields = ['sequence', 'joined_date']
+    ordering = ['sequence']
+    # WaitlistSerializer: student fields, batch label and course
+    select_related_fields = ('student', 'batch__course')
     
     def get_queryset(self):
         """Filter waitlists based on user role"""
         user = self.request.user
         
         if user.role in ['admin', 'staff']:
-            return Waitlist.objects.select_related('student', 'batch', 'batch__course')
+            return self.with_relations(Waitlist.objects.all())
         elif user.role == 'instructor':
             # Instructors see waitlists for their batches
-            return Waitlist.objects.filter(
+            return self.with_relations(Waitlist.objects.filter(
                 batch__instructor=user
-            ).select_related('student', 'batch', 'batch__course')
+            ))
         elif user.role == 'student':
             # Students see only their own waitlist entries
-            return Waitlist.objects.filter(
+            return self.with_relations(Waitlist.objects.filter(
                 student=user
-            ).select_related('student', 'batch', 'batch__course')
+            ))
         
         return Waitlist.objects.none()
     
@@ -2123,7 +2355,7 @@ class WaitlistViewSet(viewsets.ModelViewSet):
             )
         
         # Check if batch is actually full
-        if batch.enrolled_count < batch.capacity:
+        if batch.available_seats > 0:
             return Response(
                 {'error': 'Batch has available seats. Please enroll directly instead of joining waitlist.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -2160,7 +2392,7 @@ class WaitlistViewSet(viewsets.ModelViewSet):
         )
         
         # Log activity
-        ActivityLog.objects.create(
+        record_activity(
             user=request.user,
             action='enrollment_create',
             description=f'{request.user.username} joined waitlist for {batch}',
@@ -2198,16 +2430,8 @@ class WaitlistViewSet(viewsets.ModelViewSet):
         waitlist.status = 'cancelled'
         waitlist.save()
         
-        # Reorder remaining waitlist positions
-        remaining_waitlist = Waitlist.objects.filter(
-            batch=waitlist.batch,
-            status='waiting'
-        ).order_by('position', 'joined_date')
-        
-        for index, entry in enumerate(remaining_waitlist, start=1):
-            if entry.position != index:
-                entry.position = index
-                entry.save(update_fields=['position'])
+        # Entries behind this one move up on their own: positions are ranked
+        # from the sequence when read, so nothing is renumbered
         
         # Send notification
         Notification.objects.create(
@@ -2231,11 +2455,11 @@ class WaitlistViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        waitlist = Waitlist.objects.filter(
+        waitlist = Waitlist.with_positions(Waitlist.objects.filter(
             student=request.user,
             batch_id=batch_id,
             status='waiting'
-        ).first()
+        )).first()
         
         if not waitlist:
             return Response(
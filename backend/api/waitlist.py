@@ -0,0 +1,210 @@
+"""
+Waitlist promotion engine
+
+promote_waitlist() fills a batch's free seats from the front of its
+waitlist in one transaction: the seats are taken through the seat
+reservation engine (so promotion can never overbook), the entries are
+claimed with a conditional UPDATE from 'waiting', the enrollments and
+notifications are created in bulk. A concurrent promoter that read the
+same entries claims fewer rows than it expected and rolls back, so no
+student is enrolled twice. Students already seated in the batch, or who
+completed it, leave the queue first without taking a seat; students who
+dropped out get their enrollment reactivated.
+
+Seat-freeing events (an enrollment deleted or leaving active/pending, a
+batch growing or reopening - see signals.py) call schedule_promotion(),
+which promotes after the transaction commits. Unless
+WAITLIST_PROMOTION_BACKGROUND is off, batches are queued for a single
+background thread and repeated events for a batch coalesce, so a mass
+drop promotes each batch once instead of racing one thread per event. `python manage.py
+promote_waitlists` sweeps every batch periodically, which also covers
+seats freed by expired holds.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+from .counters import COUNTED_STATUSES, shift_enrollment_counts
+from .models import Batch, Enrollment, Notification, Waitlist
+from .seat_reservation import SeatUnavailable, bulk_confirm_hold, expire_stale_holds, free_seats, hold_seats
+
+logger = logging.getLogger(__name__)
+
+
+class PromotionConflict(Exception):
+    """Raised when another promoter claimed the same waitlist entries first"""
+
+
+def _notify(entries, batch, enrollment_ids):
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=entry.student_id,
+            notification_type='enrollment',
+            channel='in_app',
+            title='Enrolled from Waitlist!',
+            message=f'Great news! A seat opened up and you have been automatically enrolled in {batch.course.name} - Batch {batch.batch_number}.',
+            related_enrollment_id=enrollment_ids[entry.student_id]
+        )
+        for entry in entries
+    ], batch_size=500)
+
+
+def _close_out_settled(batch):
+    """
+    Take students who already have a seat in the batch, or finished it, off
+    its waitlist so they don't use up promotion slots
+    """
+    waiting = Waitlist.objects.filter(batch=batch, status='waiting')
+    waiting.filter(student_id__in=Enrollment.objects.filter(
+        batch=batch, status__in=COUNTED_STATUSES
+    ).values('student_id')).update(status='enrolled', notified=True)
+    waiting.filter(student_id__in=Enrollment.objects.filter(
+        batch=batch, status='completed'
+    ).values('student_id')).update(status='cancelled')
+
+
+def _promote(batch):
+    seats = free_seats(batch)
+    if seats <= 0:
+        return []
+
+    _close_out_settled(batch)
+    entries = list(
+        Waitlist.objects.select_for_update().filter(batch=batch, status='waiting')
+        .select_related('student').order_by('sequence')[:seats]
+    )
+    if not entries:
+        return []
+
+    # Students can't hold two enrollments in a batch: one who dropped out
+    # gets the old row back
+    dropped = dict(
+        Enrollment.objects.filter(
+            batch=batch, status='dropped', student_id__in=[entry.student_id for entry in entries]
+        ).values_list('student_id', 'id')
+    )
+
+    try:
+        hold = hold_seats(batch, seats=len(entries), partial=True)
+    except SeatUnavailable:
+        return []
+    promoted = entries[:hold.seats]
+
+    claimed = Waitlist.objects.filter(
+        id__in=[entry.id for entry in promoted], status='waiting'
+    ).update(status='enrolled', notified=True)
+    if claimed != len(promoted):
+        raise PromotionConflict(f'Waitlist of {batch} is being promoted concurrently')
+
+    fresh = [entry for entry in promoted if entry.student_id not in dropped]
+    returning = [dropped[entry.student_id] for entry in promoted if entry.student_id in dropped]
+    enrollment_ids = {enrollment.student_id: enrollment.id for enrollment in bulk_confirm_hold(
+        hold, [entry.student for entry in fresh]
+    )}
+    if returning:
+        reactivated = Enrollment.objects.filter(id__in=returning, status='dropped').update(status='active')
+        if reactivated != len(returning):
+            raise PromotionConflict(f'Enrollments in {batch} changed during promotion')
+        shift_enrollment_counts(batch.pk, len(returning))
+    enrollment_ids.update(dropped)
+    _notify(promoted, batch, enrollment_ids)
+
+    for entry in promoted:
+        entry.status = 'enrolled'
+        entry.notified = True
+    return promoted
+
+
+def promote_waitlist(batch_id):
+    """
+    Enroll waiting students into the batch's free seats, first come first served
+    Returns: list of promoted Waitlist entries (empty if nothing to do or
+    another promoter got there first)
+    """
+    batch = Batch.objects.filter(pk=batch_id, is_active=True).select_related('course').first()
+    if batch is None:
+        return []
+    try:
+        with transaction.atomic():
+            return _promote(batch)
+    except PromotionConflict:
+        logger.info('Skipped waitlist promotion for batch %s: already being promoted', batch_id)
+        return []
+
+
+def promotable_batch_ids():
+    """Active batches with free seats and someone waiting, one query"""
+    return list(
+        Batch.objects.filter(
+            is_active=True,
+            capacity__gt=F('enrolled_count') + F('held_count'),
+            waitlist_entries__status='waiting'
+        ).distinct().order_by('id').values_list('id', flat=True)
+    )
+
+
+def promote_all():
+    """
+    Expire stale holds, then promote every batch with free seats
+    Returns: number of students promoted
+    """
+    expire_stale_holds()
+    return sum(len(promote_waitlist(batch_id)) for batch_id in promotable_batch_ids())
+
+
+def _run_promotion(batch_id):
+    try:
+        promote_waitlist(batch_id)
+    except Exception:
+        logger.exception('Waitlist promotion for batch %s failed', batch_id)
+
+
+# Batches waiting for the background promoter (a dict keeps them in order)
+_pending = {}
+_pending_lock = threading.Lock()
+_worker = None
+
+
+def _drain():
+    """Promote queued batches one at a time until none are left"""
+    global _worker
+    try:
+        while True:
+            with _pending_lock:
+                if not _pending:
+                    _worker = None
+                    return
+                batch_id = next(iter(_pending))
+                # Dequeued before running: seats freed meanwhile queue it again
+                del _pending[batch_id]
+            _run_promotion(batch_id)
+    finally:
+        connections.close_all()
+
+
+def _enqueue(batch_id):
+    """Queue a batch for the background promoter; repeats coalesce"""
+    global _worker
+    with _pending_lock:
+        _pending[batch_id] = None
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_drain, name='waitlist-promotion', daemon=True)
+        _worker.start()
+
+
+def schedule_promotion(batch_id):
+    """Promote the batch's waitlist once the current transaction commits"""
+    if not batch_id:
+        return
+
+    def start():
+        if getattr(settings, 'WAITLIST_PROMOTION_BACKGROUND', True):
+            _enqueue(batch_id)
+        else:
+            _run_promotion(batch_id)
+
+    transaction.on_commit(start)
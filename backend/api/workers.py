@@ -0,0 +1,15 @@
+"""
+Process-pool worker setup
+
+Kept free of model imports: a spawned worker loads this module from a bare
+interpreter, before Django is set up.
+"""
+
+
+def init_worker(database_name):
+    """Set Django up in a worker, pointed at the parent's database (which may be a test copy)"""
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database_name
+    django.setup()
@@ -90,6 +90,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts and wait for it
+            # instead of failing with "database is locked" under concurrent
+            # enrollments
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -154,6 +161,10 @@ REST_FRAMEWORK = {
     ),
 }
 
+# List endpoints using api.pagination.KeysetPagination paginate only when the
+# client sends ?cursor= or ?page_size=; True paginates every list response
+KEYSET_PAGINATION_REQUIRED = False
+
 # JWT Configuration
 from datetime import timedelta
 
@@ -205,4 +216,42 @@ PASSWORD_RESET_TOKEN_EXPIRY_HOURS = 24
 # Frontend URL for password reset link
 FRONTEND_URL = 'http://localhost:3001'
 
-
+# How long a seat hold blocks a seat before it expires (in seconds)
+SEAT_HOLD_TTL_SECONDS = 120
+
+# Upper bound on how long a process may serve a stale prerequisite map (in seconds)
+PREREQUISITE_CACHE_TIMEOUT = 300
+
+# How long batch analytics stay cached when no progress write invalidates them (in seconds)
+BATCH_ANALYTICS_CACHE_TIMEOUT = 60
+
+# Progress recalculation jobs: enrollments per chunk, worker processes, and
+# whether the recalculate endpoint runs the job in a background thread.
+# SQLite takes one writer at a time, so extra workers only add start-up cost
+# here (see bench_recalculation); raise PROGRESS_RECALC_WORKERS on a server database
+PROGRESS_RECALC_CHUNK_SIZE = 500
+PROGRESS_RECALC_WORKERS = 1
+PROGRESS_RECALC_BACKGROUND = True
+
+# Upper bound on how long a process may grade with a stale grading scale (in seconds)
+GRADING_SCALE_CACHE_TIMEOUT = 300
+
+# Promote waitlisted students in a background thread after a seat frees up;
+# False promotes inline once the freeing transaction commits
+WAITLIST_PROMOTION_BACKGROUND = True
+
+# Audit log rows are queued and written in bulk by a background thread once
+# ACTIVITY_LOG_FLUSH_SIZE rows are waiting or every ACTIVITY_LOG_FLUSH_INTERVAL
+# seconds; past ACTIVITY_LOG_QUEUE_SIZE queued rows callers write inline.
+# False writes each row inside the request (see api/audit.py)
+ACTIVITY_LOG_BUFFERED = True
+ACTIVITY_LOG_FLUSH_SIZE = 200
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0
+ACTIVITY_LOG_QUEUE_SIZE = 10000
+
+# Activity logs older than ACTIVITY_LOG_RETENTION_DAYS are moved by
+# archive_activity_logs into monthly .jsonl.gz files under
+# ACTIVITY_LOG_ARCHIVE_DIR, ACTIVITY_LOG_ARCHIVE_CHUNK_SIZE rows at a time
+ACTIVITY_LOG_RETENTION_DAYS = 90
+ACTIVITY_LOG_ARCHIVE_DIR = BASE_DIR / 'archives' / 'activity_logs'
+ACTIVITY_LOG_ARCHIVE_CHUNK_SIZE = 5000